@@ -0,0 +1,107 @@
+"""Streaming audio post-processing benchmark.
+
+Builds synthetic episodes of increasing length out of speech-like TTS chunks
+(pink noise with a syllable-rate tremolo, mono 24 kHz MP3 like edge-tts),
+runs scripts/audio_post.py on each in a fresh process, and reports wall time,
+peak RSS of the Python process (ffmpeg's own peak separately) and the
+loudness of the result. Python memory should stay flat as episodes grow.
+
+Usage:
+    python benchmarks/audio_post_bench.py [--minutes 5,20,60] [--chunk-seconds 60] [--no-music] [--pydub]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "scripts"))
+
+import audio_post
+
+# Chunks per story, so the episode gets a pause every few chunks like a real script
+CHUNKS_PER_STORY = 3
+
+def make_inputs(workdir, chunk_seconds):
+    ffmpeg = audio_post.ffmpeg_binary()
+    inputs = {
+        'chunk.mp3': (f"anoisesrc=d={chunk_seconds}:c=pink:a=0.25,tremolo=f=4:d=0.7", ['-ac', '1', '-ar', '24000', '-b:a', '48k']),
+        'intro.mp3': ("sine=f=330:d=8,volume=0.4", ['-ac', '2']),
+        'outro.mp3': ("sine=f=262:d=8,volume=0.4", ['-ac', '2']),
+        'bed.mp3': ("sine=f=196:d=20,volume=0.5", ['-ac', '2']),
+    }
+    for name, (source, options) in inputs.items():
+        subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', source, *options,
+                        os.path.join(workdir, name)], check=True)
+
+def render(workdir, chunks, music, pydub):
+    """Child process: post-process one episode and print its stats as JSON"""
+    chunk_files = [os.path.join(workdir, 'chunk.mp3')] * chunks
+    output = os.path.join(workdir, f"episode_{chunks}.mp3")
+    start = time.perf_counter()
+    if pydub:
+        from pydub import AudioSegment
+
+        combined = AudioSegment.empty()
+        for path in chunk_files:
+            combined += AudioSegment.from_mp3(path)
+        combined.export(output, format="mp3")
+        stats = {}
+    else:
+        paths = {name: os.path.join(workdir, f"{name}.mp3") if music else None for name in ('intro', 'outro', 'bed')}
+        stats = audio_post.render_episode(chunk_files, output, set(range(CHUNKS_PER_STORY, chunks, CHUNKS_PER_STORY)),
+                                          **paths)
+    stats['seconds'] = time.perf_counter() - start
+    stats['python_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    stats['ffmpeg_rss_mb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    stats['output'] = output
+    print(json.dumps(stats))
+
+def measure(path):
+    meter = audio_post.LoudnessMeter()
+    for block in audio_post.decode(path):
+        meter.add(block)
+    return meter.integrated()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audio post-processing benchmark")
+    parser.add_argument("--minutes", default="5,20,60", help="episode lengths")
+    parser.add_argument("--chunk-seconds", type=int, default=60, help="length of each TTS chunk")
+    parser.add_argument("--no-music", action="store_true", help="leave out intro, outro and bed music")
+    parser.add_argument("--pydub", action="store_true", help="also time the old in-memory pydub merge")
+    parser.add_argument("--render", nargs=2, metavar=("WORKDIR", "CHUNKS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.render:
+        render(args.render[0], int(args.render[1]), not args.no_music, args.pydub)
+        return 0
+
+    modes = [("streaming", [])] + ([("pydub", ["--pydub"])] if args.pydub else [])
+    print(f"{'mode':<11}{'minutes':>8}{'seconds':>9}{'x realtime':>12}{'python MB':>11}{'ffmpeg MB':>11}"
+          f"{'LUFS out':>10}")
+    with tempfile.TemporaryDirectory(prefix="creaitcast_audio_") as workdir:
+        make_inputs(workdir, args.chunk_seconds)
+        for minutes in (float(m) for m in args.minutes.split(",") if m):
+            chunks = max(1, round(minutes * 60 / args.chunk_seconds))
+            for mode, flags in modes:
+                result = subprocess.run([sys.executable, os.path.abspath(__file__), '--render', workdir, str(chunks),
+                                         *flags, *(['--no-music'] if args.no_music else [])],
+                                        capture_output=True, text=True)
+                if result.returncode != 0:
+                    print(f"{mode:<11}{minutes:>8.0f}  failed: {result.stderr.strip().splitlines()[-1:]}")
+                    continue
+                stats = json.loads(result.stdout.strip().splitlines()[-1])
+                loudness = measure(stats['output'])
+                os.remove(stats['output'])
+                print(f"{mode:<11}{minutes:>8.0f}{stats['seconds']:>9.1f}{minutes * 60 / stats['seconds']:>12.1f}"
+                      f"{stats['python_rss_mb']:>11.0f}{stats['ffmpeg_rss_mb']:>11.0f}"
+                      f"{'-' if loudness is None else f'{loudness:.1f}':>10}")
+    print(f"Target {audio_post.TARGET_LUFS} LUFS")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+import json
+import random
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import fixtures
+
+# edge-tts speaks roughly 150 words per minute
+WORDS_PER_SECOND = 2.5
+
+def find_ffmpeg():
+    """Locate an ffmpeg binary (system one first, then the one bundled with moviepy)"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        return ffmpeg
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+def silent_mp3_second():
+    """One second of silent MP3 in the edge-tts output format (24kHz, 48kbit/s, mono).
+
+    MP3 frames are independent, so repeating these bytes gives a valid longer file.
+    """
+    result = subprocess.run(
+        [find_ffmpeg(), '-loglevel', 'error', '-f', 'lavfi', '-i', 'anullsrc=r=24000:cl=mono',
+         '-t', '1', '-b:a', '48k', '-write_xing', '0', '-id3v2_version', '0', '-f', 'mp3', '-'],
+        capture_output=True, check=True)
+    return result.stdout
+
+def silent_mp3(seconds):
+    return silent_mp3_second() * max(1, int(seconds))
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on a slow response (timeouts) are expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class FakeServices:
+    """Local stand-ins for NewsAPI, the article sites, ZeroHedge, HF Inference, edge-tts and YouTube.
+
+    Every request waits `latency` (+/- `jitter`) seconds and fails with a 503
+    with probability `error_rate`, so the stages' retry paths get exercised too.
+
+    The TTS endpoint can also be made to behave like a real one: the first
+    request on each connection pays `tts_handshake` seconds, synthesis takes
+    len(text) / `tts_chars_per_second` seconds, and every 1000 characters add
+    `tts_error_per_kchar` to the chance of a failure. With `tts_concurrency`
+    set, only that many syntheses run at once and the rest queue, like a
+    throttled service.
+
+    With `hf_requests_per_minute` set, HF requests over that many in the last
+    minute get a 429, like the Inference API's rate limit.
+
+    With `youtube_token_lifetime` set, the YouTube endpoints answer 401 unless
+    the request carries an access token from the OAuth token endpoint (/token)
+    that is younger than that many seconds. write_token saves an expired
+    token.pickle pointing at that endpoint, so stage 6 has to refresh it.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, port=0,
+                 tts_handshake=0.0, tts_chars_per_second=0.0, tts_error_per_kchar=0.0, tts_concurrency=0,
+                 hf_requests_per_minute=0, youtube_token_lifetime=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.tts_handshake = tts_handshake
+        self.tts_chars_per_second = tts_chars_per_second
+        self.tts_error_per_kchar = tts_error_per_kchar
+        self.tts_slots = threading.BoundedSemaphore(tts_concurrency) if tts_concurrency else None
+        self.hf_requests_per_minute = hf_requests_per_minute
+        self.hf_recent = deque()
+        self.youtube_token_lifetime = youtube_token_lifetime
+        self.tokens = {}    # access token -> expiry (monotonic)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.uploads = {}
+        self.uploaded_bytes = 0
+        self.unauthorized = 0
+        # Bump to publish new ZeroHedge headlines on top of the homepage
+        self.zerohedge_version = 1
+        self.mp3_second = None
+        self.server = QuietHTTPServer(('127.0.0.1', port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Environment variables pointing every stage at these fakes"""
+        return {
+            'newsapi': 'fake-newsapi-key',
+            'NEWSAPI_URL': self.url,
+            'ZEROHEDGE_URL': f"{self.url}/zerohedge",
+            'HF': 'fake-hf-key',
+            'HF_API_URL': f"{self.url}/models/",
+            'HF_REQUEST_DELAY': '0',
+            'TTS_URL': f"{self.url}/tts",
+            'YOUTUBE_API_URL': f"{self.url}/",
+        }
+
+    def start(self):
+        self.mp3_second = silent_mp3_second()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self.lock:
+            return {'requests': dict(self.requests), 'errors': dict(self.errors),
+                    'throttled': dict(self.throttled), 'unauthorized': self.unauthorized,
+                    'uploaded_bytes': self.uploaded_bytes}
+
+    def write_token(self, path, client_id='fake-client'):
+        """Save an already expired token.pickle whose refresh goes to this stand-in's token endpoint"""
+        import datetime
+        import pickle
+
+        from google.oauth2.credentials import Credentials
+
+        credentials = Credentials(token='expired', refresh_token='fake-refresh-token', token_uri=f"{self.url}/token",
+                                  client_id=client_id, client_secret='fake-secret',
+                                  scopes=['https://www.googleapis.com/auth/youtube.upload'])
+        credentials.expiry = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        with open(path, 'wb') as f:
+            pickle.dump(credentials, f)
+
+    def _issue_token(self):
+        with self.lock:
+            token = f"fake-token-{len(self.tokens) + 1}"
+            self.tokens[token] = time.monotonic() + self.youtube_token_lifetime
+        return {'access_token': token, 'expires_in': self.youtube_token_lifetime, 'token_type': 'Bearer'}
+
+    def _authorized(self, handler):
+        """False if a token is required and the request has none that is still valid"""
+        if not self.youtube_token_lifetime:
+            return True
+        token = (handler.headers.get('Authorization') or '').removeprefix('Bearer ')
+        with self.lock:
+            if self.tokens.get(token, 0) > time.monotonic():
+                return True
+            self.unauthorized += 1
+        return False
+
+    def _inject(self, route):
+        """Apply latency and decide whether this request should fail"""
+        delay = self.latency
+        with self.lock:
+            self.requests[route] += 1
+            if self.jitter:
+                delay = max(0.0, delay + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.errors[route] += 1
+        if delay:
+            time.sleep(delay)
+        return fail
+
+    def _hf_throttled(self):
+        """True if this HF request is over the per-minute limit"""
+        if not self.hf_requests_per_minute:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.hf_recent and now - self.hf_recent[0] > 60:
+                self.hf_recent.popleft()
+            if len(self.hf_recent) >= self.hf_requests_per_minute:
+                self.throttled['hf'] += 1
+                return True
+            self.hf_recent.append(now)
+        return False
+
+    def _tts(self, handler, text):
+        """Handshake, synthesis time and length-dependent failures of the TTS stand-in; True if it fails"""
+        if not getattr(handler, 'tts_warm', False):
+            handler.tts_warm = True
+            time.sleep(self.tts_handshake)
+        with self.lock:
+            fail = self.random.random() < self.tts_error_per_kchar * len(text) / 1000
+            if fail:
+                self.errors['tts'] += 1
+        if text and self.tts_chars_per_second:
+            if self.tts_slots:
+                self.tts_slots.acquire()
+            try:
+                time.sleep(len(text) / self.tts_chars_per_second)
+            finally:
+                if self.tts_slots:
+                    self.tts_slots.release()
+        return fail
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length) if length else b''
+
+            def _send(self, status, body=b'', content_type='application/json', headers=None):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body).encode('utf-8')
+                elif isinstance(body, str):
+                    body = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                path = parsed.path
+
+                if path == '/v2/everything':
+                    route = 'newsapi'
+                elif path.startswith('/articles/'):
+                    route = 'article'
+                elif path.startswith('/zerohedge'):
+                    route = 'zerohedge'
+                else:
+                    return self._send(404, {'error': 'not found'})
+
+                if services._inject(route):
+                    return self._send(503, {'status': 'error', 'message': 'injected failure'})
+
+                if route == 'newsapi':
+                    page_size = int(query.get('pageSize', 20))
+                    page = int(query.get('page', 1))
+                    start = (page - 1) * page_size + fixtures.query_offset(query.get('q', ''))
+                    articles = [fixtures.newsapi_article(i, services.url, query.get('q', ''))
+                                for i in range(start + 1, start + page_size + 1)]
+                    return self._send(200, {'status': 'ok', 'totalResults': fixtures.CORPUS_LIMIT,
+                                            'articles': articles})
+                if route == 'article':
+                    index = int(path.rsplit('/', 1)[1])
+                    return self._send(200, fixtures.article_html(index), 'text/html; charset=utf-8')
+
+                match = re.match(r'^/zerohedge/news/(\d+)$', path)
+                if match:
+                    return self._send(200, fixtures.zerohedge_article_html(int(match.group(1))),
+                                      'text/html; charset=utf-8')
+                etag = f'"{services.zerohedge_version}"'
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304)
+                return self._send(200, fixtures.zerohedge_homepage_html(first=services.zerohedge_version),
+                                  'text/html; charset=utf-8', headers={'ETag': etag})
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self._body()
+
+                if path.startswith('/models/'):
+                    route = 'hf'
+                elif path == '/tts':
+                    route = 'tts'
+                elif path.startswith('/upload/youtube/v3/videos'):
+                    route = 'youtube_upload'
+                elif path == '/youtube/v3/playlistItems':
+                    route = 'youtube_playlist'
+                elif path == '/token':
+                    route = 'oauth'
+                else:
+                    return self._send(404, {'error': 'not found'})
+
+                if services._inject(route):
+                    return self._send(503, {'error': 'injected failure'})
+
+                if route == 'oauth':
+                    return self._send(200, services._issue_token())
+                if route.startswith('youtube') and not services._authorized(self):
+                    return self._send(401, {'error': {'code': 401, 'message': 'Invalid Credentials'}})
+
+                if route == 'hf' and services._hf_throttled():
+                    return self._send(429, {'error': 'Rate limit reached'}, headers={'Retry-After': '60'})
+                if route == 'hf':
+                    inputs = json.loads(body or b'{}').get('inputs', '')
+                    if isinstance(inputs, list):
+                        inputs = ' '.join(inputs)
+                    summary = ' '.join(inputs.split('. ')[:3])
+                    return self._send(200, [{'summary_text': summary}])
+                if route == 'tts':
+                    text = json.loads(body or b'{}').get('text', '')
+                    if services._tts(self, text):
+                        return self._send(503, {'error': 'synthesis failed'})
+                    seconds = len(text.split()) / WORDS_PER_SECOND
+                    return self._send(200, services.mp3_second * max(1, int(seconds)), 'audio/mpeg')
+                if route == 'youtube_upload':
+                    with services.lock:
+                        session = f"session{len(services.uploads) + 1}"
+                        services.uploads[session] = 0
+                    return self._send(200, {}, headers={'Location': f"{services.url}/upload/{session}"})
+                return self._send(200, {'kind': 'youtube#playlistItem', 'id': 'fake-playlist-item'})
+
+            def do_HEAD(self):
+                # TTS clients open their connections with a HEAD before the first chunk
+                if urlparse(self.path).path != '/tts':
+                    return self._send(404)
+                services._tts(self, '')
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_PUT(self):
+                path = urlparse(self.path).path
+                if not path.startswith('/upload/session'):
+                    return self._send(404, {'error': 'not found'})
+                session = path.rsplit('/', 1)[1]
+                body = self._body()
+                if not services._authorized(self):
+                    return self._send(401, {'error': {'code': 401, 'message': 'Invalid Credentials'}})
+                with services.lock:
+                    services.uploaded_bytes += len(body)
+                    services.uploads[session] = services.uploads.get(session, 0) + len(body)
+                return self._send(200, {'kind': 'youtube#video', 'id': f"fake{session}"})
+
+        return Handler
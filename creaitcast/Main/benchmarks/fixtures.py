@@ -0,0 +1,108 @@
+import os
+import random
+
+# Deterministic synthetic corpora, so that benchmark runs are comparable across machines and days.
+
+CORPUS_LIMIT = 10000
+CORPUS_SIZES = [10, 100, 1000]
+# Number of stories and words per story in the podcast script fixtures
+SCRIPT_SIZES = {'short': (5, 60), 'long': (20, 120)}
+
+WORDS = """market bitcoin price investors federal reserve inflation rates economy growth bank
+crypto exchange trading volume analysts report quarter earnings energy oil supply demand
+government policy election senate congress court ruling technology company shares stock
+index europe china russia ukraine war trade tariffs dollar yield bond treasury housing jobs
+unemployment wages consumer spending retail data forecast recession risk regulators security
+network mining miners halving etf approval fund assets billion million percent record week
+month year today analysts expect decline rally surge drop gains losses volatility outlook""".split()
+
+def _rng(*key):
+    return random.Random('-'.join(str(k) for k in key))
+
+def sentence(rng, min_words=8, max_words=20):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return ' '.join(words).capitalize() + '.'
+
+def paragraph(rng, sentences=5):
+    return ' '.join(sentence(rng) for _ in range(sentences))
+
+def article_title(index):
+    rng = _rng('title', index)
+    return f"{sentence(rng, 5, 9)[:-1].title()} ({index})"
+
+def article_paragraphs(index):
+    rng = _rng('article', index)
+    return [paragraph(rng) for _ in range(rng.randint(4, 10))]
+
+def newsapi_article(index, base_url, query=''):
+    return {
+        'source': {'id': None, 'name': f"Source {index % 17}"},
+        'title': article_title(index),
+        'description': query,
+        'url': f"{base_url}/articles/{index}",
+        'publishedAt': '2024-01-01T00:00:00Z',
+    }
+
+def query_offset(query):
+    """Different NewsAPI queries return overlapping, shifted slices of the corpus"""
+    return sum(query.encode('utf-8')) % 4 * 25
+
+def article_html(index):
+    # Every ninth page has no recognizable article body, like paywalled or script-rendered sites
+    if index % 9 == 0:
+        return f"<html><body><div id='app'>{article_title(index)}</div></body></html>"
+    body = ''.join(f"<p>{p}</p>" for p in article_paragraphs(index))
+    return (f"<html><head><title>{article_title(index)}</title><script>var x = 1;</script></head>"
+            f"<body><nav>menu</nav><article><h1>{article_title(index)}</h1>{body}</article>"
+            f"<footer>footer</footer></body></html>")
+
+def zerohedge_homepage_html(count=60, first=1):
+    """Homepage listing articles first..first+count-1, newest (highest number) on top"""
+    items = ''.join(f'<h2 class="Article_title___TC6d"><a href="/news/{i}">{article_title(i)}</a></h2>'
+                    for i in range(first + count - 1, first - 1, -1))
+    return f"<html><body>{items}</body></html>"
+
+def zerohedge_article_html(index):
+    body = ''.join(f"<p>{p}</p>" for p in article_paragraphs(index))
+    return (f'<html><body><div class="NodeContent_body__HBEFs NodeBody_container__eeFKv">{body}</div>'
+            f'</body></html>')
+
+def write_articles(folder, num_articles):
+    """Write articles/article_{i}.txt in the format produced by 1_parse_articles.py"""
+    os.makedirs(folder, exist_ok=True)
+    for i in range(1, num_articles + 1):
+        with open(os.path.join(folder, f"article_{i}.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"Title: {article_title(i)}\n\n")
+            f.write(f"Source: Source {i % 17}\n\n")
+            f.write(f"URL: https://example.com/articles/{i}\n\n")
+            f.write("Content:\n" + '\n\n'.join(article_paragraphs(i)))
+
+def write_summaries(folder, num_articles):
+    """Write summaries/summary_{i}.txt in the format produced by 2_summarize_articles.py"""
+    os.makedirs(folder, exist_ok=True)
+    for i in range(1, num_articles + 1):
+        rng = _rng('summary', i)
+        with open(os.path.join(folder, f"summary_{i}.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"Title: {article_title(i)}\nSummary:\n{paragraph(rng, 3)}")
+
+def podcast_script(kind, podcast_number=1):
+    """A podcast script shaped like the output of 3_create_podcast_script.py"""
+    stories, words_per_story = SCRIPT_SIZES[kind]
+    parts = [f"Welcome to podcast number {podcast_number} of our AI-generated news summary.\n"
+             "Let's dive into the summaries of our top stories.\n\n"]
+    for i in range(1, stories + 1):
+        rng = _rng('script', kind, i)
+        text = []
+        while sum(len(s.split()) for s in text) < words_per_story:
+            text.append(sentence(rng))
+        parts.append(f"Our next story is titled: {article_title(i)}\n{' '.join(text)}\n\n")
+    parts.append("That concludes our AI-generated news summary for today.\n"
+                 "Thanks for listening, and stay tuned for our next episode.")
+    return ''.join(parts)
+
+def write_script(folder, kind, podcast_number=1):
+    os.makedirs(folder, exist_ok=True)
+    script = podcast_script(kind, podcast_number)
+    with open(os.path.join(folder, "podcast_script.txt"), 'w', encoding='utf-8') as f:
+        f.write(script)
+    return script
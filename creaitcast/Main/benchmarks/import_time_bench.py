@@ -0,0 +1,134 @@
+"""Import-time and fast-fail startup benchmark for the stage scripts.
+
+For every stage it loads the module (without running main) under
+`python -X importtime`, subtracts what a bare interpreter already imports, and
+lists the heaviest top-level imports. It then runs the stage against an episode
+with no inputs, which should fail or skip straight away. Both numbers are
+checked against benchmarks/import_budget.json.
+
+Usage:
+    python benchmarks/import_time_bench.py [--repeat 3] [--top 5] [--no-check]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), "scripts")
+BUDGET_FILE = os.path.join(BENCH_DIR, "import_budget.json")
+
+# Executes the stage module top level only, the `if __name__ == "__main__"` block is skipped.
+# The scripts folder goes on sys.path first, as it does when a stage runs as a script.
+LOAD_STAGE = (
+    "import importlib.util, os, sys\n"
+    "sys.path.insert(0, os.path.dirname(sys.argv[1]))\n"
+    "spec = importlib.util.spec_from_file_location('stage', sys.argv[1])\n"
+    "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+)
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+# Episode number that never has any inputs
+MISSING_EPISODE = "999999"
+
+def stage_scripts():
+    return sorted(f for f in os.listdir(SCRIPTS_DIR) if f[0].isdigit() and f.endswith(".py"))
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (name, depth, self_us, cumulative_us) tuples"""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    return entries
+
+def run_importtime(code_args, cwd):
+    result = subprocess.run([sys.executable, "-X", "importtime", *code_args],
+                            cwd=cwd, capture_output=True, text=True)
+    return result.returncode, parse_importtime(result.stderr)
+
+def import_profile(script, cwd, interpreter_modules):
+    """Return (total ms, [(module, ms), ...] heaviest first, error) for importing one stage"""
+    returncode, entries = run_importtime(["-c", LOAD_STAGE, os.path.join(SCRIPTS_DIR, script)], cwd)
+    top_level = [(name, cumulative / 1000) for name, depth, _, cumulative in entries
+                 if depth == 0 and name not in interpreter_modules]
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    error = None if returncode == 0 else "module failed to import"
+    return sum(ms for _, ms in top_level), top_level, error
+
+def fast_fail_time(script, cwd):
+    """Wall time of running a stage on an episode with no inputs, in ms"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, script), MISSING_EPISODE, "0"],
+                            cwd=cwd, capture_output=True, text=True)
+    return (time.perf_counter() - start) * 1000, result.returncode
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stage import-time report")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports listed per stage")
+    parser.add_argument("--budget", default=BUDGET_FILE)
+    parser.add_argument("--no-check", action="store_true", help="only print the report")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.budget, "r", encoding="utf-8") as f:
+        budget = json.load(f)
+
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="creaitcast_imports_") as cwd:
+        _, baseline_entries = run_importtime(["-c", "pass"], cwd)
+        interpreter_modules = {name for name, _, _, _ in baseline_entries}
+
+        for script in stage_scripts():
+            # Stage 1 has no inputs to check, so running it would hit the network
+            checks_inputs = not script.startswith("1_")
+            imports, fast_fail, heaviest, error = [], [], [], None
+            for _ in range(args.repeat):
+                total_ms, heaviest, error = import_profile(script, cwd, interpreter_modules)
+                imports.append(total_ms)
+                if checks_inputs:
+                    fast_fail.append(fast_fail_time(script, cwd)[0])
+            report[script] = {
+                "import_ms": round(statistics.median(imports), 1),
+                "fast_fail_ms": round(statistics.median(fast_fail), 1) if fast_fail else None,
+                "heaviest": [(name, round(ms, 1)) for name, ms in heaviest[:args.top]],
+                "error": error,
+            }
+
+    failures = []
+    for script, result in report.items():
+        fast_fail = f"{result['fast_fail_ms']:.0f} ms" if result["fast_fail_ms"] is not None else "-"
+        print(f"{script:<36} import {result['import_ms']:>8.1f} ms   fast-fail {fast_fail:>8}"
+              + (f"   ({result['error']})" if result["error"] else ""))
+        for name, ms in result["heaviest"]:
+            print(f"    {name:<40}{ms:>10.1f} ms")
+
+        limits = budget.get(script, budget["default"])
+        if result["error"]:
+            failures.append(f"{script}: {result['error']}")
+        if result["import_ms"] > limits["import_ms"]:
+            failures.append(f"{script}: import {result['import_ms']:.0f} ms > {limits['import_ms']} ms")
+        if result["fast_fail_ms"] is not None and result["fast_fail_ms"] > limits["fast_fail_ms"]:
+            failures.append(f"{script}: fast-fail {result['fast_fail_ms']:.0f} ms > {limits['fast_fail_ms']} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.no_check:
+        return 0
+    for failure in failures:
+        print(f"OVER BUDGET {failure}")
+    if not failures:
+        print("All stages within the import-time budget")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Keyword extraction benchmark on large scripts.
+
+Times the shared engine in scripts/keyword_index.py (regex tokenizer, C-level
+counting, heap selection) against the character-by-character tokenizer the
+video stage used before, on synthetic scripts with a large vocabulary. It then
+measures how the persistent document-frequency index behaves as episodes
+accumulate: adding one episode, re-adding it unchanged, and loading the index.
+
+Usage:
+    python benchmarks/keyword_bench.py [--words 10000,100000,1000000] [--vocabulary 50000] [--episodes 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "scripts"))
+
+from keyword_index import KeywordIndex, term_counts
+
+def reference_keywords(text, num_keywords=5):
+    """The keyword extraction 5_create_video.py used before the shared engine"""
+    text = ''.join(c.lower() for c in text if c.isalnum() or c.isspace())
+    stop_words = set(['the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'])
+    keywords = [word for word in text.split() if word not in stop_words]
+    return [word for word, _ in Counter(keywords).most_common(num_keywords)]
+
+def make_vocabulary(size, rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+def make_script(words, vocabulary, rng):
+    """A script with a Zipf-like word distribution, punctuation and sentence breaks"""
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    tokens = rng.choices(vocabulary, weights=weights, k=words)
+    for i in range(0, words, 12):
+        tokens[i] = tokens[i].capitalize()
+    for i in range(11, words, 12):
+        tokens[i] += rng.choice(".,;!?")
+    return ' '.join(tokens)
+
+def best_of(repeat, fn, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_extraction(sizes, vocabulary, rng, repeat):
+    index = KeywordIndex(path=os.devnull)
+    print(f"{'words':>10}{'reference ms':>15}{'engine ms':>12}{'speedup':>10}{'words/s':>14}")
+    for words in sizes:
+        text = make_script(words, vocabulary, rng)
+        reference = best_of(repeat, reference_keywords, text)
+        engine = best_of(repeat, index.top_terms, text)
+        print(f"{words:>10}{reference * 1000:>15.1f}{engine * 1000:>12.1f}{reference / engine:>10.1f}{words / engine:>14,.0f}")
+
+def bench_index(episodes, vocabulary, rng):
+    with tempfile.TemporaryDirectory(prefix="creaitcast_keywords_") as path:
+        index = KeywordIndex(path)
+        add_times = []
+        for n in range(1, episodes + 1):
+            text = make_script(3000, vocabulary, rng)
+            start = time.perf_counter()
+            index.add_document(f"episode_{n}", text)
+            add_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        unchanged = index.add_document(f"episode_{episodes}", text)
+        readd = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = KeywordIndex(path)
+        load = time.perf_counter() - start
+
+        print(f"\n{episodes} episodes, {len(loaded.df)} distinct terms")
+        print(f"add first episode   {add_times[0] * 1000:8.1f} ms")
+        print(f"add last episode    {add_times[-1] * 1000:8.1f} ms")
+        print(f"re-add unchanged    {readd * 1000:8.1f} ms (indexed again: {unchanged})")
+        print(f"load index          {load * 1000:8.1f} ms (replays and compacts the change log)")
+        if +loaded.df != +index.df or loaded.num_docs != index.num_docs:
+            print("warning: the reloaded index differs from the one that was built")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keyword extraction benchmark")
+    parser.add_argument("--words", default="10000,100000,1000000", help="script sizes in words")
+    parser.add_argument("--vocabulary", type=int, default=50000, help="distinct words in the synthetic language")
+    parser.add_argument("--episodes", type=int, default=500, help="episodes added to the document-frequency index")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    bench_extraction([int(n) for n in args.words.split(",") if n], vocabulary, rng, args.repeat)
+    bench_index(args.episodes, vocabulary, rng)
+
+    # Both extractors must agree on plain counting when the index is empty
+    text = make_script(5000, vocabulary, rng)
+    if set(KeywordIndex(path=os.devnull).top_terms(text, 5)) != set(reference_keywords(text, 5)):
+        print("\nwarning: engine and reference disagree on top terms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
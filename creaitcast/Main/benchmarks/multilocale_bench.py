@@ -0,0 +1,87 @@
+"""Multi-language fan-out benchmark against the local stand-ins.
+
+Times N separate single-language runs of multilocale.py (each one fetching the
+articles again, like running the language variants one after the other)
+against one run that fetches once and fans out to all N languages, with a
+slideshow per locale (--own-slides) and with the shared one. Every run does
+fetch, summaries, script, TTS and video.
+
+The local summarization models are not needed: in this benchmark every
+locale summarizes through the HF API stand-in, so their summaries are shared
+and the fan-out measures the overlap of TTS and video rendering on top.
+
+Usage:
+    python benchmarks/multilocale_bench.py [--locales en,en-local,it] [--articles 10] [--latency 0.05]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import fakes
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_DIR = os.path.dirname(BENCH_DIR)
+
+def run_child(podcast_number, num_articles, locales, shared_video):
+    """Child process: run multilocale.py with every locale on the HF API summarizer"""
+    sys.path.insert(0, MAIN_DIR)
+    import multilocale
+    from locales import LOCALES
+
+    for locale in locales:
+        LOCALES[locale] = dict(LOCALES[locale], summarizer='2_summarize_articles.py')
+    results = multilocale.run_multilocale(podcast_number, num_articles, locales, shared_video=shared_video)
+    return 1 if any(result['failed'] for result in results.values()) else 0
+
+def timed_run(workdir, env, podcast_number, num_articles, locales, log_path, own_slides=False):
+    start = time.perf_counter()
+    with open(log_path, 'ab') as log:
+        returncode = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(podcast_number),
+                                     str(num_articles), '--locales', ','.join(locales),
+                                     *(['--own-slides'] if own_slides else [])],
+                                    cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+    if returncode != 0:
+        raise RuntimeError(f"run of {','.join(locales)} failed, see {log_path}")
+    return time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-language fan-out benchmark")
+    parser.add_argument("--locales", default="en,en-local,it")
+    parser.add_argument("--articles", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every fake request")
+    parser.add_argument("--own-slides", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child", nargs=2, type=int, metavar=("PODCAST", "ARTICLES"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    locales = [locale for locale in args.locales.split(',') if locale]
+
+    if args.child:
+        return run_child(args.child[0], args.child[1], locales, not args.own_slides)
+
+    with tempfile.TemporaryDirectory(prefix="creaitcast_locales_") as workdir, \
+            fakes.FakeServices(latency=args.latency) as services:
+        env = dict(os.environ, **services.env())
+        log_path = os.path.join(workdir, "bench.log")
+        try:
+            separate = {locale: timed_run(workdir, env, 1 + i, args.articles, [locale], log_path)
+                        for i, locale in enumerate(locales)}
+            own_slides = timed_run(workdir, env, len(locales) + 1, args.articles, locales, log_path, own_slides=True)
+            fan_out = timed_run(workdir, env, len(locales) + 2, args.articles, locales, log_path)
+        except RuntimeError:
+            with open(log_path, encoding='utf-8', errors='replace') as f:
+                print(f.read()[-3000:])
+            raise
+
+    for locale, seconds in separate.items():
+        print(f"{locale:<12} alone        {seconds:8.1f}s")
+    total = sum(separate.values())
+    print(f"{'all':<12} one by one   {total:8.1f}s")
+    print(f"{'all':<12} own slides   {own_slides:8.1f}s  ({own_slides / total:.0%} of separate runs)")
+    print(f"{'all':<12} fan-out      {fan_out:8.1f}s  ({fan_out / total:.0%} of separate runs, "
+          f"{fan_out / (total / len(locales)):.2f}x one language)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
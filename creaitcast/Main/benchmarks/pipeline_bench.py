@@ -0,0 +1,245 @@
+"""End-to-end pipeline benchmark against local stand-ins for every external service.
+
+Runs each stage script (and the full main.py pipeline) as a subprocess, the same
+way main.py does, in a scratch directory, and records wall time percentiles,
+throughput and peak RSS. Results are compared with benchmarks/baseline.json.
+
+Usage:
+    python benchmarks/pipeline_bench.py [--sizes 10,100,1000] [--scripts short,long]
+        [--latency 0.05] [--jitter 0.02] [--error-rate 0.01] [--repeat 3] [--save-baseline] [--ci]
+
+The baseline holds timings of one machine, so it is not committed: record it with
+--save-baseline where the benchmark runs. With --ci a missing baseline is a failure.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fakes
+import fixtures
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_DIR = os.path.dirname(BENCH_DIR)
+SCRIPTS_DIR = os.path.join(MAIN_DIR, "scripts")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+
+CORPUS_STAGES = ["1_parse_articles.py", "2_summarize_articles.py", "3_create_podcast_script.py"]
+SCRIPT_STAGES = ["4_generate_audio.py", "5_create_video.py", "6_upload_to_youtube.py"]
+# Roughly the bitrate of a 640x480 slideshow encoded by 5_create_video.py
+VIDEO_BYTES_PER_SECOND = 100 * 1024
+
+# Differences below these are treated as noise when comparing with the baseline
+MIN_SECONDS_DELTA = 0.25
+MIN_RSS_DELTA_MB = 10
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def run_process(args, cwd, env, log_path):
+    """Run a command, returning (seconds, peak RSS in MB, return code).
+
+    os.wait4 gives the peak RSS of the child and every descendant it waited for,
+    which covers the stage subprocesses started by main.py.
+    """
+    start = time.perf_counter()
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(args, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return elapsed, usage.ru_maxrss / 1024, process.returncode
+
+def reset_episode(workdir, podcast_number):
+    base_path = os.path.join(workdir, f"output/podcast_{podcast_number}")
+    shutil.rmtree(base_path, ignore_errors=True)
+    for folder in ["articles", "summaries", "scripts", "audio", "video"]:
+        os.makedirs(os.path.join(base_path, folder), exist_ok=True)
+    return base_path
+
+def prepare_stage(stage, base_path, podcast_number, num_articles=0, script_kind=None):
+    """Seed the inputs of a stage from the fixture corpora so every stage is measured in isolation"""
+    if stage == "2_summarize_articles.py":
+        fixtures.write_articles(os.path.join(base_path, "articles"), num_articles)
+    elif stage == "3_create_podcast_script.py":
+        fixtures.write_summaries(os.path.join(base_path, "summaries"), num_articles)
+    elif stage in SCRIPT_STAGES:
+        script = fixtures.write_script(os.path.join(base_path, "scripts"), script_kind, podcast_number)
+        seconds = len(script.split()) / fakes.WORDS_PER_SECOND
+        if stage == "5_create_video.py":
+            with open(os.path.join(base_path, f"audio/episode{podcast_number}.mp3"), "wb") as f:
+                f.write(fakes.silent_mp3(seconds))
+        elif stage == "6_upload_to_youtube.py":
+            with open(os.path.join(base_path, f"video/episode{podcast_number}.mp4"), "wb") as f:
+                f.write(b"\0" * int(seconds * VIDEO_BYTES_PER_SECOND))
+
+def count_items(stage, base_path, num_articles, script):
+    if stage == "1_parse_articles.py":
+        return len(os.listdir(os.path.join(base_path, "articles"))), "articles"
+    if stage == "2_summarize_articles.py":
+        return len(os.listdir(os.path.join(base_path, "summaries"))), "articles"
+    if stage == "3_create_podcast_script.py":
+        return num_articles, "articles"
+    return len(script.split()), "words"
+
+def summarize_runs(runs, rss, failures, items, unit):
+    p50 = percentile(runs, 50)
+    return {
+        "runs": [round(r, 4) for r in runs],
+        "p50": round(p50, 4),
+        "p95": round(percentile(runs, 95), 4),
+        "p99": round(percentile(runs, 99), 4),
+        "peak_rss_mb": round(max(rss), 1),
+        "throughput": round(items / p50, 2) if p50 else 0.0,
+        "unit": f"{unit}/s",
+        "items": items,
+        "failures": failures,
+    }
+
+def bench_stage(stage, workdir, env, podcast_number, repeat, num_articles=0, script_kind=None):
+    runs, rss, failures = [], [], 0
+    items, unit = 0, ""
+    log_path = os.path.join(workdir, "bench.log")
+    for _ in range(repeat):
+        base_path = reset_episode(workdir, podcast_number)
+        prepare_stage(stage, base_path, podcast_number, num_articles, script_kind)
+        args = [sys.executable, os.path.join(SCRIPTS_DIR, stage), str(podcast_number), str(num_articles)]
+        seconds, peak_mb, returncode = run_process(args, workdir, env, log_path)
+        runs.append(seconds)
+        rss.append(peak_mb)
+        failures += returncode != 0
+        script = fixtures.podcast_script(script_kind, podcast_number) if script_kind else ""
+        items, unit = count_items(stage, base_path, num_articles, script)
+    return summarize_runs(runs, rss, failures, items, unit)
+
+def bench_pipeline(workdir, env, podcast_number, num_articles, repeat):
+    runs, rss, failures = [], [], 0
+    log_path = os.path.join(workdir, "bench.log")
+    for _ in range(repeat):
+        reset_episode(workdir, podcast_number)
+        args = [sys.executable, os.path.join(MAIN_DIR, "main.py"), str(podcast_number), str(num_articles)]
+        seconds, peak_mb, returncode = run_process(args, workdir, env, log_path)
+        runs.append(seconds)
+        rss.append(peak_mb)
+        failures += returncode != 0
+    return summarize_runs(runs, rss, failures, num_articles, "articles")
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return a list of human readable regressions"""
+    regressions = []
+    for case, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(case, {}).get(stage)
+            if not previous:
+                continue
+            if (current["p50"] > previous["p50"] * (1 + tolerance)
+                    and current["p50"] - previous["p50"] > MIN_SECONDS_DELTA):
+                regressions.append(f"{case}/{stage}: p50 {previous['p50']:.2f}s -> {current['p50']:.2f}s")
+            if (current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance)
+                    and current["peak_rss_mb"] - previous["peak_rss_mb"] > MIN_RSS_DELTA_MB):
+                regressions.append(f"{case}/{stage}: peak RSS {previous['peak_rss_mb']:.0f}MB -> "
+                                   f"{current['peak_rss_mb']:.0f}MB")
+            if current["failures"] > previous.get("failures", 0):
+                regressions.append(f"{case}/{stage}: {current['failures']} failed runs")
+    return regressions
+
+def print_results(results):
+    print(f"{'case':<14}{'stage':<30}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'peak MB':>9}  throughput")
+    for case, stages in results.items():
+        for stage, r in stages.items():
+            print(f"{case:<14}{stage:<30}{r['p50']:>9.3f}{r['p95']:>9.3f}{r['p99']:>9.3f}"
+                  f"{r['peak_rss_mb']:>9.1f}  {r['throughput']} {r['unit']}"
+                  + (f"  ({r['failures']} failed)" if r["failures"] else ""))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in fixtures.CORPUS_SIZES),
+                        help="comma separated article corpus sizes for stages 1-3")
+    parser.add_argument("--scripts", default=",".join(fixtures.SCRIPT_SIZES),
+                        help="comma separated script fixtures for stages 4-6")
+    parser.add_argument("--stages", default="", help="only run stages whose file name starts with these prefixes")
+    parser.add_argument("--pipeline-articles", type=int, default=10,
+                        help="articles for the full main.py run (0 to skip)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of an injected 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--ci", action="store_true", help="fail instead of passing when there is no baseline")
+    parser.add_argument("--output", help="write the full results as JSON")
+    parser.add_argument("--workdir", help="scratch directory (default: a temporary one)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(n) for n in args.sizes.split(",") if n]
+    script_kinds = [k for k in args.scripts.split(",") if k]
+    prefixes = [p for p in args.stages.split(",") if p]
+
+    def selected(stage):
+        return not prefixes or any(stage.startswith(p) for p in prefixes)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="creaitcast_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    results = {}
+
+    with fakes.FakeServices(args.latency, args.jitter, args.error_rate, args.seed) as services:
+        env = dict(os.environ, PYTHONUNBUFFERED="1", **services.env())
+        podcast_number = 1
+        for size in sizes:
+            case = f"articles_{size}"
+            for stage in filter(selected, CORPUS_STAGES):
+                print(f"Benchmarking {stage} on {size} articles...")
+                results.setdefault(case, {})[stage] = bench_stage(
+                    stage, workdir, env, podcast_number, args.repeat, num_articles=size)
+        for kind in script_kinds:
+            case = f"script_{kind}"
+            for stage in filter(selected, SCRIPT_STAGES):
+                print(f"Benchmarking {stage} on the {kind} script...")
+                results.setdefault(case, {})[stage] = bench_stage(
+                    stage, workdir, env, podcast_number, args.repeat, script_kind=kind)
+        if args.pipeline_articles and not prefixes:
+            print(f"Benchmarking main.py on {args.pipeline_articles} articles...")
+            results[f"pipeline_{args.pipeline_articles}"] = {
+                "main.py": bench_pipeline(workdir, env, podcast_number, args.pipeline_articles, args.repeat)}
+        fake_stats = services.stats()
+
+    print()
+    print_results(results)
+    print(f"\nFake service requests: {fake_stats['requests']}  injected errors: {fake_stats['errors']}")
+    print(f"Logs: {os.path.join(workdir, 'bench.log')}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "services": fake_stats}, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found, run with --save-baseline to create one")
+        return 1 if args.ci else 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""Soak test: hundreds of episodes back to back in one long-lived process.
+
+Runs the stages in-process one episode after the other, the way daemon.py
+does, in a scratch directory against the local stand-ins (benchmarks/fakes.py).
+The episodes run in a child process so the stand-ins' own threads and memory
+stay out of the numbers. After every episode it records:
+
+    seconds     wall time of the episode, and of each stage (output/stage_times.jsonl)
+    rss         resident memory of the process after a garbage collection
+    fds         open file descriptors, and the number of live threads
+    disk        bytes under output/, and how much the episode added
+    hf          HF requests and rate-limited (429) answers
+    oauth       YouTube token refreshes and requests refused with a 401 (with --token-lifetime)
+
+The first --warmup episodes are ignored. The next --baseline episodes are
+the reference: at the end, the last --baseline episodes are compared with them,
+and memory, handles and threads are fitted over the whole run. Latency
+degradation, memory growth, leaked handles or threads, disk use per episode
+growing and failed episodes are flagged, and the exit status is 1.
+
+With --token-lifetime the YouTube stand-in only accepts access tokens younger
+than that, and the run starts from an expired token.pickle, so stage 6 goes
+through the same refresh as with a real saved token: once at the first upload,
+then again whenever the token is about to expire. google-auth refreshes tokens
+with less than 3m45s left, so lifetimes below that refresh before every request.
+
+Usage:
+    python benchmarks/soak_bench.py [--episodes 200] [--articles 3] [--warmup 2] [--baseline 10] [--gc]
+        [--hf-per-minute 0] [--token-lifetime 0] [--latency 0.0] [--error-rate 0.0] [--tolerance 0.25]
+        [--output soak.jsonl]
+
+--episodes 30 is a month of daily episodes. With --gc the storage retention policy runs
+after every upload, as with `daemon.py run --gc`.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import fakes
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_DIR = os.path.dirname(BENCH_DIR)
+
+# Growth below these is treated as noise
+MIN_RSS_GROWTH_MB = 20
+MIN_SECONDS_DELTA = 0.25
+
+def read_stage_times(path, offset, podcast_number):
+    """{step: seconds} of the episode from the stage times appended since offset, and the new offset"""
+    stages = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            f.seek(offset)
+            for line in f:
+                record = json.loads(line)
+                if record['podcast_number'] == podcast_number:
+                    stages[record['step']] = record['seconds']
+            offset = f.tell()
+    except (OSError, ValueError):
+        pass
+    return stages, offset
+
+def soak_child(conn, workdir, log_path, collect_garbage):
+    """Child process: run each episode received on conn in-process and send back its measurements"""
+    import gc
+    import threading
+
+    os.chdir(workdir)
+    # The stages print a lot; keep it out of the report
+    log = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+    os.dup2(log, 1)
+    os.dup2(log, 2)
+    sys.path.insert(0, MAIN_DIR)
+    import psutil
+
+    import storage
+    from main import STAGE_TIMES, run_episode, run_stage_in_process
+
+    process = psutil.Process()
+    offset = 0
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        podcast_number, num_articles = job
+        start = time.perf_counter()
+        try:
+            failed = run_episode(podcast_number, num_articles, runner=run_stage_in_process)
+        except Exception as e:
+            failed = f"crashed: {e}"
+        seconds = time.perf_counter() - start
+        if collect_garbage and not failed:
+            storage.collect(episodes={podcast_number})
+        stages, offset = read_stage_times(STAGE_TIMES, offset, podcast_number)
+        gc.collect()
+        conn.send({'episode': podcast_number, 'seconds': seconds, 'failed': failed, 'stages': stages,
+                   'rss_mb': process.memory_info().rss / 1024 / 1024, 'fds': process.num_fds(),
+                   'threads': threading.active_count(), 'disk_bytes': storage.tree_size(storage.OUTPUT_FOLDER)})
+    conn.close()
+
+def slope(values):
+    """Least-squares change per episode"""
+    if len(values) < 2:
+        return 0.0
+    mean_x, mean_y = (len(values) - 1) / 2, statistics.fmean(values)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    return numerator / sum((x - mean_x) ** 2 for x in range(len(values)))
+
+def analyse(records, warmup, baseline, tolerance):
+    """Findings (flagged, message) comparing the end of the run with its start"""
+    measured = records[warmup:]
+    if len(measured) < 2 * baseline:
+        return [(False, f"only {len(measured)} measured episodes, need {2 * baseline} to compare")]
+    first, last = measured[:baseline], measured[-baseline:]
+    findings = []
+
+    failures = [record for record in records if record['failed']]
+    findings.append((bool(failures), f"{len(failures)} failed episode(s)" +
+                     (f", first: episode {failures[0]['episode']} at {failures[0]['failed']}" if failures else "")))
+
+    def latency(window, key=None):
+        return statistics.median(record['seconds'] if key is None else record['stages'].get(key, 0.0)
+                                 for record in window)
+
+    before, after = latency(first), latency(last)
+    findings.append((after > before * (1 + tolerance) and after - before > MIN_SECONDS_DELTA,
+                     f"latency: median {before:.2f}s in the first {baseline}, {after:.2f}s in the last {baseline} "
+                     f"({after / before - 1:+.0%})"))
+    for step in sorted({step for record in measured for step in record['stages']}):
+        before, after = latency(first, step), latency(last, step)
+        if after > before * (1 + tolerance) and after - before > MIN_SECONDS_DELTA:
+            findings.append((True, f"  {step}: {before:.2f}s -> {after:.2f}s"))
+
+    rss = [record['rss_mb'] for record in measured]
+    growth = slope(rss) * len(rss)
+    findings.append((growth > max(MIN_RSS_GROWTH_MB, tolerance * rss[0]),
+                     f"memory: {rss[0]:.0f} MB -> {rss[-1]:.0f} MB, "
+                     f"trend {slope(rss) * 100:+.1f} MB per 100 episodes"))
+
+    for key, label in (('fds', 'file descriptors'), ('threads', 'threads')):
+        ceiling = max(record[key] for record in first)
+        peak = max(record[key] for record in last)
+        findings.append((peak > ceiling and slope([record[key] for record in measured]) > 0,
+                         f"{label}: at most {ceiling} in the first {baseline}, {peak} in the last {baseline}"))
+
+    added = [record['disk_bytes'] - previous['disk_bytes'] for previous, record in zip(records, records[1:])]
+    added = added[max(0, warmup - 1):]
+    before, after = statistics.median(added[:baseline]), statistics.median(added[-baseline:])
+    findings.append((after > before * (1 + tolerance) and after - before > 1024 * 1024,
+                     f"disk: {records[-1]['disk_bytes'] / 1024 / 1024:.0f} MB under output/, "
+                     f"{before / 1024 / 1024:.1f} MB per episode at the start, {after / 1024 / 1024:.1f} MB at the end "
+                     f"({after * 365 / 1024 / 1024:.0f} MB per year of daily episodes)"))
+
+    if any(record['oauth_refreshes'] for record in records):
+        refused = sum(record['oauth_refused'] for record in records)
+        findings.append((refused > 0, f"YouTube token: {sum(record['oauth_refreshes'] for record in records)} "
+                                      f"refresh(es), {refused} request(s) refused with an expired token"))
+
+    throttled = sum(record['hf_throttled'] for record in last)
+    findings.append((throttled > sum(record['hf_throttled'] for record in first),
+                     f"HF rate limit: {sum(record['hf_throttled'] for record in first)} throttled request(s) in the "
+                     f"first {baseline}, {throttled} in the last {baseline}"))
+    return findings
+
+def print_record(record):
+    failed = f"  failed at {record['failed']}" if record['failed'] else ""
+    print(f"{record['episode']:>6}{record['seconds']:>9.2f}{record['rss_mb']:>9.0f}{record['fds']:>6}"
+          f"{record['threads']:>8}{record['disk_bytes'] / 1024 / 1024:>10.1f}{record['hf_requests']:>5}"
+          f"{record['hf_throttled']:>6}{failed}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak test of back-to-back episodes")
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--articles", type=int, default=3, help="articles per episode")
+    parser.add_argument("--warmup", type=int, default=2, help="first episodes left out of the comparison")
+    parser.add_argument("--baseline", type=int, default=10, help="episodes compared at the start and the end")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative growth that is flagged")
+    parser.add_argument("--gc", action="store_true", help="apply the storage retention policy after each upload")
+    parser.add_argument("--hf-per-minute", type=int, default=0, help="HF rate limit of the stand-in (0: none)")
+    parser.add_argument("--token-lifetime", type=float, default=0,
+                        help="seconds a YouTube access token is valid, from an expired token.pickle (0: no token)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake requests that fail")
+    parser.add_argument("--output", help="write every episode's measurements to this JSON lines file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="creaitcast_soak_") as workdir, \
+            fakes.FakeServices(latency=args.latency, error_rate=args.error_rate,
+                               hf_requests_per_minute=args.hf_per_minute,
+                               youtube_token_lifetime=args.token_lifetime) as services:
+        # A fresh interpreter: forking would copy the stand-ins' sockets and threads into the child
+        context = multiprocessing.get_context('spawn')
+        os.environ.update(services.env())
+        if args.token_lifetime:
+            # Stage 6 finds it in its working directory, as token.pickle
+            services.write_token(os.path.join(workdir, "token.pickle"))
+        parent_conn, child_conn = context.Pipe()
+        log_path = os.path.join(workdir, "soak.log")
+        child = context.Process(target=soak_child, args=(child_conn, workdir, log_path, args.gc))
+        child.start()
+
+        records = []
+        print(f"{'episode':>6}{'seconds':>9}{'rss MB':>9}{'fds':>6}{'threads':>8}{'disk MB':>10}{'hf':>5}{'429s':>6}")
+        output = open(args.output, 'w', encoding='utf-8') if args.output else None
+        try:
+            for podcast_number in range(1, args.episodes + 1):
+                before = services.stats()
+                parent_conn.send((podcast_number, args.articles))
+                record = parent_conn.recv()
+                after = services.stats()
+                record['hf_requests'] = after['requests'].get('hf', 0) - before['requests'].get('hf', 0)
+                record['hf_throttled'] = after['throttled'].get('hf', 0) - before['throttled'].get('hf', 0)
+                record['oauth_refreshes'] = after['requests'].get('oauth', 0) - before['requests'].get('oauth', 0)
+                record['oauth_refused'] = after['unauthorized'] - before['unauthorized']
+                records.append(record)
+                print_record(record)
+                if output:
+                    output.write(json.dumps(record) + "\n")
+                    output.flush()
+        except (EOFError, KeyboardInterrupt) as e:
+            print(f"Stopped after {len(records)} episode(s): {type(e).__name__}")
+        finally:
+            if output:
+                output.close()
+            if child.is_alive():
+                parent_conn.send(None)
+            child.join()
+
+        findings = analyse(records, args.warmup, args.baseline, args.tolerance)
+        print()
+        for flagged, message in findings:
+            print(f"{'FLAG' if flagged else 'ok':<5} {message}")
+        if any(record['failed'] for record in records):
+            with open(log_path, encoding='utf-8', errors='replace') as f:
+                print(f.read()[-3000:])
+    return 1 if any(flagged for flagged, _ in findings) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
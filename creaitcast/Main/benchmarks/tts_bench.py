@@ -0,0 +1,106 @@
+"""TTS scheduling benchmark against the fake TTS service.
+
+The stand-in behaves like a throttled synthesis service: a handshake on every
+new connection, synthesis time proportional to the text, a limited number of
+concurrent syntheses and failures that get likelier with longer chunks. It
+synthesizes the long fixture script with:
+
+    naive      the old behaviour: fixed 2000-character chunks, all started at
+               once on new connections, no retries
+    pool       fixed 2000-character chunks on the warm session pool, longest first
+    adaptive   the pool with chunk sizes from the voice stats of the earlier runs
+
+Usage:
+    python benchmarks/tts_bench.py [--repeat 3] [--sessions 4] [--handshake 0.3] [--chars-per-second 1500]
+        [--error-per-kchar 0.02]
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import fakes
+import fixtures
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+VOICE = "en-US-ChristopherNeural"
+
+def naive_synthesize(url, chunks, filenames):
+    """What 4_generate_audio.py did before the scheduler: every chunk at once, one connection each"""
+    import requests
+
+    def post(text, filename):
+        response = requests.post(url, json={"text": text, "voice": VOICE}, timeout=60)
+        response.raise_for_status()
+        with open(filename, 'wb') as f:
+            f.write(response.content)
+
+    async def run():
+        await asyncio.gather(*(asyncio.to_thread(post, text, filename) for text, filename in zip(chunks, filenames)))
+    asyncio.run(run())
+
+def run_mode(mode, script, workdir, url, scheduler, split_script):
+    chunk_size = scheduler.get_stats().chunk_size(VOICE, len(script)) if mode == 'adaptive' else 2000
+    chunks, _ = split_script(script, chunk_size)
+    filenames = [os.path.join(workdir, f"{mode}.chunk{i}.mp3") for i in range(len(chunks))]
+    start = time.perf_counter()
+    try:
+        if mode == 'naive':
+            naive_synthesize(url, chunks, filenames)
+        else:
+            asyncio.run(scheduler.synthesize(chunks, filenames, VOICE))
+        ok = True
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, len(chunks), chunk_size, ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TTS scheduling benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=4, help="session pool size and service concurrency")
+    parser.add_argument("--handshake", type=float, default=0.3, help="seconds to open a connection")
+    parser.add_argument("--chars-per-second", type=float, default=1500, help="synthesis speed of the service")
+    parser.add_argument("--error-per-kchar", type=float, default=0.02, help="failure chance per 1000 characters")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="creaitcast_tts_") as workdir, \
+            fakes.FakeServices(tts_handshake=args.handshake, tts_chars_per_second=args.chars_per_second,
+                               tts_error_per_kchar=args.error_per_kchar, tts_concurrency=args.sessions) as services:
+        url = services.env()['TTS_URL']
+        os.environ.update(TTS_URL=url, TTS_SESSIONS=str(args.sessions),
+                          TTS_STATS=os.path.join(workdir, "tts_stats.json"))
+        # The scheduler reads its settings at import time
+        import tts_scheduler
+        spec = importlib.util.spec_from_file_location("stage_4", os.path.join(SCRIPTS_DIR, "4_generate_audio.py"))
+        stage = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(stage)
+
+        script = fixtures.podcast_script('long')
+        print(f"{len(script)} characters, service: {args.sessions} concurrent, {args.handshake}s handshake, "
+              f"{args.chars_per_second:.0f} chars/s, {args.error_per_kchar:.0%} failures per 1000 chars")
+        print(f"{'mode':<10}{'chunk':>7}{'chunks':>8}{'median s':>10}{'best s':>8}{'failed runs':>13}")
+        for mode in ('naive', 'pool', 'adaptive'):
+            times, failed = [], 0
+            for _ in range(args.repeat):
+                seconds, count, chunk_size, ok = run_mode(mode, script, workdir, url, tts_scheduler,
+                                                          stage.split_script)
+                if ok:
+                    times.append(seconds)
+                else:
+                    failed += 1
+            median = f"{statistics.median(times):.2f}" if times else '-'
+            best = f"{min(times):.2f}" if times else '-'
+            print(f"{mode:<10}{chunk_size:>7}{count:>8}{median:>10}{best:>8}{failed:>13}")
+        print()
+        print("\n".join(tts_scheduler.get_stats().report()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Scaling of segment-parallel video encoding with the number of worker processes.
+
+Renders a long synthetic episode (silent audio, the usual generated slides)
+with 5_create_video.py's segment encoder at increasing worker counts, and
+optionally with the serial moviepy renderer for reference.
+
+Every encoder runs with --threads x264 threads (1 by default), so the speedup
+measures the worker processes rather than x264's own threading. Pass
+--threads 0 to split the CPUs between the workers, as the stage does.
+
+Usage:
+    python benchmarks/video_scaling_bench.py [--minutes 60] [--slides 10] [--workers 1,2,4,8] [--threads 1]
+        [--serial]
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+import fakes
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), "scripts")
+
+def load_video_stage():
+    # The stage imports its helpers from the scripts folder, as it does when run as a script
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    spec = importlib.util.spec_from_file_location("create_video", os.path.join(SCRIPTS_DIR, "5_create_video.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def default_worker_counts():
+    counts, n = [], 1
+    while n < (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    return counts + [os.cpu_count() or 1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Video encoding scaling benchmark")
+    parser.add_argument("--minutes", type=float, default=60, help="episode length")
+    parser.add_argument("--slides", type=int, default=10, help="slides (and so segments) per episode")
+    parser.add_argument("--workers", default=",".join(str(n) for n in default_worker_counts()))
+    parser.add_argument("--threads", type=int, default=1,
+                        help="x264 threads per encoder (0: the CPUs divided between the workers)")
+    parser.add_argument("--serial", action="store_true", help="also time the serial moviepy renderer")
+    args = parser.parse_args(argv)
+    worker_counts = [int(n) for n in args.workers.split(",") if n]
+    if not worker_counts:
+        parser.error("--workers needs at least one worker count")
+
+    stage = load_video_stage()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="creaitcast_video_") as workdir:
+        audio_path = os.path.join(workdir, "episode.mp3")
+        with open(audio_path, "wb") as f:
+            f.write(fakes.silent_mp3(args.minutes * 60))
+        image_folder = os.path.join(workdir, "images")
+        os.makedirs(image_folder)
+        image_paths = stage.generate_images(["bitcoin", "market", "rates"], num_images=args.slides,
+                                            output_folder=image_folder)
+        duration = stage.audio_duration(audio_path)
+        output_video = os.path.join(workdir, "episode.mp4")
+
+        if args.serial:
+            start = time.perf_counter()
+            stage.render_serial(audio_path, output_video, image_paths, duration)
+            results.append(("serial (moviepy)", time.perf_counter() - start))
+
+        for workers in worker_counts:
+            threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+            start = time.perf_counter()
+            stage.render_segments(audio_path, output_video, image_paths, duration, workers=workers, threads=threads)
+            results.append((f"segments {workers}x{threads}", time.perf_counter() - start))
+
+    # Speedups are relative to the first worker count
+    reference = next(seconds for label, seconds in results if label.startswith("segments"))
+    print(f"\n{args.minutes:.0f} minute episode, {args.slides} slides, {os.cpu_count()} CPUs")
+    print(f"{'mode (workers x threads)':<26}{'seconds':>10}{'speedup':>10}{'x realtime':>12}")
+    for label, seconds in results:
+        print(f"{label:<26}{seconds:>10.1f}{reference / seconds:>10.2f}{args.minutes * 60 / seconds:>12.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Long-running episode worker.
+
+Keeps the stage modules loaded in one process, so the summarizer session, the
+NewsAPI connection pool and the YouTube client are built once and reused by
+every episode. Episodes come from the SQLite queue in episode_queue.py, either
+enqueued on demand or created by the daily schedule.
+
+Usage:
+    python daemon.py run [--daily 07:00] [--articles 13] [--poll 10] [--once] [--gc]
+    python daemon.py enqueue <podcast_number> <num_articles> [--at "2024-01-31 07:00"]
+    python daemon.py list
+"""
+import argparse
+import signal
+import sys
+import time
+import logging
+from datetime import datetime
+
+import storage
+from episode_queue import EpisodeQueue
+from main import STEPS, load_stage, run_episode, run_stage_in_process
+from preflight import check_episode
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("daemon")
+
+class EpisodeDaemon:
+    def __init__(self, queue, daily_at=None, num_articles=13, poll_interval=10, collect_garbage=False):
+        self.queue = queue
+        self.daily_at = daily_at
+        self.num_articles = num_articles
+        self.poll_interval = poll_interval
+        self.collect_garbage = collect_garbage
+        self.stopping = False
+
+    def warm_up(self):
+        """Import every stage up front so the first episode does not pay for it"""
+        start = time.perf_counter()
+        for step in STEPS:
+            load_stage(step)
+        load_stage("2_summarize_articles.py").get_summarizer()
+        # Open the TTS sessions now; they stay warm for every episode
+        load_stage("4_generate_audio.py").tts_scheduler.get_pool().warm_up()
+        logger.info(f"Stages loaded in {time.perf_counter() - start:.1f}s")
+
+    def schedule_daily(self, now=None):
+        """Enqueue today's episode once the daily time has passed"""
+        if not self.daily_at:
+            return
+        now = now or datetime.now()
+        hour, minute = (int(part) for part in self.daily_at.split(':'))
+        due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if now < due:
+            return
+        podcast_number = self.queue.next_podcast_number()
+        job_id = self.queue.enqueue(podcast_number, self.num_articles, due.timestamp(),
+                                    schedule_key=f"daily-{due.date().isoformat()}")
+        if job_id:
+            logger.info(f"Scheduled episode {podcast_number} for {due:%Y-%m-%d %H:%M}")
+
+    def run_job(self, job):
+        logger.info(f"Starting episode {job['podcast_number']} ({job['num_articles']} articles, job {job['id']})")
+        # Nobody is there to answer a consent prompt, and a failed check would only fail later
+        plan = check_episode(job['podcast_number'], job['num_articles'], unattended=True)
+        if plan['blocking']:
+            problems = "; ".join(f"{result['name']}: {result['detail']}" for result in plan['blocking'])
+            logger.error(f"Episode {job['podcast_number']} refused by the pre-flight checks: {problems}")
+            self.queue.finish(job['id'], failed_stage='preflight', error=problems)
+            return
+        start = time.perf_counter()
+        try:
+            failed_stage = run_episode(job['podcast_number'], job['num_articles'], runner=run_stage_in_process)
+            self.queue.finish(job['id'], failed_stage=failed_stage)
+        except Exception as e:
+            logger.error(f"Episode {job['podcast_number']} crashed: {e}")
+            self.queue.finish(job['id'], error=str(e))
+            return
+        elapsed = time.perf_counter() - start
+        if failed_stage:
+            logger.error(f"Episode {job['podcast_number']} failed in {failed_stage} after {elapsed:.1f}s")
+        else:
+            logger.info(f"Episode {job['podcast_number']} done in {elapsed:.1f}s")
+            if self.collect_garbage:
+                report, _ = storage.collect(episodes={job['podcast_number']})
+                reclaimed = sum(size for sizes in report.values() for size in sizes.values())
+                logger.info(f"Reclaimed {storage.format_size(reclaimed)} from episode {job['podcast_number']}")
+
+    def stop(self, *_):
+        logger.info("Stopping after the current episode")
+        self.stopping = True
+
+    def run(self, once=False):
+        # Only one daemon should serve a queue file, so anything still running is an orphan
+        requeued = self.queue.requeue_running()
+        if requeued:
+            logger.warning(f"Requeued {requeued} interrupted episode(s)")
+        self.warm_up()
+        while not self.stopping:
+            self.schedule_daily()
+            job = self.queue.claim_next()
+            if job:
+                self.run_job(job)
+            elif once:
+                break
+            else:
+                time.sleep(self.poll_interval)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Episode daemon")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="serve the episode queue")
+    run.add_argument("--daily", help="enqueue a new episode every day at HH:MM")
+    run.add_argument("--articles", type=int, default=13, help="articles per scheduled episode")
+    run.add_argument("--poll", type=float, default=10, help="seconds between queue checks")
+    run.add_argument("--once", action="store_true", help="exit when no job is due")
+    run.add_argument("--gc", action="store_true", help="apply the storage retention policy after each upload")
+
+    enqueue = commands.add_parser("enqueue", help="add an episode to the queue")
+    enqueue.add_argument("podcast_number", type=int)
+    enqueue.add_argument("num_articles", type=int)
+    enqueue.add_argument("--at", help='run at "YYYY-MM-DD HH:MM" instead of now')
+
+    commands.add_parser("list", help="show recent jobs")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    queue = EpisodeQueue()
+
+    if args.command == "enqueue":
+        run_at = datetime.strptime(args.at, "%Y-%m-%d %H:%M").timestamp() if args.at else None
+        job_id = queue.enqueue(args.podcast_number, args.num_articles, run_at)
+        print(f"Queued episode {args.podcast_number} as job {job_id}")
+    elif args.command == "list":
+        for job in queue.jobs():
+            started = datetime.fromtimestamp(job['started_at']).strftime('%Y-%m-%d %H:%M') if job['started_at'] else '-'
+            duration = f"{job['finished_at'] - job['started_at']:.0f}s" if job['finished_at'] else ''
+            print(f"{job['id']:>5}  episode {job['podcast_number']:<5} {job['status']:<8} {started:<17} {duration:>6}  "
+                  f"{job['failed_stage'] or job['error'] or ''}")
+    else:
+        daemon = EpisodeDaemon(queue, args.daily, args.articles, args.poll, args.gc)
+        signal.signal(signal.SIGTERM, daemon.stop)
+        signal.signal(signal.SIGINT, daemon.stop)
+        daemon.run(once=args.once)
+    queue.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import os
+import re
+import sqlite3
+import time
+
+# SQLite file holding the episode jobs waiting for the daemon
+EPISODE_QUEUE = os.getenv('EPISODE_QUEUE', 'output/episodes.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    podcast_number INTEGER NOT NULL,
+    num_articles INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    run_at REAL NOT NULL,
+    schedule_key TEXT UNIQUE,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    failed_stage TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_at);
+"""
+
+class EpisodeQueue:
+    """Episode jobs in a SQLite file: queued -> running -> done | failed.
+
+    Several processes may share the file; claiming a job is a single atomic UPDATE.
+    """
+
+    def __init__(self, path=EPISODE_QUEUE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, podcast_number, num_articles, run_at=None, schedule_key=None):
+        """Add a job; returns its id, or None if a job with the same schedule_key already exists"""
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO jobs (podcast_number, num_articles, run_at, schedule_key, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (podcast_number, num_articles, run_at or now, schedule_key, now))
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def claim_next(self, now=None):
+        """Mark the oldest due job as running and return it, or None"""
+        now = now or time.time()
+        return self.conn.execute(
+            "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ("
+            "  SELECT id FROM jobs WHERE status = 'queued' AND run_at <= ? ORDER BY run_at, id LIMIT 1"
+            ") AND status = 'queued' RETURNING *",
+            (now, now)).fetchone()
+
+    def finish(self, job_id, failed_stage=None, error=None):
+        status = 'failed' if failed_stage or error else 'done'
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, failed_stage = ?, error = ? WHERE id = ?",
+            (status, time.time(), failed_stage, error, job_id))
+
+    def requeue_running(self):
+        """Put back jobs left running by a process that died; returns how many"""
+        return self.conn.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'").rowcount
+
+    def jobs(self, limit=20):
+        return self.conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+    def next_podcast_number(self, output_folder='output'):
+        """One past the highest episode number seen in the queue or on disk"""
+        highest = self.conn.execute("SELECT MAX(podcast_number) FROM jobs").fetchone()[0] or 0
+        if os.path.isdir(output_folder):
+            for name in os.listdir(output_folder):
+                match = re.match(r'^podcast_(\d+)$', name)
+                if match:
+                    highest = max(highest, int(match.group(1)))
+        return highest + 1
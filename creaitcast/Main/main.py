@@ -1,6 +1,30 @@
 import os
+import asyncio
+import contextlib
+import functools
+import importlib.util
+import json
 import subprocess
 import sys
+import time
+
+from storage import episode_folder, episode_in_progress, tree_size
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts")
+
+STEPS = [
+    "1_parse_articles.py",
+    "2_summarize_articles.py",
+    "3_create_podcast_script.py",
+    "4_generate_audio.py",
+    "5_create_video.py",
+    "6_upload_to_youtube.py"
+]
+
+# One JSON line per stage run; preflight.py estimates stage costs from it
+STAGE_TIMES = os.getenv('STAGE_TIMES', 'output/stage_times.jsonl')
+
+_stage_modules = {}
 
 def create_folders(podcast_number):
     base_path = f"output/podcast_{podcast_number}"
@@ -8,9 +32,10 @@ def create_folders(podcast_number):
     for folder in folders:
         os.makedirs(os.path.join(base_path, folder), exist_ok=True)
 
-def run_script(script_name, podcast_number, num_articles):
-    script_path = os.path.join("scripts", script_name)
-    result = subprocess.run([sys.executable, script_path, str(podcast_number), str(num_articles)], capture_output=True, text=True)
+def run_script(script_name, podcast_number, num_articles, flags=()):
+    script_path = os.path.join(SCRIPTS_DIR, script_name)
+    result = subprocess.run([sys.executable, script_path, str(podcast_number), str(num_articles), *flags],
+                            capture_output=True, text=True)
     print(f"Output from {script_name}:")
     print(result.stdout)
     if result.stderr:
@@ -21,23 +46,122 @@ def run_script(script_name, podcast_number, num_articles):
         return False
     return True
 
+def load_stage(script_name):
+    """Import a stage script as a module, once per process.
+
+    Modules stay loaded, so models, sessions and API clients they cache survive between episodes.
+    """
+    if script_name not in _stage_modules:
+        if SCRIPTS_DIR not in sys.path:
+            sys.path.insert(0, SCRIPTS_DIR)
+        module_name = "stage_" + os.path.splitext(script_name)[0]
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPTS_DIR, script_name))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _stage_modules[script_name] = module
+    return _stage_modules[script_name]
+
+def run_stage_in_process(script_name, podcast_number, num_articles):
+    """Run a stage's main() in this process; same contract as run_script"""
+    try:
+        module = load_stage(script_name)
+        result = module.main(podcast_number, num_articles)
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            print(f"Script {script_name} exited with {e.code}")
+            return False
+    except Exception as e:
+        print(f"Script {script_name} failed: {e}")
+        return False
+    return True
+
+def record_stage_time(step, podcast_number, num_articles, seconds, ok, path=STAGE_TIMES):
+    """Append one stage run to the timing history; the episode folder size is kept for disk estimates"""
+    record = {'step': step, 'podcast_number': podcast_number, 'num_articles': num_articles,
+              'seconds': round(seconds, 3), 'ok': ok, 'episode_bytes': tree_size(episode_folder(podcast_number)),
+              'finished_at': time.time()}
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not record the time of {step}: {e}")
+
+def run_episode(podcast_number, num_articles, runner=run_script, steps=STEPS):
+    """Run the steps in order, stopping at the first failure. Returns the failed step or None.
+
+    In-process stages share one in-memory episode (see scripts/episode.py) instead of re-reading each other's files.
+    """
+    create_folders(podcast_number)
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    from episode import flush_episode, held_episode
+
+    in_process = runner is run_stage_in_process
+    shared = held_episode(podcast_number) if in_process else contextlib.nullcontext()
+    with episode_in_progress(podcast_number), shared:
+        for step in steps:
+            print(f"\nRunning {step}...")
+            start = time.perf_counter()
+            ok = runner(step, podcast_number, num_articles)
+            # A stage is done once its files are on disk, and fails with them
+            for path, error in (flush_episode(podcast_number) if in_process else {}).items():
+                print(f"{step} could not write {path}: {error}")
+                ok = False
+            record_stage_time(step, podcast_number, num_articles, time.perf_counter() - start, ok)
+            if not ok:
+                print(f"Error occurred in {step}. Stopping process.")
+                return step
+    return None
+
+def print_profile_summary(podcast_number, top=15):
+    """Hottest functions across every stage profiled for the episode"""
+    import pstats
+
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    from profiling import profile_folder
+
+    folder = profile_folder(podcast_number)
+    # No stage got as far as writing a profile
+    if not os.path.isdir(folder):
+        return
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.pstats'))
+    if files:
+        print(f"\nHottest functions over {len(files)} stage profile(s) in {folder}:")
+        pstats.Stats(*files, stream=sys.stdout).sort_stats('tottime').print_stats(top)
+
 def main():
     podcast_number = 20 #int(input("Enter the podcast number: "))
     num_articles = 13 #int(input("Enter the number of articles to process: "))
-    create_folders(podcast_number)
-    steps = [
-        "1_parse_articles.py",
-        "2_summarize_articles.py",
-        "3_create_podcast_script.py",
-        "4_generate_audio.py",
-        "5_create_video.py",
-        "6_upload_to_youtube.py"
-    ]
-    for step in steps:
-        print(f"\nRunning {step}...")
-        if not run_script(step, podcast_number, num_articles):
-            print(f"Error occurred in {step}. Stopping process.")
-            break
+    # --profile and --trace-memory are handed on to every stage (see scripts/profiling.py)
+    flags = [arg for arg in sys.argv[1:] if arg in ('--profile', '--trace-memory')]
+    # --plan only prints the plan and the pre-flight checks, --skip-preflight starts without them
+    options = [arg for arg in sys.argv[1:] if arg in ('--plan', '--skip-preflight')]
+    args = [arg for arg in sys.argv[1:] if arg not in flags and arg not in options]
+    if len(set(options)) == 2:
+        print("--plan only runs the pre-flight checks, it cannot be combined with --skip-preflight")
+        print("Usage: python main.py [<podcast_number> <num_articles>] [--plan | --skip-preflight] "
+              "[--profile] [--trace-memory]")
+        sys.exit(2)
+    if len(args) == 2:
+        podcast_number = int(args[0])
+        num_articles = int(args[1])
+    if '--skip-preflight' not in options:
+        from preflight import check_episode, print_plan
+
+        # Nobody can complete a browser consent flow for a run that is not attached to a terminal
+        plan = check_episode(podcast_number, num_articles, unattended=not sys.stdin.isatty())
+        print_plan(plan)
+        if plan['blocking']:
+            sys.exit(1)
+        if '--plan' in options:
+            return
+    run_episode(podcast_number, num_articles, runner=functools.partial(run_script, flags=flags))
+    if '--profile' in flags:
+        print_profile_summary(podcast_number)
 
     print("\nPodcast generation process completed.")
 
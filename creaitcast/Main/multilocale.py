@@ -0,0 +1,255 @@
+"""Multi-language episodes.
+
+Fetches and parses the articles once, then produces the episode in several
+languages at the same time: every locale in scripts/locales.py gets its own
+summaries, script, voice and video. Locales that use the same summarizer
+share its summaries. The slideshow is encoded once and joined with the audio
+of each locale (--own-slides renders one per locale instead), so each extra
+language mostly costs its summaries and TTS, which overlap with the others'.
+The default locale (English) stays in the usual episode folders and
+is the one uploaded with --upload; the others go to
+output/podcast_N/locales/<code>/. output/podcast_N/locales.json lists what
+each locale produced.
+
+Usage:
+    python multilocale.py <podcast_number> <num_articles> [--locales en,it] [--upload] [--no-fetch] [--own-slides]
+        [--skip-preflight]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from main import SCRIPTS_DIR, create_folders, load_stage, run_stage_in_process
+from storage import episode_in_progress
+
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+from locales import DEFAULT_LOCALE, LOCALES, format_summary, locale_paths, video_segment_folder
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("multilocale")
+
+EPISODE_LOCALES = os.getenv('EPISODE_LOCALES', 'en,it')
+# One slideshow for every locale instead of one per locale (see render_shared_video)
+SHARED_VIDEO = os.getenv('MULTILOCALE_SHARED_VIDEO', '1') != '0'
+# Articles summarized at once by a local model; the HF API summarizer keeps to its request delay instead
+LOCAL_SUMMARY_WORKERS = int(os.getenv('LOCAL_SUMMARY_WORKERS', '0')) or os.cpu_count() or 1
+
+def read_articles(podcast_number, num_articles):
+    """(index, title, text) of every fetched article, parsed once for all locales"""
+    input_folder = f"output/podcast_{podcast_number}/articles"
+    articles = []
+    for i in range(1, num_articles + 1):
+        path = os.path.join(input_folder, f"article_{i}.txt")
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        title = content.split('\n')[0].replace("Title: ", "").strip()
+        articles.append((i, title, content.split('Content:\n')[1].strip()))
+    return articles
+
+def summarize_articles(summarizer, articles):
+    """{index: (title, summary)} from one summarizer stage, shared by every locale that uses it"""
+    stage = load_stage(summarizer)
+    delay = getattr(stage, 'HF_REQUEST_DELAY', None)
+    start = time.perf_counter()
+    if delay is None:
+        with ThreadPoolExecutor(max_workers=LOCAL_SUMMARY_WORKERS) as executor:
+            summaries = list(executor.map(stage.summarize_text, [text for _, _, text in articles]))
+    else:
+        summaries = []
+        for n, (_, _, text) in enumerate(articles):
+            if n:
+                time.sleep(delay)
+            summaries.append(stage.summarize_text(text))
+    logger.info(f"{summarizer}: {len(articles)} articles in {time.perf_counter() - start:.1f}s")
+    return {index: (title, summary) for (index, title, _), summary in zip(articles, summaries)}
+
+def voice_locale(podcast_number, num_articles, locale, summaries):
+    """Summaries, script and audio of one locale; returns what was produced and where it stopped"""
+    paths = locale_paths(podcast_number, locale)
+    result = {'name': LOCALES[locale]['name'], 'voice': LOCALES[locale]['voice'], 'failed': None, 'seconds': {}}
+    step = 'summarize'
+    try:
+        start = time.perf_counter()
+        summaries = summaries.result()
+        os.makedirs(paths['summaries'], exist_ok=True)
+        for index, (title, summary) in summaries.items():
+            with open(os.path.join(paths['summaries'], f"summary_{index}.txt"), 'w', encoding='utf-8') as f:
+                f.write(format_summary(title, summary, locale))
+        result['seconds'][step] = time.perf_counter() - start
+
+        step = 'script'
+        start = time.perf_counter()
+        script = load_stage("3_create_podcast_script.py").create_script(podcast_number, num_articles, locale)
+        result['script'] = paths['script']
+        result['seconds'][step] = time.perf_counter() - start
+
+        step = 'audio'
+        start = time.perf_counter()
+        asyncio.run(load_stage("4_generate_audio.py").text_to_speech(script, paths['audio'],
+                                                                     LOCALES[locale]['voice']))
+        result['audio'] = paths['audio']
+        result['seconds'][step] = time.perf_counter() - start
+    except Exception as e:
+        logger.error(f"{locale}: {step} failed: {e}")
+        result['failed'] = step
+    return result
+
+def read_script(result):
+    with open(result['script'], 'r', encoding='utf-8') as f:
+        return f.read()
+
+def render_locale_video(podcast_number, locale, result, workers):
+    """The video of one locale with its own slides (VIDEO_ENCODE_MODE=serial or MULTILOCALE_SHARED_VIDEO=0)"""
+    paths = locale_paths(podcast_number, locale)
+    start = time.perf_counter()
+    try:
+        os.makedirs(paths['images'], exist_ok=True)
+        # Only the default locale feeds the keyword index the YouTube title is built from
+        load_stage("5_create_video.py").convert_audio_to_video(
+            result['audio'], paths['video'], read_script(result), paths['images'],
+            podcast_number=podcast_number if locale == DEFAULT_LOCALE else None, workers=workers)
+        result['video'] = paths['video']
+        result['seconds']['video'] = time.perf_counter() - start
+    except Exception as e:
+        logger.error(f"{locale}: video failed: {e}")
+        result['failed'] = 'video'
+
+def render_shared_video(podcast_number, results):
+    """Encode one slideshow, as long as the longest locale, and join it with the audio of every locale.
+
+    The slides come from the default locale's script (or the first locale's without it); joining is a
+    stream copy plus the AAC encode, so every locale after the first costs next to nothing. A shorter
+    locale keeps only the front of every segment, so its slides are spaced over its own length and
+    the last ones are not cut off.
+    """
+    stage = load_stage("5_create_video.py")
+    voiced = [locale for locale, result in results.items() if result['failed'] is None]
+    if not voiced:
+        return
+    lead = DEFAULT_LOCALE if DEFAULT_LOCALE in voiced else voiced[0]
+    lead_paths = locale_paths(podcast_number, lead)
+    segment_folder = video_segment_folder(lead_paths['video'])
+    ffmpeg = stage.ffmpeg_binary()
+    start = time.perf_counter()
+    try:
+        durations = {locale: stage.audio_duration(results[locale]['audio']) for locale in voiced}
+        duration = max(durations.values())
+        keywords = stage.extract_keywords(read_script(results[lead]),
+                                          podcast_number=podcast_number if lead == DEFAULT_LOCALE else None)
+        os.makedirs(lead_paths['images'], exist_ok=True)
+        image_paths = stage.generate_images(keywords, output_folder=lead_paths['images'])
+        segment_paths = stage.encode_slideshow(ffmpeg, image_paths, duration, segment_folder)
+        logger.info(f"Slideshow of {duration:.0f}s for {len(voiced)} locale(s) in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        logger.error(f"Slideshow failed: {e}")
+        shutil.rmtree(segment_folder, ignore_errors=True)
+        for locale in voiced:
+            results[locale]['failed'] = 'video'
+        return
+
+    try:
+        encoded_frames = stage.segment_frame_counts(duration, len(segment_paths))
+        for locale in voiced:
+            video = locale_paths(podcast_number, locale)['video']
+            try:
+                os.makedirs(os.path.dirname(video), exist_ok=True)
+                frames = [min(own, encoded) for own, encoded in
+                          zip(stage.segment_frame_counts(durations[locale], len(segment_paths)), encoded_frames)]
+                stage.join_segments(ffmpeg, segment_paths, results[locale]['audio'], video, segment_folder, frames)
+                results[locale]['video'] = video
+                results[locale]['seconds']['video'] = time.perf_counter() - start
+            except Exception as e:
+                logger.error(f"{locale}: video failed: {e}")
+                results[locale]['failed'] = 'video'
+    finally:
+        shutil.rmtree(segment_folder, ignore_errors=True)
+
+def run_multilocale(podcast_number, num_articles, locales, fetch=True, upload=False, shared_video=SHARED_VIDEO):
+    """Fetch once, then fan out one pipeline per locale. Returns {locale: result} (see voice_locale)."""
+    unknown = [locale for locale in locales if locale not in LOCALES]
+    if unknown:
+        raise ValueError(f"Unknown locale(s): {', '.join(unknown)}; known: {', '.join(LOCALES)}")
+    # Import the stages before the threads start, so none is imported twice
+    summarizers = sorted({LOCALES[locale]['summarizer'] for locale in locales})
+    for script_name in ["3_create_podcast_script.py", "4_generate_audio.py", "5_create_video.py", *summarizers]:
+        load_stage(script_name)
+
+    create_folders(podcast_number)
+    with episode_in_progress(podcast_number):
+        if fetch and not run_stage_in_process("1_parse_articles.py", podcast_number, num_articles):
+            return {locale: {'failed': 'fetch'} for locale in locales}
+        articles = read_articles(podcast_number, num_articles)
+        logger.info(f"{len(articles)} articles for {len(locales)} locale(s), {len(summarizers)} summarizer(s)")
+
+        with ThreadPoolExecutor(max_workers=len(summarizers)) as summarizing, \
+                ThreadPoolExecutor(max_workers=len(locales)) as voicing:
+            summaries = {name: summarizing.submit(summarize_articles, name, articles) for name in summarizers}
+            futures = {locale: voicing.submit(voice_locale, podcast_number, num_articles, locale,
+                                              summaries[LOCALES[locale]['summarizer']])
+                       for locale in locales}
+            results = {locale: future.result() for locale, future in futures.items()}
+
+        video_stage = load_stage("5_create_video.py")
+        if shared_video and video_stage.VIDEO_ENCODE_MODE == 'segments':
+            render_shared_video(podcast_number, results)
+        else:
+            # The ffmpeg encoders of all locales share the machine
+            workers = max(1, video_stage.VIDEO_WORKERS // len(locales))
+            with ThreadPoolExecutor(max_workers=len(locales)) as rendering:
+                for locale, result in results.items():
+                    if result['failed'] is None:
+                        rendering.submit(render_locale_video, podcast_number, locale, result, workers)
+
+        with open(f"output/podcast_{podcast_number}/locales.json", 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+        if upload:
+            if DEFAULT_LOCALE in results and results[DEFAULT_LOCALE]['failed'] is None:
+                if not run_stage_in_process("6_upload_to_youtube.py", podcast_number, num_articles):
+                    results[DEFAULT_LOCALE]['failed'] = 'upload'
+            else:
+                logger.warning(f"Nothing uploaded: the {DEFAULT_LOCALE} locale was not produced")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Produce one episode in several languages")
+    parser.add_argument("podcast_number", type=int)
+    parser.add_argument("num_articles", type=int)
+    parser.add_argument("--locales", default=EPISODE_LOCALES, help=f"comma separated, of: {', '.join(LOCALES)}")
+    parser.add_argument("--upload", action="store_true", help=f"upload the {DEFAULT_LOCALE} video when done")
+    parser.add_argument("--no-fetch", action="store_true", help="reuse the articles already fetched")
+    parser.add_argument("--own-slides", action="store_true", help="render a separate slideshow for every locale")
+    parser.add_argument("--skip-preflight", action="store_true", help="start without the pre-flight checks")
+    args = parser.parse_args(argv)
+
+    locales = [locale for locale in args.locales.split(',') if locale]
+    if not args.skip_preflight:
+        from preflight import check_episode, print_plan
+
+        summarizers = sorted({LOCALES[locale]['summarizer'] for locale in locales if locale in LOCALES})
+        steps = [*([] if args.no_fetch else ["1_parse_articles.py"]), *summarizers, "3_create_podcast_script.py",
+                 "4_generate_audio.py", "5_create_video.py", *(["6_upload_to_youtube.py"] if args.upload else [])]
+        plan = check_episode(args.podcast_number, args.num_articles, steps, unattended=not sys.stdin.isatty())
+        print_plan(plan)
+        if plan['blocking']:
+            return 1
+    start = time.perf_counter()
+    results = run_multilocale(args.podcast_number, args.num_articles, locales, fetch=not args.no_fetch,
+                              upload=args.upload, shared_video=SHARED_VIDEO and not args.own_slides)
+    for locale, result in results.items():
+        status = f"failed at {result['failed']}" if result['failed'] else result['video']
+        print(f"{locale:<10} {status}")
+    print(f"Episode {args.podcast_number} in {len(locales)} locale(s) took {time.perf_counter() - start:.1f}s")
+    return 1 if any(result['failed'] for result in results.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""Pre-flight planning and checks for an episode run.
+
+Before any stage runs, the episode is planned: the steps to run, the
+artifacts each one needs (made by an earlier step or already on disk) and an
+estimate of what each step will cost, taken from the stage times main.py
+records in output/stage_times.jsonl (STAGE_TIMES). Then every requirement of
+the planned steps is checked at once, in threads: API keys and upload
+credentials, the ffmpeg binary and its encoders, Python packages, local
+models, free disk space and whether the services answer.
+
+A failed check means a step cannot succeed, so the run is refused before the
+first stage starts instead of after the stages in front of it have run.
+Warnings (a service that does not answer right now, an upload that will wait
+for browser consent, a model that still has to be downloaded) are printed and
+the run goes ahead.
+
+Usage:
+    python preflight.py <podcast_number> <num_articles> [--steps 4,5,6] [--unattended]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from main import SCRIPTS_DIR, STAGE_TIMES, STEPS
+from storage import episode_folder, format_size
+
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+# The stages read their keys from .env, so the checks must see the same environment
+load_dotenv()
+
+# Seconds a service gets to answer before it counts as unreachable
+PREFLIGHT_TIMEOUT = float(os.getenv('PREFLIGHT_TIMEOUT', '5'))
+# Free space kept on top of the estimated size of the episode
+PREFLIGHT_MIN_FREE_MB = int(os.getenv('PREFLIGHT_MIN_FREE_MB', '500'))
+# Episode size per article until an episode has been recorded in STAGE_TIMES
+DEFAULT_EPISODE_BYTES_PER_ARTICLE = 20 * 1024 * 1024
+# Stage runs per step the estimates are taken from
+HISTORY_RUNS = 20
+
+# Artifact -> path of the file that shows it was produced
+ARTIFACTS = {
+    'articles': "output/podcast_{n}/articles/article_1.txt",
+    'summaries': "output/podcast_{n}/summaries/summary_1.txt",
+    'script': "output/podcast_{n}/scripts/podcast_script.txt",
+    'audio': "output/podcast_{n}/audio/episode{n}.mp3",
+    'video': "output/podcast_{n}/video/episode{n}.mp4",
+}
+# Stage number -> (artifacts it needs, artifact it produces); every summarizer is a stage 2
+STAGE_ARTIFACTS = {
+    '1': ((), 'articles'),
+    '2': (('articles',), 'summaries'),
+    '3': (('summaries',), 'script'),
+    '4': (('script',), 'audio'),
+    '5': (('audio', 'script'), 'video'),
+    '6': (('video', 'script'), None),
+}
+# Summarizer stages that run a model on this machine, and the model they load
+LOCAL_MODELS = {
+    '2_summarize_articleseng.py': 'facebook/bart-large-cnn',
+    '2_summarize_articles_IT_slow.py': 'facebook/mbart-large-cc25',
+}
+
+def stage_number(step):
+    return step.split('_')[0]
+
+def check_modules(*modules):
+    missing = [module for module in modules if importlib.util.find_spec(module) is None]
+    if missing:
+        return 'fail', f"not installed: {', '.join(missing)}"
+    return 'ok', ', '.join(modules)
+
+def check_key(name):
+    if not os.getenv(name):
+        return 'fail', f"{name} is not set (environment or .env)"
+    return 'ok', f"{name} is set"
+
+def check_reachable(url, headers=None):
+    """Any HTTP answer counts; a rejected key is a failure, a service that does not answer only a warning"""
+    import requests
+
+    try:
+        response = requests.head(url, headers=headers, timeout=PREFLIGHT_TIMEOUT, allow_redirects=False)
+    except requests.RequestException as e:
+        return 'warn', f"{url} did not answer ({type(e).__name__})"
+    if headers and response.status_code in (401, 403):
+        return 'fail', f"{url} rejected the key (HTTP {response.status_code})"
+    return 'ok', f"{url} answered"
+
+def check_ffmpeg(*encoders):
+    """The ffmpeg the stages would use runs and has the encoders they ask for"""
+    try:
+        from moviepy.config import get_setting
+
+        ffmpeg = get_setting("FFMPEG_BINARY")
+        result = subprocess.run([ffmpeg, '-hide_banner', '-encoders'], capture_output=True, text=True,
+                                timeout=30)
+    except Exception as e:
+        return 'fail', f"ffmpeg is not usable: {e}"
+    available = {line.split()[1] for line in result.stdout.splitlines() if len(line.split()) > 1}
+    missing = [encoder for encoder in encoders if encoder not in available]
+    if result.returncode != 0 or missing:
+        return 'fail', f"{ffmpeg} has no {', '.join(missing) or 'encoder list'}"
+    return 'ok', f"{ffmpeg} ({', '.join(encoders)})"
+
+def check_local_model(model):
+    if importlib.util.find_spec('transformers') is None:
+        return 'fail', f"transformers is not installed, needed for {model}"
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return 'warn', f"cannot tell whether {model} is cached"
+    if not isinstance(try_to_load_from_cache(model, 'config.json'), str):
+        if os.getenv('HF_HUB_OFFLINE') == '1':
+            return 'fail', f"{model} is not cached and HF_HUB_OFFLINE=1"
+        return 'warn', f"{model} is not cached and is downloaded on first use"
+    return 'ok', f"{model} is cached"
+
+def check_youtube_credentials(unattended):
+    # Not through stage 6 itself: importing it would load .env and switch this process's logging to DEBUG
+    from youtube_credentials import credentials_status
+
+    status, detail = credentials_status()
+    if status == 'consent':
+        # A daemon or a cron job would wait on the browser forever
+        return ('fail' if unattended else 'warn'), detail
+    return ('ok' if status == 'ok' else 'fail'), detail
+
+def tts_target():
+    url = os.getenv('TTS_URL')
+    return url or 'https://speech.platform.bing.com', bool(url)
+
+def stage_checks(step, unattended):
+    """(name, check) pairs a step needs; checks with the same name are run once for all steps"""
+    number = stage_number(step)
+    if number == '1':
+        return [('packages: fetch', lambda: check_modules('requests', 'bs4', 'newsapi', 'dotenv')),
+                ('NewsAPI key', lambda: check_key('newsapi')),
+                ('NewsAPI', lambda: check_reachable(os.getenv('NEWSAPI_URL') or 'https://newsapi.org'))]
+    if number == '2' and step in LOCAL_MODELS:
+        model = LOCAL_MODELS[step]
+        return [(f"model: {model}", lambda: check_local_model(model))]
+    if number == '2':
+        hf_url = os.getenv('HF_API_URL', 'https://api-inference.huggingface.co/models/') + 'facebook/bart-large-cnn'
+        return [('packages: HF summarizer', lambda: check_modules('requests', 'dotenv', 'psutil')),
+                ('HF key', lambda: check_key('HF')),
+                ('Hugging Face', lambda: check_reachable(hf_url, {"Authorization": f"Bearer {os.getenv('HF')}"})
+                 if os.getenv('HF') else ('warn', "not checked without a key"))]
+    if number == '4':
+        url, http = tts_target()
+        return [('packages: audio', lambda: check_modules('numpy', 'requests' if http else 'edge_tts')),
+                ('ffmpeg: audio', lambda: check_ffmpeg('libmp3lame')),
+                ('TTS service', lambda: check_reachable(url))]
+    if number == '5':
+        return [('packages: video', lambda: check_modules('moviepy', 'PIL')),
+                ('ffmpeg: video', lambda: check_ffmpeg('libx264', 'aac'))]
+    if number == '6':
+        return [('packages: upload', lambda: check_modules('googleapiclient', 'google_auth_oauthlib', 'httplib2')),
+                ('YouTube credentials', lambda: check_youtube_credentials(unattended)),
+                ('YouTube', lambda: check_reachable(os.getenv('YOUTUBE_API_URL') or 'https://www.googleapis.com'))]
+    return []
+
+def load_history(path=STAGE_TIMES):
+    """Successful stage runs recorded by main.run_episode, oldest first"""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('ok') and record.get('num_articles'):
+                    records.append(record)
+    except OSError:
+        pass
+    return records
+
+def estimate_seconds(step, num_articles, history):
+    """Median time per article of the step's recent runs, times the articles; None without history"""
+    runs = [record for record in history if record['step'] == step][-HISTORY_RUNS:]
+    if not runs:
+        return None, 0
+    return statistics.median(record['seconds'] / record['num_articles'] for record in runs) * num_articles, len(runs)
+
+def estimate_episode_bytes(num_articles, history):
+    """Size of a finished episode per article (the last stage that writes files), times the articles"""
+    sizes = [record['episode_bytes'] / record['num_articles'] for record in history
+             if stage_number(record['step']) == '5' and record.get('episode_bytes')][-HISTORY_RUNS:]
+    per_article = statistics.median(sizes) if sizes else DEFAULT_EPISODE_BYTES_PER_ARTICLE
+    return int(per_article * num_articles)
+
+def check_disk(podcast_number, num_articles, steps, history):
+    if not any(stage_number(step) in ('4', '5') for step in steps):
+        return 'ok', "no audio or video to write"
+    folder = episode_folder(podcast_number)
+    probe = folder if os.path.isdir(folder) else '.'
+    # Video segments and the joined video are on disk at the same time
+    needed = 2 * estimate_episode_bytes(num_articles, history) + PREFLIGHT_MIN_FREE_MB * 1024 * 1024
+    free = shutil.disk_usage(probe).free
+    if free < needed:
+        return 'fail', f"{format_size(free)} free, the episode needs about {format_size(needed)}"
+    return 'ok', f"{format_size(free)} free, about {format_size(needed)} needed"
+
+def plan_steps(podcast_number, steps, num_articles, history):
+    """The steps in order with their inputs, where each input comes from and their estimated cost"""
+    produced, planned = {}, []
+    for step in steps:
+        inputs, output = STAGE_ARTIFACTS.get(stage_number(step), ((), None))
+        sources = {}
+        for artifact in inputs:
+            if artifact in produced:
+                sources[artifact] = produced[artifact]
+            elif os.path.exists(ARTIFACTS[artifact].format(n=podcast_number)):
+                sources[artifact] = 'disk'
+            else:
+                sources[artifact] = None
+        seconds, runs = estimate_seconds(step, num_articles, history)
+        planned.append({'step': step, 'inputs': sources, 'seconds': seconds, 'runs': runs})
+        if output:
+            produced[output] = step
+    return planned
+
+def check_episode(podcast_number, num_articles, steps=STEPS, unattended=False):
+    """Plan the run and check everything it needs. 'blocking' lists the failed checks (empty: go ahead)."""
+    start = time.perf_counter()
+    history = load_history()
+    planned = plan_steps(podcast_number, steps, num_articles, history)
+
+    checks = {}
+    for step in steps:
+        for name, check in stage_checks(step, unattended):
+            checks.setdefault(name, {'name': name, 'check': check, 'steps': []})['steps'].append(step)
+    checks['disk space'] = {'name': 'disk space', 'steps': list(steps),
+                            'check': lambda: check_disk(podcast_number, num_articles, steps, history)}
+
+    def run(entry):
+        try:
+            return entry['check']()
+        except Exception as e:
+            return 'warn', f"check did not complete: {e}"
+
+    results = []
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        for entry, (status, detail) in zip(checks.values(), executor.map(run, checks.values())):
+            results.append({'name': entry['name'], 'steps': entry['steps'], 'status': status, 'detail': detail})
+    missing = {}
+    for item in planned:
+        for artifact, source in item['inputs'].items():
+            if source is None:
+                missing.setdefault(artifact, []).append(item['step'])
+    for artifact, needed_by in missing.items():
+        results.append({'name': f"input: {artifact}", 'steps': needed_by, 'status': 'fail',
+                        'detail': f"no earlier step makes it and {ARTIFACTS[artifact].format(n=podcast_number)} "
+                                  "does not exist"})
+
+    blocking = [result for result in results if result['status'] == 'fail']
+    return {'podcast_number': podcast_number, 'num_articles': num_articles, 'steps': planned, 'checks': results,
+            'blocking': blocking, 'seconds': time.perf_counter() - start}
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '?'
+    return f"{seconds / 60:.1f}m" if seconds >= 60 else f"{seconds:.0f}s"
+
+def wasted_before(plan):
+    """Steps that would run before the first step that cannot succeed, and their estimated seconds"""
+    failing = {step for result in plan['blocking'] for step in result['steps']}
+    ran, seconds = [], 0.0
+    for item in plan['steps']:
+        if item['step'] in failing:
+            break
+        ran.append(item['step'])
+        seconds += item['seconds'] or 0
+    return ran, seconds
+
+def print_plan(plan):
+    print(f"Plan for episode {plan['podcast_number']} ({plan['num_articles']} articles):")
+    for item in plan['steps']:
+        inputs = ''.join(f"  {artifact} from {source or 'nowhere'}" for artifact, source in item['inputs'].items())
+        history = f"from {item['runs']} run(s)" if item['runs'] else "no history"
+        print(f"  {item['step']:<34} {format_seconds(item['seconds']):>7}  ({history}){inputs}")
+    known = [item['seconds'] for item in plan['steps'] if item['seconds'] is not None]
+    if known:
+        print(f"  estimated total {format_seconds(sum(known))}"
+              f"{'' if len(known) == len(plan['steps']) else ' (steps without history not counted)'}")
+    for result in sorted(plan['checks'], key=lambda result: ('fail', 'warn', 'ok').index(result['status'])):
+        print(f"  {result['status'].upper():<5} {result['name']}: {result['detail']}")
+    print(f"Pre-flight checks took {plan['seconds']:.1f}s")
+    if plan['blocking']:
+        ran, seconds = wasted_before(plan)
+        failing = sorted({step for result in plan['blocking'] for step in result['steps']})
+        wasted = f" after about {format_seconds(seconds)} of {len(ran)} earlier step(s)" if ran else ""
+        print(f"Refusing to start: {', '.join(failing)} would fail{wasted}. Fix the checks marked FAIL, "
+              f"or pass --skip-preflight.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan an episode and check what it needs")
+    parser.add_argument("podcast_number", type=int)
+    parser.add_argument("num_articles", type=int)
+    parser.add_argument("--steps", help="comma separated stage numbers or scripts to plan (default: all)")
+    parser.add_argument("--unattended", action="store_true", help="fail on anything that needs a person")
+    args = parser.parse_args(argv)
+
+    steps = STEPS
+    if args.steps:
+        steps = []
+        for step in filter(None, args.steps.split(',')):
+            scripts = [script for script in STEPS if step in (script, stage_number(script))]
+            if step.endswith('.py') and os.path.exists(os.path.join(SCRIPTS_DIR, step)):
+                scripts = [step]
+            if not scripts:
+                parser.error(f"unknown stage {step!r}, expected one of "
+                             f"{', '.join(stage_number(script) for script in STEPS)} or a script in scripts/")
+            steps += scripts
+    plan = check_episode(args.podcast_number, args.num_articles, steps, unattended=args.unattended)
+    print_plan(plan)
+    return 1 if plan['blocking'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,142 @@
 import sys
 import os
+import json
+import time
 import logging
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+
+from episode import write_file
+import profiling
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def fetch_zerohedge_articles():
-    url = "https://www.zerohedge.com"
+ZEROHEDGE_URL = os.getenv('ZEROHEDGE_URL', 'https://www.zerohedge.com')
+# Concurrent article downloads
+ZEROHEDGE_WORKERS = int(os.getenv('ZEROHEDGE_WORKERS', '5'))
+# Maximum requests per second sent to a single host
+ZEROHEDGE_RATE = float(os.getenv('ZEROHEDGE_RATE', '2'))
+ZEROHEDGE_TIMEOUT = float(os.getenv('ZEROHEDGE_TIMEOUT', '10'))
+# Links already fetched on earlier runs, so re-polling only downloads new articles
+ZEROHEDGE_STATE = os.getenv('ZEROHEDGE_STATE', 'output/zerohedge_seen.json')
+# Seen links are forgotten after this many days
+SEEN_RETENTION_DAYS = 30
+
+def create_session(workers=ZEROHEDGE_WORKERS):
+    """A pooled session shared by all workers, retrying transient errors with backoff"""
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['GET'], respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                                     '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+    return session
+
+class HostRateLimiter:
+    """Spaces out requests to the same host to at most `rate` per second across threads"""
+
+    def __init__(self, rate=ZEROHEDGE_RATE):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def load_state(path=ZEROHEDGE_STATE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'seen': {}}
+
+def save_state(state, path=ZEROHEDGE_STATE):
+    cutoff = (datetime.now() - timedelta(days=SEEN_RETENTION_DAYS)).isoformat()
+    state['seen'] = {link: seen for link, seen in state['seen'].items() if seen >= cutoff}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+def fetch_zerohedge_articles(session, limiter, state=None):
+    """Return the homepage headlines as (title, link) in page order.
+
+    With a state, the homepage is requested conditionally; when it has not
+    changed since the last poll, the listing stored with that poll is returned,
+    so headlines left unfetched last time are still candidates.
+    """
+    url = ZEROHEDGE_URL
     logger.info(f"Fetching URL: {url}")
-    
+
+    headers = {}
+    # Without a stored listing a 304 would leave nothing to pick from
+    if state is not None and 'listing' in state:
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+
     try:
-        response = requests.get(url)
+        limiter.wait(url)
+        response = session.get(url, headers=headers, timeout=ZEROHEDGE_TIMEOUT)
+        if response.status_code == 304:
+            logger.info("Homepage not modified since the last poll")
+            return [tuple(entry) for entry in state['listing']]
         response.raise_for_status()
         logger.info(f"Successfully fetched URL. Status code: {response.status_code}")
-        
+
+        if state is not None:
+            state['etag'] = response.headers.get('ETag')
+            state['last_modified'] = response.headers.get('Last-Modified')
+
         soup = BeautifulSoup(response.content, 'html.parser')
         logger.info("Successfully parsed HTML content")
-        
+
         articles = soup.find_all('h2', class_='Article_title___TC6d')
-        
-        results = [(article.get_text(strip=True), article.find('a')['href']) for article in articles]
+
+        results = []
+        links = set()
+        for article in articles:
+            anchor = article.find('a')
+            if anchor and anchor.get('href') and anchor['href'] not in links:
+                links.add(anchor['href'])
+                results.append((article.get_text(strip=True), anchor['href']))
+        if state is not None:
+            state['listing'] = results
         return results
-    
+
     except requests.RequestException as e:
         logger.error(f"Error fetching URL: {str(e)}")
         return []
 
-def fetch_article_content(link):
-    full_link = f"https://www.zerohedge.com{link}"
+def fetch_article_content(session, limiter, link):
+    full_link = f"{ZEROHEDGE_URL}{link}"
     logger.info(f"Fetching article content from: {full_link}")
-    
+
     try:
-        response = requests.get(full_link)
+        limiter.wait(full_link)
+        response = session.get(full_link, timeout=ZEROHEDGE_TIMEOUT)
         response.raise_for_status()
         soup = BeautifulSoup(response.content, 'html.parser')
-        
+
         content_div = soup.find('div', class_='NodeContent_body__HBEFs NodeBody_container__eeFKv')
         if content_div:
             return content_div.get_text(strip=True, separator=' ')
@@ -48,34 +147,58 @@ def fetch_article_content(link):
         logger.error(f"Error fetching article: {str(e)}")
         return None
 
-def process_article(title, link):
-    content = fetch_article_content(link)
-    return title, content if content else "Failed to fetch content."
+def select_new_articles(articles, state):
+    """Drop homepage entries fetched on earlier runs, keeping homepage order"""
+    seen = state['seen']
+    return [(title, link) for title, link in articles if link not in seen]
 
-def main(podcast_number, num_articles):
+def fetch_articles_in_order(session, limiter, articles, workers=ZEROHEDGE_WORKERS):
+    """Fetch article bodies concurrently; results come back in the order of `articles`"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        contents = executor.map(lambda article: fetch_article_content(session, limiter, article[1]), articles)
+        return list(zip(articles, contents))
+
+def main(podcast_number, num_articles, incremental=True, workers=ZEROHEDGE_WORKERS):
     output_folder = f"output/podcast_{podcast_number}/articles"
-    
-    articles = fetch_zerohedge_articles()
-    articles = articles[:num_articles]
-
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(process_article, title, link) for title, link in articles]
-        
-        for i, future in enumerate(as_completed(futures), 1):
+    os.makedirs(output_folder, exist_ok=True)
+
+    limiter = HostRateLimiter()
+    state = load_state() if incremental else None
+
+    written = 0
+    with create_session(workers) as session:
+        articles = fetch_zerohedge_articles(session, limiter, state)
+        if incremental:
+            articles = select_new_articles(articles, state)
+        articles = articles[:num_articles]
+
+        for (title, link), content in fetch_articles_in_order(session, limiter, articles, workers):
+            if not content:
+                logger.warning(f"Skipping {link} due to content fetch failure")
+                continue
             try:
-                title, content = future.result()
-                with open(os.path.join(output_folder, f"article_{i}.txt"), "w", encoding="utf-8") as f:
-                    f.write(f"Title: {title}\n\nContent:\n{content}")
+                # Numbered only once written, so a failed write leaves no gap for stage 2
+                write_file(os.path.join(output_folder, f"article_{written + 1}.txt"),
+                           f"Title: {title}\n\nContent:\n{content}")
             except Exception as e:
                 logger.error(f"Error processing article: {str(e)}")
+                continue
+            written += 1
+            if incremental:
+                state['seen'][link] = datetime.now().isoformat()
+
+    if incremental:
+        save_state(state)
 
-    print(f"Processed {num_articles} articles for podcast {podcast_number}")
+    print(f"Processed {written} articles for podcast {podcast_number}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python 1_parse_articles.py <podcast_number> <num_articles>")
+    args, profile = profiling.parse_args(sys.argv[1:])
+    args = [arg for arg in args if arg != '--full']
+    if len(args) != 2:
+        print("Usage: python 1_0_parse_articles_zh.py <podcast_number> <num_articles> [--full] [--profile] [--trace-memory]")
         sys.exit(1)
-    
-    podcast_number = int(sys.argv[1])
-    num_articles = int(sys.argv[2])
-    main(podcast_number, num_articles)
\ No newline at end of file
+
+    podcast_number = int(args[0])
+    num_articles = int(args[1])
+    profiling.run(profile, main, podcast_number, num_articles, incremental='--full' not in sys.argv)
@@ -3,29 +3,78 @@ import os
 load_dotenv()
 # Hugging Face API endpoint and token
 API_KEY = os.getenv('newsapi')
+# Optional NewsAPI host override (e.g. a local stand-in used by the benchmarks)
+NEWSAPI_URL = os.getenv('NEWSAPI_URL')
+# Comma separated topics searched on NewsAPI, merged into a single candidate pool
+NEWSAPI_QUERIES = [q.strip() for q in os.getenv('NEWSAPI_QUERIES', 'Bitcoin').split(',') if q.strip()]
+# Name of the scoring function used to rank the pool (see SCORERS)
+NEWSAPI_SCORING = os.getenv('NEWSAPI_SCORING', 'coverage')
 import sys
 import os
+import math
 import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlsplit, urlunsplit
 from newsapi import NewsApiClient
+from newsapi import const as newsapi_const
 from datetime import datetime, timedelta
 import requests
 from bs4 import BeautifulSoup
 
+from episode import Article, current_episode, save_artifact
+import profiling
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # You'll need to sign up for a free API key at https://newsapi.org/
 
+# NewsAPI refuses page sizes above 100
+MAX_PAGE_SIZE = 100
+# Candidates gathered per wanted article, to make up for pages that fail to scrape
+OVERFETCH = 2
+MAX_WORKERS = 8
+
+_session = None
+
+class RebasedAdapter(requests.adapters.HTTPAdapter):
+    """Sends the requests mounted under prefix to base_url instead"""
+
+    def __init__(self, prefix, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+        self.base_url = base_url.rstrip('/') + '/'
+
+    def send(self, request, **kwargs):
+        if request.url.startswith(self.prefix):
+            request.url = self.base_url + request.url[len(self.prefix):]
+        return super().send(request, **kwargs)
 
-def fetch_articles(num_articles):
-    newsapi = NewsApiClient(api_key=API_KEY)
-    
+def get_session():
+    """Pooled session shared by the NewsAPI client and the page fetchers, reused across runs in one process"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=MAX_WORKERS)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+        if NEWSAPI_URL:
+            # Only this session's NewsAPI calls go to the override, the client library is left untouched
+            parts = urlsplit(newsapi_const.EVERYTHING_URL)
+            prefix = f"{parts.scheme}://{parts.netloc}/"
+            _session.mount(prefix, RebasedAdapter(prefix, NEWSAPI_URL, pool_maxsize=MAX_WORKERS))
+    return _session
+
+def fetch_articles(newsapi, query, page, page_size):
+    """Fetch one page of NewsAPI results for a query.
+
+    Returns (articles, total_results); articles is empty on failure.
+    """
     # Calculate date range for yesterday
     today = datetime.now().date()
     yesterday = today - timedelta(days=1)
-    query='Bitcoin'
-    logger.info(f"Fetching {query}-related articles from NewsAPI for {yesterday}")
-    
+    logger.info(f"Fetching {query}-related articles from NewsAPI for {yesterday} (page {page})")
+
     try:
         response = newsapi.get_everything(
                                           q=query,
@@ -33,34 +82,112 @@ def fetch_articles(num_articles):
                                           sort_by='relevancy',#'popularity',#'publishedAt',#'relevancy',
                                           from_param=yesterday,#'2024-09-24',#yesterday,
                                           to=today,
-                                          page_size=num_articles)
-        
+                                          page_size=page_size,
+                                          page=page)
+
         if response['status'] == 'ok':
-            return [(article['title'], article['url'], article['source']['name']) for article in response['articles']]
+            return response['articles'], response.get('totalResults', 0)
         else:
             logger.error(f"API returned an error: {response.get('message', 'Unknown error')}")
-            return []
-    
+            return [], 0
+
     except Exception as e:
-        logger.error(f"Error fetching articles: {str(e)}")
-        return []
+        logger.error(f"Error fetching {query} articles (page {page}): {str(e)}")
+        return [], 0
+
+def normalize_url(url):
+    """Canonical form of an article URL used to dedupe the pool"""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), parts.query, ''))
+
+def merge_candidates(pool, query, page, page_size, articles):
+    """Add a page of results to the pool, merging duplicates by URL"""
+    for position, article in enumerate(articles):
+        url = article.get('url')
+        if not url or not article.get('title'):
+            continue
+        rank = (page - 1) * page_size + position
+        key = normalize_url(url)
+        candidate = pool.get(key)
+        if candidate is None:
+            pool[key] = {
+                'title': article['title'],
+                'url': url,
+                'source': (article.get('source') or {}).get('name') or 'Unknown',
+                'published_at': article.get('publishedAt') or '',
+                'rank': rank,
+                'queries': {query},
+            }
+        else:
+            candidate['rank'] = min(candidate['rank'], rank)
+            candidate['queries'].add(query)
+
+def gather_candidates(queries, num_candidates, max_workers=MAX_WORKERS):
+    """Query every topic concurrently, paging until each one can contribute its share of the pool.
+
+    The first page of every query is fetched up front; the remaining pages are
+    requested only if the totals reported by NewsAPI show they exist.
+    """
+    newsapi = NewsApiClient(api_key=API_KEY, session=get_session())
+
+    per_query = max(1, math.ceil(num_candidates / len(queries)))
+    page_size = min(MAX_PAGE_SIZE, per_query)
+    pool = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        first_pages = {query: executor.submit(fetch_articles, newsapi, query, 1, page_size) for query in queries}
+        later_pages = []
+        for query, future in first_pages.items():
+            articles, total_results = future.result()
+            merge_candidates(pool, query, 1, page_size, articles)
+            pages = min(math.ceil(per_query / page_size), math.ceil(total_results / page_size))
+            later_pages += [(query, page, executor.submit(fetch_articles, newsapi, query, page, page_size))
+                            for page in range(2, pages + 1)]
+        for query, page, future in later_pages:
+            articles, _ = future.result()
+            merge_candidates(pool, query, page, page_size, articles)
+
+    logger.info(f"Gathered {len(pool)} unique candidates from {len(queries)} queries")
+    return list(pool.values())
 
-def fetch_full_article(url):
+def score_relevancy(candidate):
+    """NewsAPI's own relevancy order, merged across queries"""
+    return -candidate['rank']
+
+def score_coverage(candidate):
+    """Stories matching several topics first, then by relevancy"""
+    return len(candidate['queries']) * 1000 - candidate['rank']
+
+def score_recency(candidate):
+    """Newest first (ISO 8601 timestamps sort chronologically)"""
+    return candidate['published_at']
+
+SCORERS = {
+    'relevancy': score_relevancy,
+    'coverage': score_coverage,
+    'recency': score_recency,
+}
+
+def rank_candidates(candidates, score=None):
+    score = score or SCORERS[NEWSAPI_SCORING]
+    return sorted(candidates, key=score, reverse=True)
+
+def fetch_full_article(url, session=requests):
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = session.get(url, headers=headers, timeout=10)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, 'html.parser')
-        
+
         # Try to find the main content
         content = soup.find('article') or soup.find('main') or soup.find('div', class_='content')
         if content:
             # Remove unwanted elements
             for element in content(['script', 'style', 'nav', 'header', 'footer']):
                 element.decompose()
-            
+
             # Extract text, preserving paragraph structure
             paragraphs = content.find_all('p')
             text = '\n\n'.join([p.get_text().strip() for p in paragraphs if p.get_text().strip()])
@@ -72,34 +199,77 @@ def fetch_full_article(url):
         logger.error(f"Error fetching full article content from {url}: {str(e)}")
         return None
 
-def main(podcast_number, num_articles):
+def collect_articles(ranked, num_articles, max_workers=MAX_WORKERS):
+    """Fetch full content down the ranked list until num_articles pages succeed.
+
+    At most max_workers pages are in flight, and no new page is requested once
+    the successes plus in-flight fetches cover num_articles. Returns
+    (candidate, content) pairs in ranked order.
+    """
+    session = get_session()
+    collected = {}
+    pending = {}
+    next_index = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            while (next_index < len(ranked) and len(pending) < max_workers
+                   and len(collected) + len(pending) < num_articles):
+                candidate = ranked[next_index]
+                pending[executor.submit(fetch_full_article, candidate['url'], session)] = next_index
+                next_index += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                content = future.result()
+                if content:
+                    collected[index] = content
+                else:
+                    logger.warning(f"Skipping {ranked[index]['url']} due to content fetch failure")
+
+    return [(ranked[index], collected[index]) for index in sorted(collected)[:num_articles]]
+
+def format_article(candidate, content):
+    return (f"Title: {candidate['title']}\n\n"
+            f"Source: {candidate['source']}\n\n"
+            f"URL: {candidate['url']}\n\n"
+            f"Content:\n{content}")
+
+def write_article(output_folder, i, candidate, content, episode=None):
+    """Write one article; with an episode held in memory it also goes there and is written in the background"""
+    try:
+        if episode is not None:
+            episode.articles[i] = Article(i, candidate['title'], candidate['source'], candidate['url'], content)
+        save_artifact(episode, os.path.join(output_folder, f"article_{i}.txt"), format_article(candidate, content))
+        logger.info(f"Successfully processed article {i} from {candidate['source']}")
+    except Exception as e:
+        logger.error(f"Error processing article {i} from {candidate['source']}: {str(e)}")
+
+def main(podcast_number, num_articles, queries=None, score=None):
     output_folder = f"output/podcast_{podcast_number}/articles"
     os.makedirs(output_folder, exist_ok=True)
-    
-    articles = fetch_articles(num_articles)
-
-    for i, (title, url, source) in enumerate(articles, 1):
-        try:
-            content = fetch_full_article(url)
-            if content:
-                with open(os.path.join(output_folder, f"article_{i}.txt"), "w", encoding="utf-8") as f:
-                    f.write(f"Title: {title}\n\n")
-                    f.write(f"Source: {source}\n\n")
-                    f.write(f"URL: {url}\n\n")
-                    f.write(f"Content:\n{content}")
-                logger.info(f"Successfully processed article {i} from {source}")
-            else:
-                logger.warning(f"Skipping article {i} from {source} due to content fetch failure")
-        except Exception as e:
-            logger.error(f"Error processing article {i} from {source}: {str(e)}")
 
+    queries = queries or NEWSAPI_QUERIES
+    candidates = gather_candidates(queries, num_articles * OVERFETCH)
+    ranked = rank_candidates(candidates, score)
+    articles = collect_articles(ranked, num_articles)
+
+    episode = current_episode(podcast_number)
+    for i, (candidate, content) in enumerate(articles, 1):
+        write_article(output_folder, i, candidate, content, episode)
+
+    if len(articles) < num_articles:
+        logger.warning(f"Only {len(articles)} of {num_articles} articles could be fetched "
+                       f"from {len(candidates)} candidates")
     print(f"Processed {len(articles)} articles for podcast {podcast_number}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python 1_parse_articles.py <podcast_number> <num_articles>")
+    args, profile = profiling.parse_args(sys.argv[1:])
+    if len(args) != 2:
+        print("Usage: python 1_parse_articles.py <podcast_number> <num_articles> [--profile] [--trace-memory]")
         sys.exit(1)
-    
-    podcast_number = int(sys.argv[1])
-    num_articles = int(sys.argv[2])
-    main(podcast_number, num_articles)
\ No newline at end of file
+
+    podcast_number = int(args[0])
+    num_articles = int(args[1])
+    profiling.run(profile, main, podcast_number, num_articles)
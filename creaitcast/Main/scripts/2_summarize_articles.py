@@ -6,9 +6,15 @@ import time
 from time import sleep
 from dotenv import load_dotenv
 
+from episode import Summary, current_episode, save_artifact
+import profiling
+
 # Load environment variables
 load_dotenv()
 HF_API_KEY = os.getenv('HF')
+HF_API_URL = os.getenv('HF_API_URL', 'https://api-inference.huggingface.co/models/')
+# Pause between articles to stay under the HF rate limit
+HF_REQUEST_DELAY = float(os.getenv('HF_REQUEST_DELAY', '1'))
 
 # Initialize logger
 logging.basicConfig(
@@ -26,8 +32,10 @@ def get_memory_usage():
 class HFAPISummarizer:
     def __init__(self, api_token):
         """Initialize with just the API token and URL"""
-        self.API_URL = "https://api-inference.huggingface.co/models/facebook/bart-large-cnn"
+        self.API_URL = f"{HF_API_URL}facebook/bart-large-cnn"
         self.headers = {"Authorization": f"Bearer {api_token}"}
+        # Keep-alive connection reused for every article
+        self.session = requests.Session()
     
     def summarize(self, text, max_length=800, min_length=50):
         """Simplified summarization function that only makes API calls"""
@@ -53,7 +61,7 @@ class HFAPISummarizer:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = requests.post(
+                response = self.session.post(
                     self.API_URL,
                     headers=self.headers,
                     json=payload,
@@ -80,22 +88,43 @@ class HFAPISummarizer:
                 
         return text[:max_length]
 
-def process_single_article(file_path, summarizer):
-    """Process a single article with minimal memory footprint"""
+_summarizer = None
+
+def get_summarizer():
+    """Summarizer shared by every episode run in this process"""
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = HFAPISummarizer(HF_API_KEY)
+    return _summarizer
+
+def summarize_text(text):
+    """Summary of one article's text, through the shared summarizer"""
+    return get_summarizer().summarize(text)
+
+def process_single_article(file_path, summarizer, episode=None):
+    """Process a single article with minimal memory footprint.
+
+    With an episode held in memory the article is taken from it, and the summary is kept there too.
+    """
     logger.info(f"Processing {file_path}")
     logger.info(f"Current memory usage: {get_memory_usage():.2f} MB")
     
     try:
-        # Read file in chunks if needed
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        index = os.path.basename(file_path).split('_')[1].split('.')[0]
+        article = episode.articles.get(int(index)) if episode is not None else None
+        if article is not None:
+            title, article_text = article.title, article.content
+        else:
+            # Read file in chunks if needed
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
 
-        # Extract title and content
-        title = content.split('\n')[0].replace("Title: ", "").strip()
-        article_text = content.split('Content:\n')[1].strip()
-        
-        # Clear content variable
-        content = None
+            # Extract title and content
+            title = content.split('\n')[0].replace("Title: ", "").strip()
+            article_text = content.split('Content:\n')[1].strip()
+
+            # Clear content variable
+            content = None
         
         # Get summary
         summary = summarizer.summarize(article_text)
@@ -103,15 +132,12 @@ def process_single_article(file_path, summarizer):
         # Create output path
         input_folder = os.path.dirname(file_path)
         output_folder = input_folder.replace("articles", "summaries")
-        os.makedirs(output_folder, exist_ok=True)
-        
-        # Generate output filename
-        index = os.path.basename(file_path).split('_')[1].split('.')[0]
         output_file = os.path.join(output_folder, f"summary_{index}.txt")
         
         # Write summary
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(f"Title: {title}\nSummary:\n{summary}")
+        if episode is not None:
+            episode.summaries[int(index)] = Summary(int(index), title, summary)
+        save_artifact(episode, output_file, f"Title: {title}\nSummary:\n{summary}")
             
         logger.info(f"Successfully summarized article {index}")
         logger.info(f"Summary length: {len(summary)} characters")
@@ -130,7 +156,7 @@ def main(podcast_number, num_articles):
         sys.exit(1)
     
     # Initialize summarizer
-    summarizer = HFAPISummarizer(HF_API_KEY)
+    summarizer = get_summarizer()
     
     # Get input folder
     input_folder = f"output/podcast_{podcast_number}/articles"
@@ -138,11 +164,14 @@ def main(podcast_number, num_articles):
         logger.error(f"Input folder not found: {input_folder}")
         sys.exit(1)
     
-    # Get article files
+    # Get article files; those of an episode held in memory may still be on their way to disk
+    episode = current_episode(podcast_number)
     article_files = [
         f for f in os.listdir(input_folder)
         if f.startswith("article_") and f.endswith(".txt")
     ]
+    if episode is not None and episode.articles:
+        article_files = [f"article_{index}.txt" for index in episode.articles]
     article_files.sort(key=lambda x: int(x.split('_')[1].split('.')[0]))
     
     # Limit to num_articles if specified
@@ -152,10 +181,10 @@ def main(podcast_number, num_articles):
     # Process articles one at a time
     for article_file in article_files:
         file_path = os.path.join(input_folder, article_file)
-        process_single_article(file_path, summarizer)
+        process_single_article(file_path, summarizer, episode)
         
         # Add a small delay between articles to prevent API rate limiting
-        time.sleep(1)
+        time.sleep(HF_REQUEST_DELAY)
         
         # Log memory usage
         logger.info(f"Memory usage after article: {get_memory_usage():.2f} MB")
@@ -164,10 +193,11 @@ def main(podcast_number, num_articles):
     logger.info(f"Final memory usage: {get_memory_usage():.2f} MB")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python 2_summarize_articles.py <podcast_number> <num_articles>")
+    args, profile = profiling.parse_args(sys.argv[1:])
+    if len(args) != 2:
+        print("Usage: python 2_summarize_articles.py <podcast_number> <num_articles> [--profile] [--trace-memory]")
         sys.exit(1)
-        
-    podcast_number = int(sys.argv[1])
-    num_articles = int(sys.argv[2])
-    main(podcast_number, num_articles)
\ No newline at end of file
+
+    podcast_number = int(args[0])
+    num_articles = int(args[1])
+    profiling.run(profile, main, podcast_number, num_articles)
@@ -1,15 +1,24 @@
 import os
 import sys
 import logging
-from transformers import pipeline
 from concurrent.futures import ProcessPoolExecutor
 
+import profiling
+
 # Initialize logger
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Load the summarization model
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+# The summarization model is loaded on first use, so a stage with nothing to do starts instantly
+summarizer = None
+
+def get_summarizer():
+    """Load the summarization model once per process"""
+    global summarizer
+    if summarizer is None:
+        from transformers import pipeline
+        summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+    return summarizer
 
 def summarize_text(text, max_chunk_length=1000, max_summary_length=500):
     """Summarizes the provided text into a single summary."""
@@ -19,6 +28,8 @@ def summarize_text(text, max_chunk_length=1000, max_summary_length=500):
         if not chunks:
             return text  # Handle empty text case
 
+        summarizer = get_summarizer()
+
         # Summarize chunks in batch
         chunk_summaries = summarizer(chunks, max_length=max_summary_length // len(chunks), min_length=30, do_sample=False)
         summaries = [summary['summary_text'] for summary in chunk_summaries]
@@ -59,9 +70,18 @@ def process_article(article_file, index):
 
 def main(podcast_number, num_articles):
     input_folder = f"output/podcast_{podcast_number}/articles"
+    if not os.path.exists(input_folder):
+        logger.error(f"Input folder not found: {input_folder}")
+        sys.exit(1)
     
     available_articles = [f for f in os.listdir(input_folder) if f.startswith("article_") and f.endswith(".txt")]
     available_articles.sort(key=lambda x: int(x.split('_')[1].split('.')[0]))
+    if not available_articles:
+        logger.warning(f"No articles to summarize for podcast {podcast_number}")
+        return
+
+    # Load the model before forking so the workers share it
+    get_summarizer()
     
     # Use ProcessPoolExecutor for parallel processing
     with ProcessPoolExecutor() as executor:
@@ -70,10 +90,11 @@ def main(podcast_number, num_articles):
     logger.info(f"Summarized {len(available_articles)} articles for podcast {podcast_number}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python 2_summarize_articles.py <podcast_number> <num_articles>")
+    args, profile = profiling.parse_args(sys.argv[1:])
+    if len(args) != 2:
+        print("Usage: python 2_summarize_articles.py <podcast_number> <num_articles> [--profile] [--trace-memory]")
         sys.exit(1)
 
-    podcast_number = int(sys.argv[1])
-    num_articles = int(sys.argv[2])
-    main(podcast_number, num_articles)
\ No newline at end of file
+    podcast_number = int(args[0])
+    num_articles = int(args[1])
+    profiling.run(profile, main, podcast_number, num_articles)
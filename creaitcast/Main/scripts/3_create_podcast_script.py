@@ -1,49 +1,60 @@
 import sys
 import os
 
-def create_introduction(podcast_number):
-    return f"""Welcome to podcast number {podcast_number} of our AI-generated news summary.
-Let's dive into the summaries of our top stories."""
+from episode import current_episode, save_artifact
+import profiling
+from locales import DEFAULT_LOCALE, LOCALES, locale_paths, parse_summary
 
-def create_conclusion():
-    return """That concludes our AI-generated news summary for today.
-Thanks for listening, and stay tuned for our next episode."""
+def create_introduction(podcast_number, locale=DEFAULT_LOCALE):
+    return LOCALES[locale]['introduction'].format(podcast_number=podcast_number)
 
-def main(podcast_number, num_articles):
-    input_folder = f"output/podcast_{podcast_number}/summaries"
-    output_folder = f"output/podcast_{podcast_number}/scripts"
-    output_file = os.path.join(output_folder, "podcast_script.txt")
+def create_conclusion(locale=DEFAULT_LOCALE):
+    return LOCALES[locale]['conclusion']
+
+def create_script(podcast_number, num_articles, locale=DEFAULT_LOCALE):
+    """Write the script of one locale of the episode from its summaries"""
+    paths = locale_paths(podcast_number, locale)
+    input_folder = paths['summaries']
+    output_file = paths['script']
 
-    script_content = create_introduction(podcast_number) + "\n\n"
+    # The summaries of an episode held in memory are the default locale's (multilocale.py holds none)
+    episode = current_episode(podcast_number) if locale == DEFAULT_LOCALE else None
+    script_content = create_introduction(podcast_number, locale) + "\n\n"
 
     for i in range(1, num_articles + 1):
         summary_file = os.path.join(input_folder, f"summary_{i}.txt")
         try:
-            with open(summary_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            title = content.split('\n')[0].replace("Title: ", "")
-            summary = content.split('Summary:\n')[1]
+            if episode is not None and i in episode.summaries:
+                title, summary = episode.summaries[i].title, episode.summaries[i].text
+            else:
+                with open(summary_file, 'r', encoding='utf-8') as f:
+                    content = f.read()
+
+                title, summary = parse_summary(content, locale)
 
-            script_content += f"Our next story is titled: {title}\n"
+            script_content += LOCALES[locale]['story'].format(title=title) + "\n"
             script_content += f"{summary}\n\n"
 
         except Exception as e:
             print(f"Error processing summary {i}: {str(e)}")
 
-    script_content += create_conclusion()
+    script_content += create_conclusion(locale)
 
-    os.makedirs(output_folder, exist_ok=True)
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(script_content)
+    if episode is not None:
+        episode.script = script_content
+    save_artifact(episode, output_file, script_content)
+    return script_content
 
+def main(podcast_number, num_articles):
+    create_script(podcast_number, num_articles)
     print(f"Created podcast script for podcast {podcast_number}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python 3_create_podcast_script.py <podcast_number> <num_articles>")
+    args, profile = profiling.parse_args(sys.argv[1:])
+    if len(args) != 2:
+        print("Usage: python 3_create_podcast_script.py <podcast_number> <num_articles> [--profile] [--trace-memory]")
         sys.exit(1)
-    
-    podcast_number = int(sys.argv[1])
-    num_articles = int(sys.argv[2])
-    main(podcast_number, num_articles)
\ No newline at end of file
+
+    podcast_number = int(args[0])
+    num_articles = int(args[1])
+    profiling.run(profile, main, podcast_number, num_articles)
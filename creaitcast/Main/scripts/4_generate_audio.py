@@ -1,67 +1,84 @@
 import sys
 import os
 import asyncio
-import edge_tts
+import time
 from pathlib import Path
-from pydub import AudioSegment
+
+from episode import current_episode, save_artifact
+import profiling
+import tts_scheduler
+from locales import DEFAULT_LOCALE, LOCALES
 
 async def text_to_speech_chunk(text, filename, voice="en-US-ChristopherNeural"):
-    """Convert a chunk of text to speech"""
-    try:
-        tts = edge_tts.Communicate(text=text, voice=voice)
-        await tts.save(filename)
-    except Exception as e:
-        print(f"Error processing chunk: {e}")
-        raise
+    """Convert a chunk of text to speech on a pooled TTS session"""
+    await tts_scheduler.synthesize([text], [filename], voice)
+
+def adaptive_chunk_size(text, voice):
+    """Chunk size for `voice` from its synthesis history (see tts_scheduler.py)"""
+    return tts_scheduler.get_stats().chunk_size(voice, len(text))
+
+def split_text(text, chunk_size=2000):
+    """Split text into chunks (at sentence boundaries)"""
+    chunks = []
+    current_chunk = ""
+    
+    for sentence in text.replace('\n', ' ').split('. '):
+        if len(current_chunk) + len(sentence) < chunk_size:
+            current_chunk += sentence + '. '
+        else:
+            if current_chunk:
+                chunks.append(current_chunk)
+            current_chunk = sentence + '. '
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+def split_script(text, chunk_size=2000):
+    """Chunks of the script that never span two stories (paragraphs), and the chunks that start a new one"""
+    chunks, story_breaks = [], set()
+    for section in (section for section in text.split('\n\n') if section.strip()):
+        if chunks:
+            story_breaks.add(len(chunks))
+        chunks.extend(split_text(section, chunk_size))
+    return chunks, story_breaks
+
+def post_process(chunk_files, filename, story_breaks=(), episode=None, remove_chunks=True):
+    """Join the chunks into the normalized episode (see audio_post.py) and remove them unless told not to.
 
-def merge_audio_files(input_files, output_file):
-    """Merge multiple audio files into one"""
-    combined = AudioSegment.empty()
-    for file in input_files:
-        audio = AudioSegment.from_mp3(file)
-        combined += audio
-    combined.export(output_file, format="mp3")
+    With an episode held in memory the MP3 is encoded into it and written to filename in the background.
+    """
+    from audio_post import render_episode
 
-async def text_to_speech(text, filename='output.mp3', voice="en-US-ChristopherNeural", chunk_size=2000):
-    """Convert text to speech, splitting into chunks if necessary"""
+    stats = render_episode(chunk_files, None if episode is not None else filename, story_breaks)
+    if episode is not None:
+        episode.audio = memoryview(stats['audio'])
+        episode.audio_duration = stats['duration']
+        save_artifact(episode, filename, episode.audio)
+    loudness = 'silence' if stats['loudness'] is None else f"{stats['loudness']:.1f} LUFS"
+    print(f"Episode audio: {stats['duration']:.0f}s, measured {loudness}, gain {stats['gain_db']:+.1f} dB")
+    if remove_chunks:
+        for chunk_file in chunk_files:
+            os.remove(chunk_file)
+
+async def text_to_speech(text, filename='output.mp3', voice="en-US-ChristopherNeural", chunk_size=None,
+                         episode=None):
+    """Convert text to speech, splitting into chunks sized from the voice's past throughput"""
     try:
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(filename), exist_ok=True)
         
-        # Split text into chunks (at sentence boundaries)
-        chunks = []
-        current_chunk = ""
-        
-        for sentence in text.replace('\n', ' ').split('. '):
-            if len(current_chunk) + len(sentence) < chunk_size:
-                current_chunk += sentence + '. '
-            else:
-                chunks.append(current_chunk)
-                current_chunk = sentence + '. '
-        if current_chunk:
-            chunks.append(current_chunk)
-        
-        # Process each chunk
-        chunk_files = []
-        tasks = []
-        
-        for i, chunk in enumerate(chunks):
-            chunk_file = f"{filename}.chunk{i}.mp3"
-            chunk_files.append(chunk_file)
-            tasks.append(text_to_speech_chunk(chunk, chunk_file, voice))
+        chunk_size = chunk_size or adaptive_chunk_size(text, voice)
+        chunks, story_breaks = split_script(text, chunk_size)
+        chunk_files = [f"{filename}.chunk{i}.mp3" for i in range(len(chunks))]
         
-        # Process all chunks concurrently
-        await asyncio.gather(*tasks)
+        # Longest chunks first on the warm session pool
+        start = time.perf_counter()
+        await tts_scheduler.synthesize(chunks, chunk_files, voice)
+        print(f"Synthesized {len(chunks)} chunks of up to {chunk_size} characters in "
+              f"{time.perf_counter() - start:.1f}s")
         
-        # Merge chunks if there are multiple
-        if len(chunk_files) > 1:
-            merge_audio_files(chunk_files, filename)
-            # Clean up chunk files
-            for chunk_file in chunk_files:
-                os.remove(chunk_file)
-        elif len(chunk_files) == 1:
-            # If there's only one chunk, just rename it
-            os.rename(chunk_files[0], filename)
+        # Pauses between stories, loudness normalization and music, streamed in constant memory
+        post_process(chunk_files, filename, story_breaks, episode)
             
         print(f"Audio file saved as {filename}")
         
@@ -74,17 +91,20 @@ async def main(podcast_number, num_articles):
     output_file = f"output/podcast_{podcast_number}/audio/episode{podcast_number}.mp3"
     
     try:
-        if not os.path.exists(input_file):
-            raise FileNotFoundError(f"Script file not found: {input_file}")
-            
-        with open(input_file, 'r', encoding='utf-8') as f:
-            script_content = f.read()
+        episode = current_episode(podcast_number)
+        if episode is not None and episode.script is not None:
+            script_content = episode.script
+        else:
+            if not os.path.exists(input_file):
+                raise FileNotFoundError(f"Script file not found: {input_file}")
+
+            with open(input_file, 'r', encoding='utf-8') as f:
+                script_content = f.read()
         
-        # You can customize the voice here
-        # voice = "it-IT-IsabellaNeural" #"en-US-ChristopherNeural"  # Male voice
-        voice = "en-US-ChristopherNeural"  # Male voice
+        # Voices are set per language in locales.py; multilocale.py renders the other languages
+        voice = LOCALES[DEFAULT_LOCALE]['voice']
         
-        await text_to_speech(script_content, filename=output_file, voice=voice)
+        await text_to_speech(script_content, filename=output_file, voice=voice, episode=episode)
         print(f"Generated audio for podcast {podcast_number}")
         
     except Exception as e:
@@ -92,11 +112,11 @@ async def main(podcast_number, num_articles):
         raise
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python 4_generate_audio.py <podcast_number> <num_articles>")
+    args, profile = profiling.parse_args(sys.argv[1:])
+    if len(args) != 2:
+        print("Usage: python 4_generate_audio.py <podcast_number> <num_articles> [--profile] [--trace-memory]")
         sys.exit(1)
-    
-    podcast_number = int(sys.argv[1])
-    num_articles = int(sys.argv[2])
-    
-    asyncio.run(main(podcast_number, num_articles))
\ No newline at end of file
+
+    podcast_number = int(args[0])
+    num_articles = int(args[1])
+    profiling.run(profile, main, podcast_number, num_articles)
@@ -1,27 +1,29 @@
 import os
 import sys
-from moviepy.editor import *
-from PIL import Image, ImageDraw, ImageFont
+import shutil
 import random
-from collections import Counter
-
-def simple_tokenize(text):
-    # Remove punctuation and convert to lowercase
-    text = ''.join(c.lower() for c in text if c.isalnum() or c.isspace())
-    return text.split()
-
-def extract_keywords(text, num_keywords=5):
-    tokens = simple_tokenize(text)
-    # Define a simple list of stop words
-    stop_words = set(['the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'])
-    keywords = [word for word in tokens if word not in stop_words]
-    
-    keyword_freq = Counter(keywords)
-    common_keywords = [word for word, _ in keyword_freq.most_common(num_keywords)]
-    
-    return common_keywords
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from episode import current_episode, wait_written
+from locales import video_segment_folder
+from keyword_index import KeywordIndex, episode_keywords
+import profiling
+
+FPS = 24
+# 'segments' encodes every slide in parallel and joins them with stream copy, 'serial' renders with moviepy
+VIDEO_ENCODE_MODE = os.getenv('VIDEO_ENCODE_MODE', 'segments')
+VIDEO_WORKERS = int(os.getenv('VIDEO_WORKERS', '0')) or os.cpu_count() or 1
+
+def extract_keywords(text, num_keywords=5, podcast_number=None):
+    """Most distinctive terms of the script, shared with the YouTube title through the keyword index"""
+    if podcast_number is None:
+        return KeywordIndex().top_terms(text, num_keywords)
+    return episode_keywords(podcast_number, text, num_keywords)
 
 def generate_images(keywords, num_images=10, output_folder=''):
+    from PIL import Image, ImageDraw, ImageFont
+
     images = []
     for i in range(num_images):
         keyword = random.choice(keywords)
@@ -39,27 +41,128 @@ def generate_images(keywords, num_images=10, output_folder=''):
         draw.text(position, keyword, fill=(255-color[0], 255-color[1], 255-color[2]), font=font)
         
         image_path = os.path.join(output_folder, f"generated_image_{i}.png")
+        # Slides may be hard links into the shared slide store, so never write through an old one
+        if os.path.exists(image_path):
+            os.remove(image_path)
         img.save(image_path)
         images.append(image_path)
     return images
 
-def convert_audio_to_video(input_audio, output_video, sample_text, image_folder):
+def segment_frame_counts(duration, num_segments, fps=FPS):
+    """Frames per slide, cut on whole-frame boundaries so the segments add up to the full duration"""
+    boundaries = [round(duration * fps * i / num_segments) for i in range(num_segments + 1)]
+    return [end - start for start, end in zip(boundaries, boundaries[1:])]
+
+def encode_segment(ffmpeg, image_path, frames, output_path, threads):
+    """Encode one slide as a video-only segment with the same parameters as every other segment.
+
+    Without B-frames every frame only refers back, so a segment can be cut short by stream copy (see join_segments).
+    """
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error',
+                    '-loop', '1', '-framerate', str(FPS), '-i', image_path,
+                    '-frames:v', str(frames), '-r', str(FPS),
+                    '-c:v', 'libx264', '-preset', 'medium', '-bf', '0', '-pix_fmt', 'yuv420p', '-threads', str(threads),
+                    output_path], check=True)
+    return output_path
+
+def ffmpeg_binary():
+    from moviepy.config import get_setting
+
+    return get_setting("FFMPEG_BINARY")
+
+def plan_segments(image_paths, duration, workers=1):
+    """(image, frames) per segment; with more workers than slides, long slides are cut into several pieces"""
+    pieces = max(1, -(-workers // len(image_paths)))
+    segment_images = [path for path in image_paths for _ in range(pieces)]
+    return list(zip(segment_images, segment_frame_counts(duration, len(segment_images))))
+
+def join_segments(ffmpeg, segment_paths, input_audio, output_video, segment_folder, frames=None):
+    """Concatenate encoded segments with stream copy and mux the audio in once.
+
+    With frames, only the first frames[i] frames of segment i are kept, to fit segments encoded for longer audio.
+    """
+    concat_list = os.path.join(segment_folder, "segments.txt")
+    with open(concat_list, 'w', encoding='utf-8') as f:
+        for i, path in enumerate(segment_paths):
+            f.write(f"file '{os.path.abspath(path)}'\n")
+            if frames is not None:
+                f.write(f"outpoint {frames[i] / FPS:.6f}\n")
+
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error',
+                    '-f', 'concat', '-safe', '0', '-i', concat_list, '-i', input_audio,
+                    '-map', '0:v', '-map', '1:a', '-c:v', 'copy', '-c:a', 'aac', '-shortest',
+                    output_video], check=True)
+
+def encode_slideshow(ffmpeg, image_paths, duration, segment_folder, workers=VIDEO_WORKERS, threads=None):
+    """Encode the slides as video-only segments covering `duration`, each in its own ffmpeg process.
+
+    Each encoder gets `threads` x264 threads, by default an equal share of the CPUs.
+    """
+    workers = max(1, workers)
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    os.makedirs(segment_folder, exist_ok=True)
+
+    segments = plan_segments(image_paths, duration, workers)
+    segment_paths = [os.path.join(segment_folder, f"segment_{i}.mp4") for i in range(len(segments))]
+    # The encoding happens in the ffmpeg child processes, threads only wait on them
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(encode_segment, [ffmpeg] * len(segments), [image for image, _ in segments],
+                          [frames for _, frames in segments], segment_paths, [threads] * len(segments)))
+    return segment_paths
+
+def render_segments(input_audio, output_video, image_paths, duration, workers=VIDEO_WORKERS, threads=None):
+    """Encode each slide in its own ffmpeg process, then join them with stream copy and mux the audio once"""
+    ffmpeg = ffmpeg_binary()
+    segment_folder = video_segment_folder(output_video)
+    try:
+        segment_paths = encode_slideshow(ffmpeg, image_paths, duration, segment_folder, workers, threads)
+        # The audio of an episode held in memory may still be on its way to disk
+        wait_written(input_audio)
+        join_segments(ffmpeg, segment_paths, input_audio, output_video, segment_folder)
+    finally:
+        shutil.rmtree(segment_folder, ignore_errors=True)
+
+def render_serial(input_audio, output_video, image_paths, duration):
+    # moviepy.editor pulls in a large dependency tree, so it is only loaded once there is work to do
+    from moviepy.editor import AudioFileClip, ImageClip, concatenate_videoclips
+
+    wait_written(input_audio)
     audio = AudioFileClip(input_audio)
     
-    keywords = extract_keywords(sample_text)
-    image_paths = generate_images(keywords, output_folder=image_folder)
-    
     clips = []
-    duration_per_image = audio.duration / len(image_paths)
+    duration_per_image = duration / len(image_paths)
     for img_path in image_paths:
         img_clip = ImageClip(img_path).set_duration(duration_per_image)
         clips.append(img_clip)
     
     video = concatenate_videoclips(clips, method="compose")
     video = video.set_audio(audio)
-    video = video.set_fps(24)
+    video = video.set_fps(FPS)
     
     video.write_videofile(output_video, codec='libx264', audio_codec='aac')
+    # Release the ffmpeg readers, the process may go on to render more episodes
+    video.close()
+    audio.close()
+
+def audio_duration(input_audio):
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    return ffmpeg_parse_infos(input_audio)['duration']
+
+def convert_audio_to_video(input_audio, output_video, sample_text, image_folder, mode=VIDEO_ENCODE_MODE,
+                           podcast_number=None, workers=VIDEO_WORKERS, duration=None):
+    """Render the slideshow video; pass the audio duration when it is known to skip probing the MP3"""
+    if duration is None:
+        wait_written(input_audio)
+        duration = audio_duration(input_audio)
+    
+    keywords = extract_keywords(sample_text, podcast_number=podcast_number)
+    image_paths = generate_images(keywords, output_folder=image_folder)
+    
+    if mode == 'segments':
+        render_segments(input_audio, output_video, image_paths, duration, workers)
+    else:
+        render_serial(input_audio, output_video, image_paths, duration)
     print(f"Converted {input_audio} to {output_video}")
 
 def main(podcast_number, num_articles):
@@ -68,19 +171,32 @@ def main(podcast_number, num_articles):
     script_file = f"output/podcast_{podcast_number}/scripts/podcast_script.txt"
     image_folder = f"output/podcast_{podcast_number}/video/images"
     
+    # An episode held in memory has the script and the audio duration; its files may not be written yet
+    episode = current_episode(podcast_number)
+    if episode is not None and episode.script is not None and episode.audio is not None:
+        sample_text, duration = episode.script, episode.audio_duration
+    else:
+        for path in (input_audio, script_file):
+            if not os.path.exists(path):
+                print(f"Input file not found: {path}")
+                sys.exit(1)
+
+        with open(script_file, 'r', encoding='utf-8') as f:
+            sample_text = f.read()
+        duration = None
+
     os.makedirs(image_folder, exist_ok=True)
     
-    with open(script_file, 'r', encoding='utf-8') as f:
-        sample_text = f.read()
-    
-    convert_audio_to_video(input_audio, output_video, sample_text, image_folder)
+    convert_audio_to_video(input_audio, output_video, sample_text, image_folder, podcast_number=podcast_number,
+                           duration=duration)
     print(f"Created video for podcast {podcast_number}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python 5_create_video.py <podcast_number> <num_articles>")
+    args, profile = profiling.parse_args(sys.argv[1:])
+    if len(args) != 2:
+        print("Usage: python 5_create_video.py <podcast_number> <num_articles> [--profile] [--trace-memory]")
         sys.exit(1)
-    
-    podcast_number = int(sys.argv[1])
-    num_articles = int(sys.argv[2])
-    main(podcast_number, num_articles)
\ No newline at end of file
+
+    podcast_number = int(args[0])
+    num_articles = int(args[1])
+    profiling.run(profile, main, podcast_number, num_articles)
@@ -3,13 +3,14 @@ import sys
 import pickle
 import requests
 import logging
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.errors import HttpError
 import re
-from collections import Counter
+import json
+import time
+import hashlib
+
+from episode import current_episode
+from keyword_index import KeywordIndex, episode_doc_id
+import profiling
 
 from dotenv import load_dotenv
 import os
@@ -18,8 +19,14 @@ load_dotenv()
 
 
 # Hugging Face API endpoint and token
-HF_API_URL = "https://api-inference.huggingface.co/models/"
+HF_API_URL = os.getenv('HF_API_URL', "https://api-inference.huggingface.co/models/")
 HF_API_KEY = os.getenv('HF')
+# Title keywords are computed locally; set HF_TITLE_MODEL to also summarize the titles remotely
+HF_TITLE_MODEL = os.getenv('HF_TITLE_MODEL')
+HF_TITLE_TIMEOUT = float(os.getenv('HF_TITLE_TIMEOUT', '10'))
+TITLE_CACHE = os.getenv('TITLE_CACHE', 'output/title_cache.json')
+# Read after load_dotenv, so the paths can come from .env too
+from youtube_credentials import YOUTUBE_API_URL, YOUTUBE_CLIENT_SECRET, YOUTUBE_TOKEN
 # Initialize logger
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -29,7 +36,7 @@ SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
 
 # Replace this with your actual Hugging Face API key
 
-def summarize_text(titles, model="facebook/bart-large-cnn", temperature=0.7):
+def summarize_text(titles, model="facebook/bart-large-cnn", temperature=0.7, timeout=HF_TITLE_TIMEOUT):
     """Use Hugging Face API to summarize titles."""
     logger.debug(f"Attempting to summarize titles: {titles}")
     headers = {
@@ -45,24 +52,55 @@ def summarize_text(titles, model="facebook/bart-large-cnn", temperature=0.7):
     }
     logger.debug(f"API request data: {data}")
 
+    response = None
     try:
-        response = requests.post(f"https://api-inference.huggingface.co/models/{model}", headers=headers, json=data)
+        response = requests.post(f"{HF_API_URL}{model}", headers=headers, json=data, timeout=timeout)
         response.raise_for_status()
         summary = response.json()[0]['summary_text']
         logger.debug(f"API response: {response.json()}")
         return summary
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
         logger.error(f"Error summarizing titles: {str(e)}")
-        logger.error(f"API response content: {response.content}")
+        if response is not None:
+            logger.error(f"API response content: {response.content}")
         return None
 
-def extract_keywords_from_summary(summary, num_keywords=5):
-    """Extract keywords from the summarized text."""
-    words = re.findall(r'\w+', summary.lower())
-    word_freq = Counter(words)
-    common_words = set(['the', 'a', 'an', 'in', 'on', 'at', 'to', 'for', 'of', 'and', 'is', 'are', 'was', 'were', 'this', 'by'])
-    keywords = [word for word, _ in word_freq.most_common(num_keywords * 2) if word not in common_words][:num_keywords]
-    return keywords
+def cached_summarize_titles(stories, model, cache_path=TITLE_CACHE):
+    """Remote title summary, cached on disk by the exact list of titles"""
+    key = hashlib.sha1("\n".join([model] + stories).encode('utf-8')).hexdigest()
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if key in cache:
+        logger.debug("Using cached title summary")
+        return cache[key]
+
+    summary = summarize_text(stories, model=model)
+    if summary:
+        cache[key] = summary
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+    return summary
+
+def extract_title_keywords(stories, episode_text, episode_number, num_keywords=4):
+    """Most distinctive terms of this episode against every previous one (TF-IDF).
+
+    The episode is added to the on-disk index first, so each run makes the next one's weights better.
+    """
+    index = KeywordIndex()
+    index.add_document(episode_doc_id(episode_number), episode_text)
+
+    # Titles are what the episode is about, count them twice
+    keyword_text = "\n".join(stories * 2) + "\n" + episode_text
+    if HF_TITLE_MODEL:
+        summary = cached_summarize_titles(stories, HF_TITLE_MODEL)
+        logger.debug(f"Generated summary: {summary}")
+        if summary:
+            keyword_text = summary + "\n" + "\n".join(stories)
+    return index.top_terms(keyword_text, num_keywords)
 
 def generate_ai_title_description(podcast_text, episode_number):
     try:
@@ -77,18 +115,13 @@ def generate_ai_title_description(podcast_text, episode_number):
             logger.warning("No stories found in the podcast text")
             return f"Cronisphere Episode {episode_number}: AI-Generated News Summary", f"Welcome to Cronisphere Episode {episode_number}! In this episode, we bring you the latest AI-generated news summaries."
 
-        # Summarize titles using AI
-        summary = summarize_text(stories)
-        logger.debug(f"Generated summary: {summary}")
-        
-        if not summary:
-            logger.warning("Failed to generate summary")
-            return f"Cronisphere Episode {episode_number}: AI-Generated News Summary", f"Welcome to Cronisphere Episode {episode_number}! In this episode, we bring you the latest AI-generated news summaries."
-
-        # Extract keywords from the summarized titles
-        keywords = extract_keywords_from_summary(summary, num_keywords=4)
+        keywords = extract_title_keywords(stories, podcast_text, episode_number)
         logger.debug(f"Extracted keywords: {keywords}")
 
+        if not keywords:
+            logger.warning("No keywords found")
+            return f"Cronisphere Episode {episode_number}: AI-Generated News Summary", f"Welcome to Cronisphere Episode {episode_number}! In this episode, we bring you the latest AI-generated news summaries."
+
         title = f"Cronisphere {episode_number}: {', '.join(keywords).title()}"
 
         # Create description
@@ -105,11 +138,57 @@ def generate_ai_title_description(podcast_text, episode_number):
         logger.error(f"Error in generate_ai_title_description: {str(e)}")
         return f"Cronisphere Episode {episode_number}: AI-Generated News Summary", f"Welcome to Cronisphere Episode {episode_number}! In this episode, we bring you the latest AI-generated news summaries."
 
+def get_local_service(api_url, credentials=None):
+    """Client for a plain-http YouTube stand-in, authorized with credentials if given."""
+    import httplib2
+    from urllib.parse import urlparse
+    from googleapiclient.discovery import build
+
+    netloc = urlparse(api_url).netloc
+
+    class LocalHttp(httplib2.Http):
+        # The client keeps the https scheme of the discovery document for media uploads
+        def request(self, uri, *args, **kwargs):
+            if uri.startswith('https://') and urlparse(uri).netloc == netloc:
+                uri = 'http://' + uri[len('https://'):]
+            return super().request(uri, *args, **kwargs)
+
+    http = LocalHttp()
+    if credentials is not None:
+        from google_auth_httplib2 import AuthorizedHttp
+
+        http = AuthorizedHttp(credentials, http=http)
+    logger.debug(f"Using YouTube API at {api_url}")
+    return build('youtube', 'v3', http=http, client_options={'api_endpoint': api_url}, static_discovery=True)
+
+_youtube = None
+
 def get_authenticated_service():
+    """YouTube client, built once per process (the authorized http refreshes its token on its own)"""
+    global _youtube
+    if _youtube is None:
+        _youtube = build_service()
+    return _youtube
+
+def build_service():
+    if YOUTUBE_API_URL:
+        # A saved token is used against the stand-in too, so its refresh can be exercised offline
+        return get_local_service(YOUTUBE_API_URL, load_credentials() if os.path.exists(YOUTUBE_TOKEN) else None)
+
+    from googleapiclient.discovery import build
+
+    return build('youtube', 'v3', credentials=load_credentials())
+
+def load_credentials():
+    """The saved credentials, refreshed if they expired; the consent flow runs if there are none"""
+    # The Google client libraries are slow to import, load them only once an upload is going to happen
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
     logger.debug("Authenticating with YouTube API")
     credentials = None
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
+    if os.path.exists(YOUTUBE_TOKEN):
+        with open(YOUTUBE_TOKEN, 'rb') as token:
             credentials = pickle.load(token)
     
     if not credentials or not credentials.valid:
@@ -118,17 +197,18 @@ def get_authenticated_service():
             credentials.refresh(Request())
         else:
             logger.debug("Generating new credentials")
-            flow = InstalledAppFlow.from_client_secrets_file(
-                '/Users/alessandrocarli/Programming/CursorProjects/creaitcast/creaitcast/Config_files/client_secret.json', SCOPES)
+            flow = InstalledAppFlow.from_client_secrets_file(YOUTUBE_CLIENT_SECRET, SCOPES)
             credentials = flow.run_local_server(port=0)
         
-        with open('token.pickle', 'wb') as token:
+        with open(YOUTUBE_TOKEN, 'wb') as token:
             pickle.dump(credentials, token)
 
     logger.debug("Authentication successful")
-    return build('youtube', 'v3', credentials=credentials)
+    return credentials
 
 def add_video_to_playlist(youtube, video_id, playlist_id):
+    from googleapiclient.errors import HttpError
+
     logger.debug(f"Attempting to add video {video_id} to playlist {playlist_id}")
     try:
         request = youtube.playlistItems().insert(
@@ -151,6 +231,9 @@ def add_video_to_playlist(youtube, video_id, playlist_id):
 
 
 def upload_video(youtube, title, description, file_path, playlist_id, category="22", privacy_status="public"):
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaFileUpload
+
     logger.debug(f"Attempting to upload video: {file_path}")
     body = {
         "snippet": {
@@ -190,13 +273,28 @@ def upload_video(youtube, title, description, file_path, playlist_id, category="
             logger.error("YouTube API quota exceeded. Please wait and try again later or use a different project.")
         raise
 
+def record_upload(podcast_number, video_link, title):
+    """Leave output/podcast_N/upload.json; storage.py only collects the artifacts of uploaded episodes"""
+    path = f"output/podcast_{podcast_number}/upload.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'video_link': video_link, 'title': title, 'uploaded_at': time.time()}, f, indent=2)
+
 def main(podcast_number, num_articles):
     logger.debug(f"Starting upload process for podcast {podcast_number}")
     script_path = f"output/podcast_{podcast_number}/scripts/podcast_script.txt"
+    video_path = f"output/podcast_{podcast_number}/video/episode{podcast_number}.mp4"
+
+    if not os.path.exists(video_path):
+        logger.error(f"Error: Video file not found at {video_path}")
+        return
     
     try:
-        with open(script_path, 'r', encoding='utf-8') as f:
-            podcast_text = f.read()
+        episode = current_episode(podcast_number)
+        if episode is not None and episode.script is not None:
+            podcast_text = episode.script
+        else:
+            with open(script_path, 'r', encoding='utf-8') as f:
+                podcast_text = f.read()
         logger.debug(f"Podcast text content (first 200 characters): {podcast_text[:200]}")
 
         logger.debug("Podcast script read successfully")
@@ -212,17 +310,14 @@ def main(podcast_number, num_articles):
         logger.error(f"Error reading script or generating title/description: {str(e)}")
         return
 
+    from googleapiclient.errors import HttpError
+
     youtube = get_authenticated_service()
-    
-    video_path = f"output/podcast_{podcast_number}/video/episode{podcast_number}.mp4"
-    
-    if not os.path.exists(video_path):
-        logger.error(f"Error: Video file not found at {video_path}")
-        return
 
     try:
         video_link = upload_video(youtube, title, description, video_path, playlist_id="PLqoUA98Wnrxo-HLn3z4DZSbSp7tUXMSZJ")
         logger.info(f"Upload process completed. Video link: {video_link}")
+        record_upload(podcast_number, video_link, title)
         logger.info(f"Upload process completed. Video link: {title}  {description} ")
         print(title)
         print(description)
@@ -233,10 +328,11 @@ def main(podcast_number, num_articles):
             logger.error(f"An error occurred during video upload: {str(e)}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python 6_upload_to_youtube.py <podcast_number> <num_articles>")
+    args, profile = profiling.parse_args(sys.argv[1:])
+    if len(args) != 2:
+        print("Usage: python 6_upload_to_youtube.py <podcast_number> <num_articles> [--profile] [--trace-memory]")
         sys.exit(1)
-    
-    podcast_number = int(sys.argv[1])
-    num_articles = int(sys.argv[2])
-    main(podcast_number, num_articles)
\ No newline at end of file
+
+    podcast_number = int(args[0])
+    num_articles = int(args[1])
+    profiling.run(profile, main, podcast_number, num_articles)
@@ -0,0 +1,331 @@
+"""Streaming post-processing of the episode audio.
+
+The TTS chunks are decoded by ffmpeg into float PCM and handled in fixed-size
+NumPy blocks, so memory stays the same whatever the episode length. The
+program is assembled as: intro music, crossfaded into the voice track (chunks
+with a pause between stories, optional looped bed music underneath),
+crossfaded into the outro music. It is rendered twice: the first pass measures
+integrated loudness (EBU R128 / ITU-R BS.1770 gating) and sample peak, the
+second applies a single gain towards the target and encodes the MP3.
+
+Everything runs at the output format (AUDIO_SAMPLE_RATE, AUDIO_CHANNELS), by
+default the 24 kHz mono that edge-tts produces; music files are converted to
+it while they are decoded.
+"""
+import math
+import os
+import subprocess
+import threading
+
+import numpy as np
+
+# Format of the episode MP3, and of the processing; the defaults match the edge-tts chunks
+SAMPLE_RATE = int(os.getenv('AUDIO_SAMPLE_RATE', '24000'))
+CHANNELS = int(os.getenv('AUDIO_CHANNELS', '1'))
+AUDIO_BITRATE = os.getenv('AUDIO_BITRATE', '64k')
+# Frames decoded per block (one second)
+BLOCK_FRAMES = SAMPLE_RATE
+# Integrated loudness target and ceiling for the sample peak after gain
+TARGET_LUFS = float(os.getenv('AUDIO_TARGET_LUFS', '-16'))
+PEAK_CEILING_DB = float(os.getenv('AUDIO_PEAK_CEILING', '-1'))
+STORY_GAP = float(os.getenv('AUDIO_STORY_GAP', '0.75'))
+CROSSFADE = float(os.getenv('AUDIO_CROSSFADE', '2'))
+# Optional music files; the bed is looped under the voice at BED_GAIN_DB
+INTRO_MUSIC = os.getenv('INTRO_MUSIC')
+OUTRO_MUSIC = os.getenv('OUTRO_MUSIC')
+BED_MUSIC = os.getenv('BED_MUSIC')
+BED_GAIN_DB = float(os.getenv('BED_GAIN_DB', '-24'))
+
+def k_weighting_coefficients(rate):
+    """BS.1770 K-weighting biquads (b, a) at `rate`: high shelf followed by a high pass.
+
+    Derived from the filters' analog parameters, so at 48 kHz they give the coefficients tabled in the standard.
+    """
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = ([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+             [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_pass = ([1.0, -2.0, 1.0], [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    return [shelf, high_pass]
+
+K_WEIGHTING = k_weighting_coefficients(SAMPLE_RATE)
+# Length of the FIR the K-weighting is applied with; its impulse response has decayed below 1e-8 by then
+K_TAPS = 4096
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+# Gating block loudness histogram: 0.01 LU bins from the absolute gate up to +10 LUFS
+HISTOGRAM_STEP = 0.01
+HISTOGRAM_BINS = int((10.0 - ABSOLUTE_GATE) / HISTOGRAM_STEP)
+
+def ffmpeg_binary():
+    from moviepy.config import get_setting
+
+    return get_setting("FFMPEG_BINARY")
+
+def decode(path, block_frames=BLOCK_FRAMES):
+    """Yield an audio file as float32 blocks of shape (frames, CHANNELS)"""
+    block_bytes = block_frames * CHANNELS * 4
+    with subprocess.Popen([ffmpeg_binary(), '-loglevel', 'error', '-i', path,
+                           '-f', 'f32le', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE), '-'],
+                          stdout=subprocess.PIPE) as process:
+        try:
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                usable = len(data) - len(data) % (CHANNELS * 4)
+                yield np.frombuffer(data[:usable], dtype='<f4').reshape(-1, CHANNELS)
+        except GeneratorExit:
+            # The reader stopped early (a looped bed, a crossfade cut short); ffmpeg is not needed any more
+            process.kill()
+            raise
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode {path}")
+
+def silence(frames, block_frames=BLOCK_FRAMES):
+    for start in range(0, frames, block_frames):
+        yield np.zeros((min(block_frames, frames - start), CHANNELS), dtype=np.float32)
+
+class FrameBuffer:
+    """FIFO of audio frames, used to hold back at most a crossfade's worth of audio"""
+
+    def __init__(self):
+        self.blocks = []
+        self.frames = 0
+
+    def push(self, block):
+        if len(block):
+            self.blocks.append(block)
+            self.frames += len(block)
+
+    def pop(self, frames):
+        out, needed = [], frames
+        while needed and self.blocks:
+            block = self.blocks[0]
+            if len(block) <= needed:
+                out.append(self.blocks.pop(0))
+                needed -= len(block)
+            else:
+                out.append(block[:needed])
+                self.blocks[0] = block[needed:]
+                needed = 0
+        self.frames -= frames - needed
+        return np.concatenate(out) if out else np.zeros((0, CHANNELS), dtype=np.float32)
+
+def equal_power_fades(frames):
+    t = np.linspace(0.0, 1.0, frames, dtype=np.float32)[:, None]
+    return np.sin(t * (np.pi / 2)), np.cos(t * (np.pi / 2))
+
+def crossfade_concat(sources, fade_frames):
+    """Play the sources one after the other, overlapping each join by up to fade_frames"""
+    tail = np.zeros((0, CHANNELS), dtype=np.float32)
+    for source in sources:
+        buffer = FrameBuffer()
+        blocks = iter(source)
+        for block in blocks:
+            buffer.push(block)
+            if buffer.frames >= len(tail):
+                break
+        overlap = min(len(tail), buffer.frames)
+        if len(tail) > overlap:
+            yield tail[:len(tail) - overlap]
+        if overlap:
+            fade_in, fade_out = equal_power_fades(overlap)
+            yield tail[len(tail) - overlap:] * fade_out + buffer.pop(overlap) * fade_in
+        for block in blocks:
+            buffer.push(block)
+            if buffer.frames > fade_frames:
+                yield buffer.pop(buffer.frames - fade_frames)
+        tail = buffer.pop(buffer.frames)
+    if len(tail):
+        yield tail
+
+def voice_track(chunk_files, story_breaks=(), gap_seconds=STORY_GAP):
+    """The TTS chunks in order, with a pause before every chunk that starts a new story"""
+    for i, path in enumerate(chunk_files):
+        if i in story_breaks:
+            yield from silence(int(gap_seconds * SAMPLE_RATE))
+        yield from decode(path)
+
+def looped(path):
+    while True:
+        played = False
+        for block in decode(path):
+            played = True
+            yield block
+        if not played:
+            return
+
+def mix_bed(track, bed_path, gain_db=BED_GAIN_DB):
+    """Mix a looped music bed under a track, for exactly the track's length"""
+    gain = np.float32(10 ** (gain_db / 20))
+    bed = looped(bed_path)
+    buffer = FrameBuffer()
+    try:
+        for block in track:
+            while buffer.frames < len(block):
+                next_block = next(bed, None)
+                if next_block is None:
+                    break
+                buffer.push(next_block)
+            music = buffer.pop(min(len(block), buffer.frames))
+            if len(music) < len(block):
+                music = np.concatenate([music, np.zeros((len(block) - len(music), CHANNELS), dtype=np.float32)])
+            yield block + music * gain
+    finally:
+        bed.close()
+
+def program(chunk_files, story_breaks=(), intro=None, outro=None, bed=None):
+    """The assembled episode as a stream of blocks"""
+    voice = voice_track(chunk_files, story_breaks)
+    if bed:
+        voice = mix_bed(voice, bed)
+    sources = [decode(intro)] if intro else []
+    sources.append(voice)
+    if outro:
+        sources.append(decode(outro))
+    return crossfade_concat(sources, int(CROSSFADE * SAMPLE_RATE))
+
+def k_weighting_taps(taps=K_TAPS):
+    """Impulse response of the K-weighting filter cascade"""
+    signal = [1.0] + [0.0] * (taps - 1)
+    for b, a in K_WEIGHTING:
+        out = []
+        x1 = x2 = y1 = y2 = 0.0
+        for x in signal:
+            y = b[0] * x + b[1] * x1 + b[2] * x2 - a[1] * y1 - a[2] * y2
+            x2, x1, y2, y1 = x1, x, y1, y
+            out.append(y)
+        signal = out
+    return np.array(signal)
+
+class LoudnessMeter:
+    """Integrated loudness (LUFS) and sample peak of a stream of blocks, in constant memory.
+
+    The K-weighting runs as an FFT overlap-add FIR, the 400 ms gating blocks
+    (75% overlap) are built from 100 ms sub-blocks, and gated block powers
+    are accumulated in a fixed loudness histogram instead of a list.
+    """
+
+    def __init__(self):
+        self.taps = k_weighting_taps()
+        self.spectra = {}
+        self.carry = np.zeros((len(self.taps) - 1, CHANNELS))
+        self.hop = SAMPLE_RATE // 10
+        self.pending = np.zeros(0)
+        self.recent = []
+        self.counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.powers = np.zeros(HISTOGRAM_BINS)
+        self.peak = 0.0
+        self.frames = 0
+
+    def k_weight(self, block):
+        n = len(block)
+        size = 1 << (n + len(self.taps) - 2).bit_length()
+        if size not in self.spectra:
+            self.spectra[size] = np.fft.rfft(self.taps, size)
+        full = np.fft.irfft(np.fft.rfft(block, size, axis=0) * self.spectra[size][:, None], size, axis=0)
+        full = full[:n + len(self.taps) - 1]
+        full[:len(self.carry)] += self.carry
+        self.carry = full[n:].copy()
+        return full[:n]
+
+    def add(self, block):
+        if not len(block):
+            return
+        self.frames += len(block)
+        self.peak = max(self.peak, float(np.abs(block).max()))
+        # Sum of the channel mean squares, every channel weighted 1.0 for mono and stereo
+        power = np.square(self.k_weight(block.astype(np.float64))).sum(axis=1)
+        self.pending = np.concatenate([self.pending, power])
+        hops = len(self.pending) // self.hop
+        if not hops:
+            return
+        sub_blocks = self.pending[:hops * self.hop].reshape(hops, self.hop).mean(axis=1)
+        self.pending = self.pending[hops * self.hop:]
+        sequence = np.concatenate([self.recent, sub_blocks])
+        if len(sequence) >= 4:
+            windows = np.lib.stride_tricks.sliding_window_view(sequence, 4).mean(axis=1)
+            self.add_gating_blocks(windows)
+        self.recent = sequence[-3:]
+
+    def add_gating_blocks(self, powers):
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * np.log10(powers)
+        keep = loudness > ABSOLUTE_GATE
+        bins = np.minimum(((loudness[keep] - ABSOLUTE_GATE) / HISTOGRAM_STEP).astype(int), HISTOGRAM_BINS - 1)
+        np.add.at(self.counts, bins, 1)
+        np.add.at(self.powers, bins, powers[keep])
+
+    def integrated(self):
+        """Gated integrated loudness in LUFS, or None for silence"""
+        if not self.counts.any():
+            return None
+        relative = -0.691 + 10 * np.log10(self.powers.sum() / self.counts.sum()) + RELATIVE_GATE
+        first = max(0, int(np.ceil((relative - ABSOLUTE_GATE) / HISTOGRAM_STEP)))
+        counts, powers = self.counts[first:], self.powers[first:]
+        if not counts.any():
+            return None
+        return float(-0.691 + 10 * np.log10(powers.sum() / counts.sum()))
+
+    def peak_db(self):
+        return float(20 * np.log10(self.peak)) if self.peak > 0 else float('-inf')
+
+def normalization_gain(loudness, peak_db, target=TARGET_LUFS, ceiling=PEAK_CEILING_DB):
+    """Gain in dB towards the target loudness, reduced if it would push the peak over the ceiling"""
+    if loudness is None:
+        return 0.0
+    return min(target - loudness, ceiling - peak_db)
+
+def encode(blocks, output_file, gain_db):
+    """Encode the blocks to output_file, or into memory when it is None (returns the MP3 as a bytearray)"""
+    gain = np.float32(10 ** (gain_db / 20))
+    output = ['-f', 'mp3', 'pipe:1'] if output_file is None else [output_file]
+    encoded = bytearray()
+    with subprocess.Popen([ffmpeg_binary(), '-y', '-loglevel', 'error',
+                           '-f', 'f32le', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE), '-i', '-',
+                           '-c:a', 'libmp3lame', '-b:a', AUDIO_BITRATE, *output],
+                          stdin=subprocess.PIPE,
+                          stdout=subprocess.PIPE if output_file is None else None) as process:
+        def drain():
+            for data in iter(lambda: process.stdout.read(1 << 16), b''):
+                encoded.extend(data)
+
+        reader = None
+        if output_file is None:
+            # Read while the blocks are fed in, or ffmpeg stalls on a full pipe
+            reader = threading.Thread(target=drain)
+            reader.start()
+        for block in blocks:
+            process.stdin.write(np.clip(block * gain, -1.0, 1.0).astype('<f4').tobytes())
+        process.stdin.close()
+        if reader is not None:
+            reader.join()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not encode {output_file or 'the episode'}")
+    return encoded if output_file is None else None
+
+def render_episode(chunk_files, output_file, story_breaks=(), intro=INTRO_MUSIC, outro=OUTRO_MUSIC,
+                   bed=BED_MUSIC, target=TARGET_LUFS):
+    """Assemble, loudness-normalize and encode the episode in two streaming passes.
+
+    With output_file None the MP3 is kept in memory and returned as stats['audio'].
+    """
+    meter = LoudnessMeter()
+    for block in program(chunk_files, story_breaks, intro, outro, bed):
+        meter.add(block)
+    loudness = meter.integrated()
+    gain_db = normalization_gain(loudness, meter.peak_db(), target)
+
+    if output_file is not None:
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    encoded = encode(program(chunk_files, story_breaks, intro, outro, bed), output_file, gain_db)
+    return {'duration': meter.frames / SAMPLE_RATE, 'loudness': loudness, 'peak_db': meter.peak_db(),
+            'gain_db': gain_db, 'audio': encoded}
@@ -0,0 +1,147 @@
+"""In-memory episode handed from stage to stage when they run in one process.
+
+While main.run_episode runs the stages in-process (daemon.py), it holds an
+Episode for the podcast number (see held_episode). Each stage takes what the
+one before it left there - the articles, the summaries, the script, the
+encoded audio and its duration - instead of reading and parsing the files
+again, and hands its files to a background writer that puts them on disk for
+durability: resuming with a single stage, worker.py and storage.py all still
+work from the files. The writes are atomic and kept apart per episode. A step
+is only over once the files of its stage are on disk (see flush_episode), so a
+failed write fails the stage that handed it over.
+
+Run as scripts (main.py's default), the stages find no episode held and read
+and write the files themselves, as before.
+"""
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+@dataclass(slots=True)
+class Article:
+    index: int
+    title: str
+    source: str
+    url: str
+    content: str
+
+@dataclass(slots=True)
+class Summary:
+    index: int
+    title: str
+    text: str
+
+@dataclass(slots=True)
+class Episode:
+    podcast_number: int
+    articles: dict = field(default_factory=dict)    # index -> Article
+    summaries: dict = field(default_factory=dict)   # index -> Summary
+    script: Optional[str] = None
+    audio: Optional[memoryview] = None              # the encoded MP3, as written to disk
+    audio_duration: Optional[float] = None
+
+def write_file(path, data):
+    """Write str or bytes-like data to path atomically, so a reader never sees half a file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if isinstance(data, str):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+    else:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+class ArtifactWriter:
+    """One background thread writing artifacts to disk in the order they were handed over"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.pending = {}   # path -> (podcast_number, Event set once written)
+        self.errors = {}    # podcast_number -> {path: OSError}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def write(self, podcast_number, path, data):
+        done = threading.Event()
+        with self.lock:
+            self.pending[path] = (podcast_number, done)
+            self.errors.get(podcast_number, {}).pop(path, None)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="artifact-writer", daemon=True)
+                self.thread.start()
+        self.queue.put((podcast_number, path, data, done))
+
+    def run(self):
+        while True:
+            podcast_number, path, data, done = self.queue.get()
+            try:
+                write_file(path, data)
+            except OSError as e:
+                with self.lock:
+                    self.errors.setdefault(podcast_number, {})[path] = e
+            finally:
+                with self.lock:
+                    if self.pending.get(path, (None, None))[1] is done:
+                        del self.pending[path]
+                done.set()
+
+    def wait(self, path):
+        """Block until path is on disk; raises if writing it failed"""
+        with self.lock:
+            podcast_number, done = self.pending.get(path, (None, None))
+        if done is None:
+            return
+        done.wait()
+        with self.lock:
+            error = self.errors.get(podcast_number, {}).pop(path, None)
+        if error is not None:
+            raise error
+
+    def flush(self, podcast_number):
+        """Block until every file of the episode is on disk; returns and forgets the failed writes {path: OSError}"""
+        with self.lock:
+            waiting = [done for owner, done in self.pending.values() if owner == podcast_number]
+        for done in waiting:
+            done.wait()
+        with self.lock:
+            return self.errors.pop(podcast_number, {})
+
+_episodes = {}
+_writer = ArtifactWriter()
+
+@contextmanager
+def held_episode(podcast_number):
+    """Keep an Episode in memory for the stages run inside the block, then wait for its files.
+
+    Failed writes are reported by flush_episode after each stage; whatever is
+    left at release is dropped, so it never masks an exception leaving the block.
+    """
+    episode = _episodes[podcast_number] = Episode(podcast_number)
+    try:
+        yield episode
+    finally:
+        del _episodes[podcast_number]
+        _writer.flush(podcast_number)
+
+def current_episode(podcast_number):
+    """The episode held for podcast_number in this process, or None when the stages run as scripts"""
+    return _episodes.get(podcast_number)
+
+def save_artifact(episode, path, data):
+    """Write an artifact: in the background while an episode is held, straight away otherwise"""
+    if episode is None:
+        write_file(path, data)
+    else:
+        _writer.write(episode.podcast_number, path, data)
+
+def wait_written(path):
+    """Block until a file handed to the background writer is on disk (no-op for anything else)"""
+    _writer.wait(path)
+
+def flush_episode(podcast_number):
+    """Block until the files handed over for the episode are on disk; returns the failed writes {path: OSError}"""
+    return _writer.flush(podcast_number)
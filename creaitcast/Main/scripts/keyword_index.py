@@ -0,0 +1,161 @@
+import os
+import re
+import json
+import math
+import heapq
+from collections import Counter
+
+# Document frequencies of every episode processed so far, used to weight keywords by how distinctive they are.
+# The folder holds df.json plus one term list per document under docs/.
+KEYWORD_INDEX = os.getenv('KEYWORD_INDEX', 'output/keyword_index')
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+STOP_WORDS = frozenset("""
+a about after again against all also an and any are as at be because been before being between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him
+his how i if in into is it its itself just more most no nor not now of off on once only or other our ours
+out over own same she should so some such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would you
+your yours said says say new one two three also like get got make made many much may might must per via
+story stories titled next podcast episode summary summaries welcome today thanks listening stay tuned
+generated dive top let lets
+""".split())
+
+def is_keyword(term):
+    """Keywords are lowercase words of three letters or more that are neither stop words nor numbers"""
+    return len(term) > 2 and term not in STOP_WORDS and not term.isdigit()
+
+def term_counts(text):
+    """Keyword counts of a text.
+
+    The regex scan and the counting both run in C; stop words, numbers and
+    short words are then dropped once per distinct term rather than once per token.
+    """
+    counts = Counter(TOKEN_PATTERN.findall(text.lower()))
+    for term in [term for term in counts if not is_keyword(term)]:
+        del counts[term]
+    return counts
+
+def episode_doc_id(podcast_number):
+    return f"episode_{podcast_number}"
+
+class KeywordIndex:
+    """TF-IDF keywords against a corpus of past episodes persisted on disk.
+
+    The document frequencies are kept as a snapshot (df.json) plus an
+    append-only log of the changes made since (df.<generation>.log), which is
+    replayed on load and folded into a new snapshot once it grows past
+    LOG_COMPACT_ENTRIES. A document's own term list is read back just when that
+    document is replaced, so an update costs O(terms in the document) and
+    top_terms costs O(distinct terms in the text).
+    """
+
+    # Log entries replayed on load before they are compacted into the snapshot
+    LOG_COMPACT_ENTRIES = 100
+
+    def __init__(self, path=KEYWORD_INDEX):
+        self.path = path
+        self.num_docs = 0
+        self.df = Counter()
+        self.generation = 0
+        try:
+            with open(os.path.join(path, 'df.json'), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.num_docs = data['num_docs']
+            self.df = Counter(data['df'])
+            self.generation = data.get('generation', 0)
+        except (OSError, ValueError, KeyError):
+            pass
+        if self._replay_log() >= self.LOG_COMPACT_ENTRIES:
+            self.compact()
+
+    def _doc_path(self, doc_id):
+        return os.path.join(self.path, 'docs', f"{doc_id}.txt")
+
+    def _log_path(self, generation=None):
+        return os.path.join(self.path, f"df.{self.generation if generation is None else generation}.log")
+
+    def _read_doc(self, doc_id):
+        try:
+            with open(self._doc_path(doc_id), 'r', encoding='utf-8') as f:
+                return set(f.read().split())
+        except OSError:
+            return None
+
+    def _apply(self, entry):
+        self.num_docs += entry['docs']
+        self.df.subtract(entry['removed'])
+        self.df.update(entry['added'])
+
+    def _replay_log(self):
+        """Apply the changes logged since the snapshot; returns how many there were.
+
+        A log ending in a torn line counts as full, so it is compacted before anything is appended after it.
+        """
+        entries = 0
+        try:
+            with open(self._log_path(), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line of a process that died mid-append
+                        return max(entries, self.LOG_COMPACT_ENTRIES)
+                    self._apply(entry)
+                    entries += 1
+        except OSError:
+            pass
+        return entries
+
+    def add_document(self, doc_id, text):
+        """Add or replace a document; returns False if it was already indexed with the same terms"""
+        terms = set(term_counts(text))
+        previous = self._read_doc(doc_id)
+        if previous == terms:
+            return False
+        entry = {'docs': 1 if previous is None else 0,
+                 'added': sorted(terms - (previous or set())),
+                 'removed': sorted((previous or set()) - terms)}
+        self._apply(entry)
+
+        os.makedirs(os.path.dirname(self._doc_path(doc_id)), exist_ok=True)
+        with open(self._doc_path(doc_id), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(sorted(terms)))
+        with open(self._log_path(), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+        return True
+
+    def idf(self, term):
+        return math.log((1 + self.num_docs) / (1 + self.df.get(term, 0))) + 1
+
+    def top_terms(self, text, k=5, counts=None):
+        """The k terms of `text` with the highest TF-IDF"""
+        counts = counts if counts is not None else term_counts(text)
+        idf = self.idf
+        return heapq.nlargest(k, counts, key=lambda term: counts[term] * idf(term))
+
+    def compact(self):
+        """Write the document frequencies as a new snapshot and drop the log it replaces"""
+        os.makedirs(self.path, exist_ok=True)
+        data = {
+            'num_docs': self.num_docs,
+            'df': {term: count for term, count in self.df.items() if count > 0},
+            'generation': self.generation + 1,
+        }
+        tmp_path = os.path.join(self.path, 'df.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        # The snapshot names the next log, so a crash before the old log is removed never replays it twice
+        os.replace(tmp_path, os.path.join(self.path, 'df.json'))
+        old_log, self.generation = self._log_path(), self.generation + 1
+        try:
+            os.remove(old_log)
+        except OSError:
+            pass
+
+def episode_keywords(podcast_number, text, k=5):
+    """Index an episode's text (idempotent) and return its top-k distinctive terms"""
+    index = KeywordIndex()
+    index.add_document(episode_doc_id(podcast_number), text)
+    return index.top_terms(text, k)
@@ -0,0 +1,75 @@
+"""Languages an episode can be produced in.
+
+Each locale names the summarizer stage it uses, the labels of its summary
+files, the script templates and the TTS voice. The default locale keeps the
+usual episode folders; every other one gets the same layout under
+output/podcast_N/locales/<code>/, next to the articles they all share.
+"""
+import os
+
+DEFAULT_LOCALE = 'en'
+
+LOCALES = {
+    'en': {
+        'name': 'English',
+        'summarizer': '2_summarize_articles.py',
+        'labels': ('Title', 'Summary'),
+        'introduction': ("Welcome to podcast number {podcast_number} of our AI-generated news summary.\n"
+                         "Let's dive into the summaries of our top stories."),
+        'story': "Our next story is titled: {title}",
+        'conclusion': ("That concludes our AI-generated news summary for today.\n"
+                       "Thanks for listening, and stay tuned for our next episode."),
+        'voice': 'en-US-ChristopherNeural',
+    },
+    'en-local': {
+        'name': 'English (local model)',
+        'summarizer': '2_summarize_articleseng.py',
+        'labels': ('Title', 'Summary'),
+        'introduction': ("Welcome to podcast number {podcast_number} of our AI-generated news summary.\n"
+                         "Let's dive into the summaries of our top stories."),
+        'story': "Our next story is titled: {title}",
+        'conclusion': ("That concludes our AI-generated news summary for today.\n"
+                       "Thanks for listening, and stay tuned for our next episode."),
+        'voice': 'en-US-ChristopherNeural',
+    },
+    'it': {
+        'name': 'Italiano',
+        'summarizer': '2_summarize_articles_IT_slow.py',
+        'labels': ('Titolo', 'Riassunto'),
+        'introduction': ("Benvenuti al podcast numero {podcast_number} del nostro riassunto di notizie "
+                         "generato dall'intelligenza artificiale.\nScopriamo i riassunti delle notizie principali."),
+        'story': "La prossima notizia si intitola: {title}",
+        'conclusion': ("Questo conclude il nostro riassunto di notizie generato dall'intelligenza artificiale "
+                       "per oggi.\nGrazie per l'ascolto, e restate sintonizzati per il prossimo episodio."),
+        'voice': 'it-IT-IsabellaNeural',
+    },
+}
+
+def locale_folder(podcast_number, locale=DEFAULT_LOCALE):
+    base = f"output/podcast_{podcast_number}"
+    return base if locale == DEFAULT_LOCALE else os.path.join(base, 'locales', locale)
+
+def locale_paths(podcast_number, locale=DEFAULT_LOCALE):
+    """Where each artifact of one locale of an episode lives"""
+    folder = locale_folder(podcast_number, locale)
+    return {
+        'summaries': os.path.join(folder, 'summaries'),
+        'script': os.path.join(folder, 'scripts', 'podcast_script.txt'),
+        'audio': os.path.join(folder, 'audio', f"episode{podcast_number}.mp3"),
+        'video': os.path.join(folder, 'video', f"episode{podcast_number}.mp4"),
+        'images': os.path.join(folder, 'video', 'images'),
+    }
+
+def video_segment_folder(video_path):
+    """Scratch folder for the slide segments of a video while it is encoded, next to the video"""
+    return f"{video_path}.segments"
+
+def format_summary(title, summary, locale=DEFAULT_LOCALE):
+    title_label, summary_label = LOCALES[locale]['labels']
+    return f"{title_label}: {title}\n{summary_label}:\n{summary}"
+
+def parse_summary(content, locale=DEFAULT_LOCALE):
+    """(title, summary) of a summary file written with format_summary"""
+    title_label, summary_label = LOCALES[locale]['labels']
+    title = content.split('\n')[0].replace(f"{title_label}: ", "")
+    return title, content.split(f"{summary_label}:\n")[1]
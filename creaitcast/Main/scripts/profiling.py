@@ -0,0 +1,143 @@
+"""Optional profiling of a stage run, enabled from the command line.
+
+--profile runs the stage under cProfile and, at the same time, a sampling
+profiler that records whole call stacks of every thread. Both are written to
+output/podcast_N/profile/: <stage>.pstats (for pstats, snakeviz, ...) and
+<stage>.collapsed (one "frame;frame;frame count" line per stack, the input of
+flamegraph.pl and speedscope). The hottest functions are printed at the end.
+
+--trace-memory tracks Python allocations with tracemalloc and writes the top
+allocation sites to <stage>.memory.txt; it is meant for the audio and video
+stages. Memory used by ffmpeg child processes is not seen.
+"""
+import os
+import sys
+import threading
+import time
+import types
+from collections import Counter
+
+PROFILE_FLAGS = {'--profile': 'profile', '--trace-memory': 'trace_memory'}
+# Seconds between stack samples
+SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+TOP_FUNCTIONS = 25
+
+def parse_args(argv):
+    """Split the profiling flags off the arguments; returns (remaining args, options)"""
+    options = {name: False for name in PROFILE_FLAGS.values()}
+    args = []
+    for arg in argv:
+        if arg in PROFILE_FLAGS:
+            options[PROFILE_FLAGS[arg]] = True
+        else:
+            args.append(arg)
+    options['stage'] = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    return args, options
+
+def profile_folder(podcast_number):
+    return f"output/podcast_{podcast_number}/profile"
+
+def frame_label(code):
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+class StackSampler:
+    """Samples the call stack of every other thread at a fixed interval"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def call(func, *args, **kwargs):
+    """Call a stage main(), running it to completion if it is a coroutine"""
+    result = func(*args, **kwargs)
+    if isinstance(result, types.CoroutineType):
+        import asyncio
+
+        return asyncio.run(result)
+    return result
+
+def write_memory_report(snapshot, peak, path, top=TOP_FUNCTIONS):
+    stats = snapshot.statistics('lineno')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MB\n\nTop allocation sites still held at exit:\n")
+        for stat in stats[:top]:
+            f.write(f"{stat}\n")
+        f.write("\nLargest allocation tracebacks:\n")
+        for stat in snapshot.statistics('traceback')[:5]:
+            f.write(f"\n{stat.count} blocks, {stat.size / 1024:.1f} KiB\n")
+            for line in stat.traceback.format():
+                f.write(f"{line}\n")
+    return stats
+
+def run(options, func, podcast_number, *args, **kwargs):
+    """Run a stage main() with the profilers selected in `options` (see parse_args)"""
+    if not options['profile'] and not options['trace_memory']:
+        return call(func, podcast_number, *args, **kwargs)
+
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    folder = profile_folder(podcast_number)
+    os.makedirs(folder, exist_ok=True)
+    base = os.path.join(folder, options['stage'])
+
+    profiler = sampler = None
+    if options['trace_memory']:
+        tracemalloc.start(25)
+    if options['profile']:
+        sampler = StackSampler()
+        sampler.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        return call(func, podcast_number, *args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+            sampler.stop()
+            profiler.dump_stats(f"{base}.pstats")
+            sampler.write_collapsed(f"{base}.collapsed")
+            print(f"\n{options['stage']} took {elapsed:.2f}s; {sum(sampler.stacks.values())} stack samples")
+            pstats.Stats(profiler, stream=sys.stdout).sort_stats('tottime').print_stats(TOP_FUNCTIONS)
+            print(f"Profile written to {base}.pstats and {base}.collapsed")
+        if options['trace_memory']:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stats = write_memory_report(snapshot, peak, f"{base}.memory.txt")
+            print(f"\nPeak traced memory: {peak / 1024 / 1024:.1f} MB")
+            for stat in stats[:10]:
+                print(stat)
+            print(f"Allocation report written to {base}.memory.txt")
@@ -0,0 +1,259 @@
+"""Speech synthesis scheduler for 4_generate_audio.py.
+
+Chunks are synthesized by a fixed pool of TTS_SESSIONS workers, longest chunk
+first, so the last chunk to finish is a short one. With TTS_URL set, each
+worker owns a keep-alive HTTP session; the sessions are opened (warmed) in
+parallel before the first chunk and kept for the life of the process, so the
+daemon and multilocale.py pay the handshakes once. edge-tts opens a new
+websocket for every request whatever it is given, so there the pool only
+bounds the number of concurrent connections.
+
+Every attempt is recorded per voice in TTS_STATS (latency, characters,
+failures). The chunk size for a voice is derived from those numbers: chunks
+that take about TTS_TARGET_CHUNK_SECONDS to synthesize, small enough that one
+fails at most TTS_MAX_CHUNK_FAILURE of the time (failures are counted per
+character, since a failed chunk is retried whole), and never so large that
+some of the sessions sit idle.
+
+    python tts_scheduler.py      # per-voice throughput stats
+"""
+import asyncio
+import json
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional HTTP TTS endpoint used instead of edge-tts (e.g. a local stand-in for benchmarks)
+TTS_URL = os.getenv('TTS_URL')
+TTS_SESSIONS = int(os.getenv('TTS_SESSIONS', '4'))
+TTS_RETRIES = int(os.getenv('TTS_RETRIES', '3'))
+TTS_STATS = os.getenv('TTS_STATS', 'output/tts_stats.json')
+# Chunk size used for a voice with no history, and the bounds of the adaptive size
+TTS_CHUNK_SIZE = int(os.getenv('TTS_CHUNK_SIZE', '2000'))
+MIN_CHUNK_SIZE = 500
+MAX_CHUNK_SIZE = 5000
+TTS_TARGET_CHUNK_SECONDS = float(os.getenv('TTS_TARGET_CHUNK_SECONDS', '15'))
+TTS_MAX_CHUNK_FAILURE = float(os.getenv('TTS_MAX_CHUNK_FAILURE', '0.05'))
+# Weight of the newest attempt in the moving averages (about the last 20 attempts count)
+STATS_ALPHA = 0.05
+
+class VoiceStats:
+    """Per-voice synthesis history, kept on disk so chunk sizing learns across runs"""
+
+    def __init__(self, path=TTS_STATS):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.voices = json.load(f)
+        except (OSError, ValueError):
+            self.voices = {}
+
+    def record(self, voice, chars, seconds, ok):
+        with self.lock:
+            stats = self.voices.setdefault(voice, {'attempts': 0, 'failures': 0, 'chunks': 0, 'chars': 0,
+                                                   'seconds': 0.0, 'failure_rate': 0.0, 'attempt_chars': chars,
+                                                   'chars_per_second': None})
+            stats['attempts'] += 1
+            stats['failure_rate'] += STATS_ALPHA * ((0.0 if ok else 1.0) - stats['failure_rate'])
+            stats['attempt_chars'] += STATS_ALPHA * (chars - stats['attempt_chars'])
+            if not ok:
+                stats['failures'] += 1
+                return
+            stats['chunks'] += 1
+            stats['chars'] += chars
+            stats['seconds'] += seconds
+            speed = chars / max(seconds, 1e-3)
+            previous = stats['chars_per_second']
+            stats['chars_per_second'] = speed if previous is None else previous + STATS_ALPHA * (speed - previous)
+
+    def chunk_size(self, voice, text_length=None, sessions=TTS_SESSIONS):
+        """Characters per chunk for `voice`, from its observed speed and failure rate"""
+        stats = self.voices.get(voice)
+        if not stats or not stats['chars_per_second']:
+            size = TTS_CHUNK_SIZE
+        else:
+            size = stats['chars_per_second'] * TTS_TARGET_CHUNK_SECONDS
+            # Chance of failure per character; a chunk of n characters fails about n times as often
+            failures_per_char = stats['failure_rate'] / max(1.0, stats['attempt_chars'])
+            if failures_per_char:
+                size = min(size, TTS_MAX_CHUNK_FAILURE / failures_per_char)
+        if text_length:
+            # Enough chunks to keep every session busy
+            size = min(size, math.ceil(text_length / sessions))
+        return int(min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, size)))
+
+    def save(self):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.voices, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def report(self):
+        """One line of throughput stats per voice"""
+        lines = []
+        for voice, stats in sorted(self.voices.items()):
+            speed = stats['chars'] / stats['seconds'] if stats['seconds'] else 0
+            lines.append(f"{voice:<28} {stats['chunks']:>6} chunks {stats['chars']:>9} chars {speed:>8.0f} chars/s "
+                         f"{stats['failures'] / max(1, stats['attempts']):>6.1%} failed, "
+                         f"next chunk {self.chunk_size(voice)} chars")
+        return lines
+
+class HTTPSession:
+    """One keep-alive connection to the TTS_URL endpoint"""
+
+    def __init__(self, url):
+        import requests
+
+        self.url = url
+        self.session = requests.Session()
+        self.warm = False
+
+    def warm_up(self):
+        """Open the connection; True if the service answered at all"""
+        import requests
+
+        try:
+            self.session.head(self.url, timeout=10)
+        except requests.RequestException:
+            return False
+        self.warm = True
+        return True
+
+    def synthesize(self, text, filename, voice):
+        response = self.session.post(self.url, json={"text": text, "voice": voice}, timeout=60)
+        response.raise_for_status()
+        with open(filename, 'wb') as f:
+            f.write(response.content)
+
+class SessionPool:
+    """The TTS sessions of this process, each used by one chunk at a time.
+
+    Episodes synthesized at the same time (multilocale.py runs one event loop per locale) share the
+    sessions, so TTS_SESSIONS caps the connections of the whole process.
+    """
+
+    def __init__(self, size=TTS_SESSIONS, url=TTS_URL):
+        self.size = max(1, size)
+        self.url = url
+        self.sessions = [HTTPSession(url) for _ in range(self.size)] if url else [None] * self.size
+        self.idle = queue.Queue()
+        for session in self.sessions:
+            self.idle.put(session)
+        # Set once the service has answered; until then a failed connection is not retried
+        self.reached = False
+
+    async def checkout(self):
+        # Polled rather than waited on in a thread, so a cancelled worker never takes a session with it
+        while True:
+            try:
+                return self.idle.get_nowait()
+            except queue.Empty:
+                await asyncio.sleep(0.05)
+
+    def checkin(self, session):
+        self.idle.put(session)
+
+    def warm_up(self):
+        """Open every cold session at once instead of one handshake per chunk"""
+        cold = [session for session in self.sessions if session is not None and not session.warm]
+        if cold:
+            with ThreadPoolExecutor(max_workers=len(cold)) as executor:
+                if any(executor.map(HTTPSession.warm_up, cold)):
+                    self.reached = True
+
+    async def synthesize(self, session, text, filename, voice):
+        if session is not None:
+            await asyncio.to_thread(session.synthesize, text, filename, voice)
+            return
+        import edge_tts
+
+        await edge_tts.Communicate(text=text, voice=voice).save(filename)
+
+_pool = None
+_stats = None
+_lock = threading.Lock()
+
+def get_pool():
+    """Session pool shared by every episode synthesized in this process"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = SessionPool()
+    return _pool
+
+def get_stats():
+    global _stats
+    with _lock:
+        if _stats is None:
+            _stats = VoiceStats()
+    return _stats
+
+def unreachable(error):
+    """Whether the TTS service could not be connected to at all (no network, wrong host)"""
+    import requests
+
+    if isinstance(error, requests.ConnectionError):
+        return True
+    try:
+        import aiohttp
+    except ImportError:
+        return False
+    return isinstance(error, aiohttp.ClientConnectorError)
+
+async def synthesize_chunk(session, text, filename, voice, retries=TTS_RETRIES):
+    """Synthesize one chunk on `session`, retrying with backoff; every attempt goes into the voice stats"""
+    pool, stats = get_pool(), get_stats()
+    for attempt in range(retries):
+        start = time.perf_counter()
+        try:
+            await pool.synthesize(session, text, filename, voice)
+        except Exception as e:
+            # A service that was never reached says nothing about chunk sizes, and retrying it will not help
+            offline = not pool.reached and unreachable(e)
+            if not offline:
+                stats.record(voice, len(text), time.perf_counter() - start, ok=False)
+            if attempt == retries - 1 or offline:
+                print(f"Error processing chunk: {e}")
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+        else:
+            stats.record(voice, len(text), time.perf_counter() - start, ok=True)
+            pool.reached = True
+            return
+
+async def synthesize(chunks, filenames, voice):
+    """Synthesize chunks[i] into filenames[i] on the session pool, longest chunks first"""
+    pool, stats = get_pool(), get_stats()
+    await asyncio.to_thread(pool.warm_up)
+    pending = sorted(range(len(chunks)), key=lambda i: len(chunks[i]), reverse=True)
+
+    async def work():
+        session = await pool.checkout()
+        try:
+            while pending:
+                i = pending.pop(0)
+                await synthesize_chunk(session, chunks[i], filenames[i], voice)
+        finally:
+            pool.checkin(session)
+
+    workers = [asyncio.ensure_future(work()) for _ in range(min(pool.size, len(chunks)))]
+    try:
+        await asyncio.gather(*workers)
+    except Exception:
+        # One chunk gave up: the episode fails, so stop handing out the others
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        raise
+    finally:
+        stats.save()
+
+if __name__ == "__main__":
+    lines = VoiceStats().report()
+    print("\n".join(lines) if lines else f"No synthesis recorded in {TTS_STATS} yet")
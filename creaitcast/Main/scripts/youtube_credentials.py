@@ -0,0 +1,42 @@
+"""Where the YouTube upload credentials live, and whether they are usable.
+
+Shared by 6_upload_to_youtube.py and preflight.py. Importing it has no side
+effects (no .env loading, no logging setup), so the pre-flight checks can use
+it inside main.py's process; the settings are read from the environment as it
+is when the module is first imported.
+"""
+import os
+import pickle
+
+# Optional YouTube API host override (e.g. a local stand-in used by the benchmarks)
+YOUTUBE_API_URL = os.getenv('YOUTUBE_API_URL')
+# OAuth client of the YouTube project, and the token saved after the first (interactive) consent
+YOUTUBE_CLIENT_SECRET = os.getenv('YOUTUBE_CLIENT_SECRET', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'Config_files', 'client_secret.json'))
+YOUTUBE_TOKEN = os.getenv('YOUTUBE_TOKEN', 'token.pickle')
+
+def credentials_status():
+    """('ok' | 'consent' | 'missing', detail) for the upload credentials, without opening the consent flow.
+
+    'consent' means the first upload will wait for someone to authorize it in a browser.
+    """
+    if YOUTUBE_API_URL and not os.path.exists(YOUTUBE_TOKEN):
+        return 'ok', f"stand-in at {YOUTUBE_API_URL}"
+    if os.path.exists(YOUTUBE_TOKEN):
+        try:
+            with open(YOUTUBE_TOKEN, 'rb') as token:
+                credentials = pickle.load(token)
+        except Exception as e:
+            credentials = None
+            detail = f"{YOUTUBE_TOKEN} is unreadable ({e})"
+        else:
+            if credentials is not None and credentials.valid:
+                return 'ok', f"token in {YOUTUBE_TOKEN}"
+            if credentials is not None and credentials.expired and credentials.refresh_token:
+                return 'ok', f"expired token in {YOUTUBE_TOKEN}, refreshed at upload"
+            detail = f"{YOUTUBE_TOKEN} holds no usable token"
+    else:
+        detail = f"no saved token ({YOUTUBE_TOKEN})"
+    if not os.path.exists(YOUTUBE_CLIENT_SECRET):
+        return 'missing', f"{detail} and no client secret at {YOUTUBE_CLIENT_SECRET} (set YOUTUBE_CLIENT_SECRET)"
+    return 'consent', f"{detail}; the upload will open a browser consent flow for {YOUTUBE_CLIENT_SECRET}"
@@ -0,0 +1,353 @@
+"""Retention and garbage collection for the output/podcast_N trees.
+
+Once an episode is uploaded (6_upload_to_youtube.py writes output/podcast_N/upload.json) its
+artifacts are handled per type according to RETENTION: the article, summary
+and script folders are packed into one text.tar.xz per episode, the MP3 and
+leftover video segments are deleted, and slide PNGs are replaced by hard links
+into a content-addressed store so identical slides are kept once. The extra
+languages of an episode (output/podcast_N/locales/<code>/, see multilocale.py)
+are handled the same way as the episode itself.
+
+Episodes that are not uploaded yet, or that a process is still working on
+(a live .in_progress marker or a queued/running job), are never touched.
+
+Usage:
+    python storage.py gc [--dry-run] [--episodes 3,4] [--policy audio=keep ...]
+    python storage.py report
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import socket
+import sys
+import tarfile
+import time
+from contextlib import contextmanager
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+from locales import video_segment_folder
+
+OUTPUT_FOLDER = 'output'
+# Content-addressed slide store shared by all episodes
+SLIDE_STORE = os.getenv('SLIDE_STORE', 'output/slides')
+UPLOAD_RECORD = 'upload.json'
+IN_PROGRESS_MARKER = '.in_progress'
+TEXT_FOLDERS = ('articles', 'summaries', 'scripts')
+TEXT_ARCHIVE = 'text.tar.xz'
+LOCALES_FOLDER = 'locales'
+
+# Artifact type -> action for uploaded episodes
+RETENTION = {
+    'text': 'archive',     # articles/, summaries/, scripts/ -> text.tar.xz
+    'audio': 'delete',     # the uploaded video carries the audio track
+    'images': 'dedupe',    # hard links into SLIDE_STORE
+    'segments': 'delete',  # video/episodeN.mp4.segments (or video/.segments) left by an interrupted encode
+    'video': 'keep',
+}
+ACTIONS = {
+    'text': ('archive', 'delete', 'keep'),
+    'audio': ('delete', 'keep'),
+    'images': ('dedupe', 'delete', 'keep'),
+    'segments': ('delete', 'keep'),
+    'video': ('delete', 'keep'),
+}
+
+def episode_folder(podcast_number, output_folder=OUTPUT_FOLDER):
+    return os.path.join(output_folder, f"podcast_{podcast_number}")
+
+def episode_folders(output_folder=OUTPUT_FOLDER):
+    """Episode number -> folder for every podcast_N under the output folder"""
+    folders = {}
+    if os.path.isdir(output_folder):
+        with os.scandir(output_folder) as entries:
+            for entry in entries:
+                match = re.match(r'^podcast_(\d+)$', entry.name)
+                if match and entry.is_dir():
+                    folders[int(match.group(1))] = entry.path
+    return folders
+
+@contextmanager
+def episode_in_progress(podcast_number, output_folder=OUTPUT_FOLDER):
+    """Mark an episode as being worked on for as long as the block runs"""
+    marker = os.path.join(episode_folder(podcast_number, output_folder), IN_PROGRESS_MARKER)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump({'pid': os.getpid(), 'host': socket.gethostname(), 'started_at': time.time()}, f)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(marker)
+        except OSError:
+            pass
+
+def marker_is_live(folder):
+    """True while the process named in the episode's .in_progress marker is alive.
+
+    Markers from another host cannot be checked and always count as live.
+    """
+    try:
+        with open(os.path.join(folder, IN_PROGRESS_MARKER), 'r', encoding='utf-8') as f:
+            marker = json.load(f)
+    except OSError:
+        return False
+    except ValueError:
+        return True
+    # Signal 0 only probes the process on POSIX
+    if marker.get('host') != socket.gethostname() or os.name == 'nt':
+        return True
+    try:
+        os.kill(marker['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, KeyError):
+        return True
+    return True
+
+def queued_episodes():
+    """Episodes with a queued or running job in the daemon queue"""
+    from episode_queue import EPISODE_QUEUE, EpisodeQueue
+
+    if not os.path.exists(EPISODE_QUEUE):
+        return set()
+    queue = EpisodeQueue(EPISODE_QUEUE)
+    try:
+        rows = queue.conn.execute(
+            "SELECT DISTINCT podcast_number FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+    finally:
+        queue.close()
+    return {row[0] for row in rows}
+
+def is_uploaded(folder):
+    return os.path.exists(os.path.join(folder, UPLOAD_RECORD))
+
+def tree_size(path):
+    """Bytes held by the files under path, counting hard-linked files only if this is their last link"""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return stat.st_size if stat.st_nlink == 1 else 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += tree_size(os.path.join(root, name))
+    return total
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def delete_path(path, dry_run=False):
+    if not os.path.exists(path):
+        return 0
+    reclaimed = tree_size(path)
+    if not dry_run:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    return reclaimed
+
+def archive_text(folder, dry_run=False):
+    """Pack the text folders into text.tar.xz (merging with an earlier archive) and remove them"""
+    sources = [name for name in TEXT_FOLDERS if os.path.isdir(os.path.join(folder, name))]
+    if not sources:
+        return 0
+    archive_path = os.path.join(folder, TEXT_ARCHIVE)
+    before = sum(tree_size(os.path.join(folder, name)) for name in sources)
+    old_size = os.path.getsize(archive_path) if os.path.exists(archive_path) else 0
+    if dry_run:
+        return before
+
+    tmp_path = archive_path + '.tmp'
+    with tarfile.open(tmp_path, 'w:xz') as archive:
+        if old_size:
+            with tarfile.open(archive_path, 'r:xz') as old:
+                for member in old.getmembers():
+                    if member.name.split('/')[0] not in sources:
+                        archive.addfile(member, old.extractfile(member) if member.isfile() else None)
+        for name in sources:
+            archive.add(os.path.join(folder, name), arcname=name)
+    os.replace(tmp_path, archive_path)
+    for name in sources:
+        shutil.rmtree(os.path.join(folder, name))
+    return before + old_size - os.path.getsize(archive_path)
+
+def dedupe_images(folder, store=SLIDE_STORE, dry_run=False):
+    """Replace each slide with a hard link to its copy in the content-addressed store"""
+    image_folder = os.path.join(folder, 'video', 'images')
+    if not os.path.isdir(image_folder):
+        return 0
+    reclaimed = 0
+    if not dry_run:
+        os.makedirs(store, exist_ok=True)
+    for name in sorted(os.listdir(image_folder)):
+        path = os.path.join(image_folder, name)
+        if not name.endswith('.png') or not os.path.isfile(path):
+            continue
+        stored = os.path.join(store, file_sha256(path) + '.png')
+        if not os.path.exists(stored):
+            if not dry_run:
+                os.link(path, stored)
+            continue
+        if os.path.samefile(path, stored):
+            continue
+        reclaimed += tree_size(path)
+        if not dry_run:
+            tmp_path = path + '.tmp'
+            os.link(stored, tmp_path)
+            os.replace(tmp_path, path)
+    return reclaimed
+
+def prune_slide_store(store=SLIDE_STORE, dry_run=False):
+    """Drop stored slides no episode links to any more"""
+    reclaimed = 0
+    if os.path.isdir(store):
+        for name in os.listdir(store):
+            path = os.path.join(store, name)
+            if os.stat(path).st_nlink == 1:
+                reclaimed += delete_path(path, dry_run)
+    return reclaimed
+
+def artifact_folders(folder):
+    """The episode folder and the folder of each of its extra locales, which share its layout"""
+    locales = os.path.join(folder, LOCALES_FOLDER)
+    if not os.path.isdir(locales):
+        return [folder]
+    return [folder] + [os.path.join(locales, name) for name in sorted(os.listdir(locales))
+                       if os.path.isdir(os.path.join(locales, name))]
+
+def collect_episode(folder, podcast_number, policy=RETENTION, store=SLIDE_STORE, dry_run=False):
+    """Apply the retention policy to one uploaded episode; returns bytes reclaimed per artifact type"""
+    reclaimed = {}
+    for artifact_folder in artifact_folders(folder):
+        for name, size in collect_folder(artifact_folder, podcast_number, policy, store, dry_run).items():
+            reclaimed[name] = reclaimed.get(name, 0) + size
+    return reclaimed
+
+def collect_folder(folder, podcast_number, policy=RETENTION, store=SLIDE_STORE, dry_run=False):
+    reclaimed = {}
+    if policy['text'] == 'archive':
+        reclaimed['text'] = archive_text(folder, dry_run)
+    elif policy['text'] == 'delete':
+        reclaimed['text'] = sum(delete_path(os.path.join(folder, name), dry_run) for name in TEXT_FOLDERS)
+    if policy['audio'] == 'delete':
+        reclaimed['audio'] = delete_path(os.path.join(folder, 'audio'), dry_run)
+    if policy['images'] == 'dedupe':
+        reclaimed['images'] = dedupe_images(folder, store, dry_run)
+    elif policy['images'] == 'delete':
+        reclaimed['images'] = delete_path(os.path.join(folder, 'video', 'images'), dry_run)
+    if policy['segments'] == 'delete':
+        # Older worker runs kept the segments in video/.segments
+        reclaimed['segments'] = sum(delete_path(path, dry_run) for path in (
+            video_segment_folder(os.path.join(folder, 'video', f"episode{podcast_number}.mp4")),
+            os.path.join(folder, 'video', '.segments')))
+    if policy['video'] == 'delete':
+        reclaimed['video'] = delete_path(os.path.join(folder, 'video', f"episode{podcast_number}.mp4"), dry_run)
+    return reclaimed
+
+def collect(output_folder=OUTPUT_FOLDER, policy=None, episodes=None, store=SLIDE_STORE, dry_run=False):
+    """Run the retention policy over every idle, uploaded episode.
+
+    Returns (report, skipped): bytes reclaimed per episode and artifact type,
+    and the episode numbers left alone with the reason.
+    """
+    policy = dict(RETENTION, **(policy or {}))
+    busy = queued_episodes()
+    report, skipped = {}, {}
+    for podcast_number, folder in sorted(episode_folders(output_folder).items()):
+        if episodes is not None and podcast_number not in episodes:
+            continue
+        if podcast_number in busy or marker_is_live(folder):
+            skipped[podcast_number] = 'in progress'
+        elif not is_uploaded(folder):
+            skipped[podcast_number] = 'not uploaded'
+        else:
+            report[podcast_number] = collect_episode(folder, podcast_number, policy, store, dry_run)
+    if policy['images'] != 'keep':
+        report['slide store'] = {'images': prune_slide_store(store, dry_run)}
+    return report, skipped
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def print_report(report, skipped, dry_run=False):
+    types = list(RETENTION)
+    print(f"{'episode':<14}" + ''.join(f"{name:>11}" for name in types) + f"{'total':>11}")
+    totals = dict.fromkeys(types, 0)
+    for episode, reclaimed in report.items():
+        for name, size in reclaimed.items():
+            totals[name] += size
+        row = ''.join(f"{format_size(reclaimed[name]) if name in reclaimed else '-':>11}" for name in types)
+        print(f"{str(episode):<14}{row}{format_size(sum(reclaimed.values())):>11}")
+    print(f"{'total':<14}" + ''.join(f"{format_size(totals[name]):>11}" for name in types)
+          + f"{format_size(sum(totals.values())):>11}")
+    if skipped:
+        print("Skipped: " + ', '.join(f"{number} ({reason})" for number, reason in skipped.items()))
+    verb = "Would reclaim" if dry_run else "Reclaimed"
+    print(f"{verb} {format_size(sum(totals.values()))}")
+
+def usage_report(output_folder=OUTPUT_FOLDER):
+    """Current bytes per artifact type across all episodes"""
+    usage = dict.fromkeys(['text', 'archives', 'audio', 'images', 'video'], 0)
+    for podcast_number, episode in episode_folders(output_folder).items():
+        for folder in artifact_folders(episode):
+            usage['text'] += sum(tree_size(os.path.join(folder, name)) for name in TEXT_FOLDERS
+                                 if os.path.exists(os.path.join(folder, name)))
+            if os.path.exists(os.path.join(folder, TEXT_ARCHIVE)):
+                usage['archives'] += os.path.getsize(os.path.join(folder, TEXT_ARCHIVE))
+            for name, path in (('audio', os.path.join(folder, 'audio')),
+                               ('images', os.path.join(folder, 'video', 'images')),
+                               ('video', os.path.join(folder, 'video', f"episode{podcast_number}.mp4"))):
+                if os.path.exists(path):
+                    usage[name] += tree_size(path)
+    if os.path.isdir(SLIDE_STORE):
+        usage['images'] += sum(os.path.getsize(os.path.join(SLIDE_STORE, name)) for name in os.listdir(SLIDE_STORE))
+    return usage
+
+def parse_policy(items):
+    policy = {}
+    for item in items or []:
+        name, _, action = item.partition('=')
+        if action not in ACTIONS.get(name, ()):
+            raise argparse.ArgumentTypeError(f"invalid policy {item!r}, expected one of "
+                                             + ', '.join(f"{n}={'|'.join(a)}" for n, a in ACTIONS.items()))
+        policy[name] = action
+    return policy
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Episode artifact retention")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gc = commands.add_parser("gc", help="apply the retention policy to uploaded episodes")
+    gc.add_argument("--dry-run", action="store_true", help="only report what would be reclaimed")
+    gc.add_argument("--episodes", help="comma separated episode numbers (default: all)")
+    gc.add_argument("--policy", action="append", help="override an artifact policy, e.g. audio=keep")
+    commands.add_parser("report", help="disk usage per artifact type")
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        for name, size in usage_report().items():
+            print(f"{name:<10}{format_size(size):>12}")
+        return 0
+
+    try:
+        policy = parse_policy(args.policy)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    episodes = {int(n) for n in args.episodes.split(',') if n} if args.episodes else None
+    report, skipped = collect(policy=policy, episodes=episodes, dry_run=args.dry_run)
+    print_report(report, skipped, args.dry_run)
+    return 0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import json
+import sqlite3
+import time
+
+# SQLite file shared by the coordinator and every stage worker
+TASK_QUEUE = os.getenv('TASK_QUEUE', 'output/tasks.db')
+# WAL needs shared memory and so a single host; set TASK_QUEUE_WAL=0 when the file lives on a network filesystem
+TASK_QUEUE_WAL = os.getenv('TASK_QUEUE_WAL', '1') != '0'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    podcast_number INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    item INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    UNIQUE (podcast_number, kind, item)
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (kind, status, id);
+"""
+
+# A task is claimable while queued, or while leased by a worker that stopped heartbeating
+CLAIMABLE = "(status = 'queued' OR (status = 'leased' AND lease_expires < :now)) AND attempts < max_attempts"
+
+class TaskQueue:
+    """Per-item stage tasks in a SQLite file: queued -> leased -> done | failed.
+
+    A worker leases a task for a limited time and keeps extending the lease
+    with heartbeats. If it dies, the lease runs out and another worker picks
+    the task up again, until max_attempts is reached.
+    """
+
+    def __init__(self, path=TASK_QUEUE, wal=TASK_QUEUE_WAL):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, podcast_number, kind, items, max_attempts=3, first_item=0):
+        """Add one task per payload in `items`, numbered from first_item; existing tasks are left as they are"""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO tasks (podcast_number, kind, item, payload, max_attempts, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(podcast_number, kind, item, json.dumps(payload), max_attempts, now)
+             for item, payload in enumerate(items, first_item)])
+
+    def claim(self, worker, kinds, lease_seconds=60, now=None):
+        """Lease the oldest claimable task of one of `kinds` to `worker` and return it, or None"""
+        now = now or time.time()
+        placeholders = ', '.join(f":kind{i}" for i in range(len(kinds)))
+        params = {'worker': worker, 'now': now, 'expires': now + lease_seconds}
+        params.update({f"kind{i}": kind for i, kind in enumerate(kinds)})
+        return self.conn.execute(
+            "UPDATE tasks SET status = 'leased', worker = :worker, lease_expires = :expires, "
+            "attempts = attempts + 1 WHERE id = ("
+            f"  SELECT id FROM tasks WHERE kind IN ({placeholders}) AND {CLAIMABLE} ORDER BY id LIMIT 1"
+            f") AND {CLAIMABLE} RETURNING *",
+            params).fetchone()
+
+    def heartbeat(self, task_id, worker, lease_seconds=60):
+        """Extend a lease; returns False if the task is no longer leased to this worker"""
+        return self.conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            (time.time() + lease_seconds, task_id, worker)).rowcount == 1
+
+    def complete(self, task_id, worker, result=None):
+        """Record a result; returns False (and drops it) if the lease was lost in the meantime"""
+        return self.conn.execute(
+            "UPDATE tasks SET status = 'done', result = ?, finished_at = ?, lease_expires = NULL "
+            "WHERE id = ? AND worker = ? AND status = 'leased'",
+            (json.dumps(result), time.time(), task_id, worker)).rowcount == 1
+
+    def fail(self, task_id, worker, error):
+        """Give a task back for another attempt, or mark it failed once it is out of attempts"""
+        return self.conn.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+            "error = ?, worker = NULL, lease_expires = NULL, "
+            "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END "
+            "WHERE id = ? AND worker = ? AND status = 'leased'",
+            (error, time.time(), task_id, worker)).rowcount == 1
+
+    def expire(self, now=None):
+        """Fail tasks whose lease ran out on their last attempt; returns how many"""
+        now = now or time.time()
+        return self.conn.execute(
+            "UPDATE tasks SET status = 'failed', error = COALESCE(error, 'lease expired'), finished_at = ? "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+            (now, now)).rowcount
+
+    def progress(self, podcast_number, kind):
+        """Task count per status for one stage of an episode"""
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) FROM tasks WHERE podcast_number = ? AND kind = ? GROUP BY status",
+            (podcast_number, kind)).fetchall()
+        return {status: count for status, count in rows}
+
+    def results(self, podcast_number, kind):
+        """Tasks of one stage of an episode in item order, with payload and result decoded"""
+        rows = self.conn.execute(
+            "SELECT item, status, payload, result, error FROM tasks WHERE podcast_number = ? AND kind = ? "
+            "ORDER BY item", (podcast_number, kind)).fetchall()
+        return [dict(row, payload=json.loads(row['payload']), result=json.loads(row['result']) if row['result'] else None)
+                for row in rows]
+
+    def reset(self, podcast_number):
+        """Forget every task of an episode, so it can be produced again from scratch"""
+        return self.conn.execute("DELETE FROM tasks WHERE podcast_number = ?", (podcast_number,)).rowcount
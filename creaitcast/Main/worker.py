@@ -0,0 +1,406 @@
+"""Distributed stage workers.
+
+An episode is split into per-item tasks (one per article fetch, article
+summary, TTS chunk and video segment, plus single tasks for the script, the
+audio merge, the slides, the final mux and the upload). The coordinator puts
+each phase's tasks in the shared queue (task_queue.py) and waits for them
+before planning the next phase. Workers on any node lease tasks of the kinds
+they are started with, so network-bound and CPU-bound work can run on
+different machines. Every artifact is written under output/, which all
+workers and the coordinator must share and run from.
+
+Usage:
+    python worker.py work [--kinds fetch,tts,upload] [--processes 4] [--lease 60] [--once]
+    python worker.py episode <podcast_number> <num_articles> [--fresh]
+    python worker.py status <podcast_number>
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import threading
+import time
+
+import storage
+from main import SCRIPTS_DIR, create_folders, load_stage
+from task_queue import TASK_QUEUE, TaskQueue
+
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+from locales import video_segment_folder
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("worker")
+
+VOICE = "en-US-ChristopherNeural"
+# x264 threads of one segment encode: the CPUs shared between the worker processes of this node (see run_worker)
+segment_threads = os.cpu_count() or 1
+
+def episode_path(podcast_number, *parts):
+    return os.path.join(f"output/podcast_{podcast_number}", *parts)
+
+def write_text(path, text):
+    """Write through a temporary file, so a worker that lost its lease never leaves a torn artifact"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.part"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def part_path(path):
+    """Temporary name next to `path` that keeps its extension, for tools that infer the format from it"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{os.getpid()}.part{ext}"
+
+# Task handlers: (podcast_number, payload) -> JSON result. Raising gives the task back for a retry.
+
+def fetch_article(podcast_number, payload):
+    stage = load_stage("1_parse_articles.py")
+    content = stage.fetch_full_article(payload['url'], stage.get_session())
+    if not content:
+        return {'found': False}
+    path = episode_path(podcast_number, 'articles', 'candidates', f"candidate_{payload['rank']}.txt")
+    write_text(path, content)
+    return {'found': True, 'path': path}
+
+def summarize_article(podcast_number, payload):
+    stage = load_stage("2_summarize_articles.py")
+    stage.process_single_article(payload['path'], stage.get_summarizer())
+    if not os.path.exists(payload['summary']):
+        raise RuntimeError(f"no summary written for {payload['path']}")
+    time.sleep(stage.HF_REQUEST_DELAY)
+    return {'path': payload['summary']}
+
+def create_script(podcast_number, payload):
+    load_stage("3_create_podcast_script.py").main(podcast_number, payload['num_articles'])
+    return {'path': episode_path(podcast_number, 'scripts', 'podcast_script.txt')}
+
+def synthesize_chunk(podcast_number, payload):
+    stage = load_stage("4_generate_audio.py")
+    tmp_path = part_path(payload['path'])
+    asyncio.run(stage.text_to_speech_chunk(payload['text'], tmp_path, payload['voice']))
+    os.replace(tmp_path, payload['path'])
+    return {'path': payload['path']}
+
+def merge_audio(podcast_number, payload):
+    tmp_path = part_path(payload['path'])
+    load_stage("4_generate_audio.py").post_process(payload['chunks'], tmp_path, set(payload['story_breaks']),
+                                                   remove_chunks=False)
+    os.replace(tmp_path, payload['path'])
+    # Only now: a retry after a lost lease still needs the chunks
+    for chunk in payload['chunks']:
+        if os.path.exists(chunk):
+            os.remove(chunk)
+    return {'path': payload['path']}
+
+def create_slides(podcast_number, payload):
+    stage = load_stage("5_create_video.py")
+    with open(payload['script'], 'r', encoding='utf-8') as f:
+        keywords = stage.extract_keywords(f.read(), podcast_number=podcast_number)
+    os.makedirs(payload['image_folder'], exist_ok=True)
+    image_paths = stage.generate_images(keywords, output_folder=payload['image_folder'])
+    duration = stage.audio_duration(payload['audio'])
+    return {'segments': stage.plan_segments(image_paths, duration, len(image_paths))}
+
+def encode_segment(podcast_number, payload):
+    stage = load_stage("5_create_video.py")
+    tmp_path = part_path(payload['path'])
+    stage.encode_segment(stage.ffmpeg_binary(), payload['image'], payload['frames'], tmp_path, segment_threads)
+    os.replace(tmp_path, payload['path'])
+    return {'path': payload['path']}
+
+def mux_video(podcast_number, payload):
+    stage = load_stage("5_create_video.py")
+    tmp_path = part_path(payload['path'])
+    stage.join_segments(stage.ffmpeg_binary(), payload['segments'], payload['audio'], tmp_path, payload['folder'])
+    os.replace(tmp_path, payload['path'])
+    shutil.rmtree(payload['folder'], ignore_errors=True)
+    return {'path': payload['path']}
+
+def upload_video(podcast_number, payload):
+    load_stage("6_upload_to_youtube.py").main(podcast_number, payload['num_articles'])
+    if not storage.is_uploaded(episode_path(podcast_number)):
+        raise RuntimeError("upload did not complete")
+    return {}
+
+HANDLERS = {
+    'fetch': fetch_article,
+    'summarize': summarize_article,
+    'script': create_script,
+    'tts': synthesize_chunk,
+    'merge': merge_audio,
+    'slides': create_slides,
+    'segment': encode_segment,
+    'mux': mux_video,
+    'upload': upload_video,
+}
+
+class StageWorker:
+    def __init__(self, kinds=None, name=None, lease_seconds=60, poll_interval=1, queue_path=TASK_QUEUE):
+        self.kinds = kinds or list(HANDLERS)
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.queue_path = queue_path
+        self.stopping = False
+
+    def heartbeat(self, task_id, done):
+        """Keep extending the lease until the task finishes; runs on its own connection"""
+        queue = TaskQueue(self.queue_path)
+        try:
+            while not done.wait(self.lease_seconds / 3):
+                if not queue.heartbeat(task_id, self.name, self.lease_seconds):
+                    logger.warning(f"Lost the lease on task {task_id}")
+                    return
+        finally:
+            queue.close()
+
+    def execute(self, queue, task):
+        label = f"{task['kind']} #{task['item']} of episode {task['podcast_number']} (attempt {task['attempts']})"
+        logger.info(f"{self.name} starting {label}")
+        done = threading.Event()
+        beat = threading.Thread(target=self.heartbeat, args=(task['id'], done), daemon=True)
+        beat.start()
+        start = time.perf_counter()
+        try:
+            result = HANDLERS[task['kind']](task['podcast_number'], json.loads(task['payload']))
+        except Exception as e:
+            logger.error(f"{self.name} failed {label}: {e}")
+            queue.fail(task['id'], self.name, str(e))
+            return
+        finally:
+            done.set()
+            beat.join()
+        if queue.complete(task['id'], self.name, result):
+            logger.info(f"{self.name} finished {label} in {time.perf_counter() - start:.1f}s")
+        else:
+            logger.warning(f"{self.name} finished {label} after its lease expired, result dropped")
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def run(self, once=False):
+        queue = TaskQueue(self.queue_path)
+        try:
+            while not self.stopping:
+                task = queue.claim(self.name, self.kinds, self.lease_seconds)
+                if task:
+                    self.execute(queue, task)
+                elif once:
+                    break
+                else:
+                    time.sleep(self.poll_interval)
+        finally:
+            queue.close()
+
+def run_worker(kinds, lease_seconds, poll_interval, once, processes=1):
+    global segment_threads
+    segment_threads = max(1, (os.cpu_count() or 1) // processes)
+    worker = StageWorker(kinds, lease_seconds=lease_seconds, poll_interval=poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(once=once)
+
+# Coordinator: each planner returns the payloads of a phase, given the results of the phases before it
+
+def ranking_path(podcast_number):
+    return episode_path(podcast_number, 'articles', 'candidates', 'ranking.json')
+
+def plan_fetch(podcast_number, num_articles, queue):
+    """Fetch the top num_articles candidates; the rest of the ranking is kept for finish_fetch"""
+    stage = load_stage("1_parse_articles.py")
+    candidates = stage.gather_candidates(stage.NEWSAPI_QUERIES, num_articles * stage.OVERFETCH)
+    ranked = stage.rank_candidates(candidates)
+    payloads = [{'rank': rank, 'title': c['title'], 'url': c['url'], 'source': c['source']}
+                for rank, c in enumerate(ranked[:num_articles * stage.OVERFETCH])]
+    write_text(ranking_path(podcast_number), json.dumps(payloads))
+    return payloads[:num_articles]
+
+def finish_fetch(podcast_number, num_articles, queue, poll_interval=1):
+    """Replace failed fetches from further down the ranking, then write the first num_articles found, in ranked order"""
+    candidates_folder = episode_path(podcast_number, 'articles', 'candidates')
+    if not os.path.isdir(candidates_folder):
+        return
+    with open(ranking_path(podcast_number), 'r', encoding='utf-8') as f:
+        ranking = json.load(f)
+    while True:
+        tasks = queue.results(podcast_number, 'fetch')
+        found = [task for task in tasks if task['status'] == 'done' and task['result']['found']]
+        missing = num_articles - len(found)
+        if missing <= 0 or len(tasks) >= len(ranking):
+            break
+        queue.enqueue(podcast_number, 'fetch', ranking[len(tasks):len(tasks) + missing], first_item=len(tasks))
+        logger.info(f"Episode {podcast_number}: queued {min(missing, len(ranking) - len(tasks))} more fetch task(s)")
+        wait_for_phase(queue, podcast_number, 'fetch', poll_interval)
+
+    stage = load_stage("1_parse_articles.py")
+    found = found[:num_articles]
+    output_folder = episode_path(podcast_number, 'articles')
+    for i, task in enumerate(found, 1):
+        with open(task['result']['path'], 'r', encoding='utf-8') as f:
+            stage.write_article(output_folder, i, task['payload'], f.read())
+    shutil.rmtree(candidates_folder, ignore_errors=True)
+    logger.info(f"Episode {podcast_number}: {len(found)} of {num_articles} articles fetched")
+
+def plan_summaries(podcast_number, num_articles, queue):
+    folder = episode_path(podcast_number, 'articles')
+    files = sorted((f for f in os.listdir(folder) if f.startswith('article_') and f.endswith('.txt')),
+                   key=lambda f: int(f.split('_')[1].split('.')[0]))[:num_articles]
+    return [{'path': os.path.join(folder, f),
+             'summary': episode_path(podcast_number, 'summaries', f.replace('article_', 'summary_'))}
+            for f in files]
+
+def plan_script(podcast_number, num_articles, queue):
+    return [{'num_articles': num_articles}]
+
+def plan_tts(podcast_number, num_articles, queue):
+    stage = load_stage("4_generate_audio.py")
+    with open(episode_path(podcast_number, 'scripts', 'podcast_script.txt'), 'r', encoding='utf-8') as f:
+        text = f.read()
+    chunks, story_breaks = stage.split_script(text, stage.adaptive_chunk_size(text, VOICE))
+    audio = episode_path(podcast_number, 'audio', f"episode{podcast_number}.mp3")
+    return [{'text': chunk, 'voice': VOICE, 'path': f"{audio}.chunk{i}.mp3", 'story_start': i in story_breaks}
+            for i, chunk in enumerate(chunks)]
+
+def plan_merge(podcast_number, num_articles, queue):
+    tasks = queue.results(podcast_number, 'tts')
+    return [{'chunks': [task['result']['path'] for task in tasks],
+             'story_breaks': [task['item'] for task in tasks if task['payload']['story_start']],
+             'path': episode_path(podcast_number, 'audio', f"episode{podcast_number}.mp3")}]
+
+def plan_slides(podcast_number, num_articles, queue):
+    return [{'script': episode_path(podcast_number, 'scripts', 'podcast_script.txt'),
+             'audio': episode_path(podcast_number, 'audio', f"episode{podcast_number}.mp3"),
+             'image_folder': episode_path(podcast_number, 'video', 'images')}]
+
+def segment_folder(podcast_number):
+    return video_segment_folder(episode_path(podcast_number, 'video', f"episode{podcast_number}.mp4"))
+
+def plan_video_segments(podcast_number, num_articles, queue):
+    segments = queue.results(podcast_number, 'slides')[0]['result']['segments']
+    os.makedirs(segment_folder(podcast_number), exist_ok=True)
+    return [{'image': image, 'frames': frames, 'path': os.path.join(segment_folder(podcast_number), f"segment_{i}.mp4")}
+            for i, (image, frames) in enumerate(segments)]
+
+def plan_mux(podcast_number, num_articles, queue):
+    return [{'segments': [task['result']['path'] for task in queue.results(podcast_number, 'segment')],
+             'audio': episode_path(podcast_number, 'audio', f"episode{podcast_number}.mp3"),
+             'folder': segment_folder(podcast_number),
+             'path': episode_path(podcast_number, 'video', f"episode{podcast_number}.mp4")}]
+
+def plan_upload(podcast_number, num_articles, queue):
+    return [{'num_articles': num_articles}]
+
+# (task kind, planner, optional finisher run by the coordinator once every task is done)
+PHASES = [
+    ('fetch', plan_fetch, finish_fetch),
+    ('summarize', plan_summaries, None),
+    ('script', plan_script, None),
+    ('tts', plan_tts, None),
+    ('merge', plan_merge, None),
+    ('slides', plan_slides, None),
+    ('segment', plan_video_segments, None),
+    ('mux', plan_mux, None),
+    ('upload', plan_upload, None),
+]
+
+def wait_for_phase(queue, podcast_number, kind, poll_interval=1):
+    while True:
+        queue.expire()
+        counts = queue.progress(podcast_number, kind)
+        if not counts.get('queued') and not counts.get('leased'):
+            return counts
+        time.sleep(poll_interval)
+
+def run_distributed_episode(podcast_number, num_articles, queue, phases=PHASES, poll_interval=1):
+    """Coordinate one episode through the workers. Returns the failed phase or None.
+
+    Phases already done in the queue are not planned again, so a restarted
+    coordinator picks up where it stopped.
+    """
+    create_folders(podcast_number)
+    with storage.episode_in_progress(podcast_number):
+        for kind, planner, finisher in phases:
+            counts = queue.progress(podcast_number, kind)
+            if not counts:
+                payloads = planner(podcast_number, num_articles, queue)
+                queue.enqueue(podcast_number, kind, payloads)
+                logger.info(f"Episode {podcast_number}: queued {len(payloads)} {kind} task(s)")
+            start = time.perf_counter()
+            counts = wait_for_phase(queue, podcast_number, kind, poll_interval)
+            if counts.get('failed'):
+                errors = {task['error'] for task in queue.results(podcast_number, kind) if task['status'] == 'failed'}
+                logger.error(f"Episode {podcast_number}: {counts['failed']} {kind} task(s) failed: {'; '.join(errors)}")
+                return kind
+            if finisher:
+                finisher(podcast_number, num_articles, queue, poll_interval)
+            logger.info(f"Episode {podcast_number}: {kind} done in {time.perf_counter() - start:.1f}s")
+    return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed stage workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    work = commands.add_parser("work", help="serve tasks from the shared queue")
+    work.add_argument("--kinds", default=','.join(HANDLERS), help="task kinds this node runs")
+    work.add_argument("--processes", type=int, default=1, help="worker processes on this node")
+    work.add_argument("--lease", type=float, default=60, help="lease length in seconds")
+    work.add_argument("--poll", type=float, default=1, help="seconds between queue checks when idle")
+    work.add_argument("--once", action="store_true", help="exit when no task is available")
+
+    episode = commands.add_parser("episode", help="coordinate one episode through the workers")
+    episode.add_argument("podcast_number", type=int)
+    episode.add_argument("num_articles", type=int)
+    episode.add_argument("--fresh", action="store_true", help="drop the episode's earlier tasks first")
+
+    status = commands.add_parser("status", help="task counts of an episode")
+    status.add_argument("podcast_number", type=int)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "work":
+        kinds = [kind for kind in args.kinds.split(',') if kind]
+        unknown = set(kinds) - set(HANDLERS)
+        if unknown:
+            print(f"Unknown task kinds: {', '.join(sorted(unknown))}")
+            sys.exit(1)
+        workers = [multiprocessing.Process(target=run_worker,
+                                           args=(kinds, args.lease, args.poll, args.once, args.processes))
+                   for _ in range(args.processes)]
+        for process in workers:
+            process.start()
+        # Ctrl-C reaches the children directly; SIGTERM is passed on, each finishes its current task
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in workers])
+        for process in workers:
+            process.join()
+        return
+
+    queue = TaskQueue()
+    try:
+        if args.command == "status":
+            for kind, _, _ in PHASES:
+                counts = queue.progress(args.podcast_number, kind)
+                if counts:
+                    print(f"{kind:<10} " + '  '.join(f"{status} {count}" for status, count in sorted(counts.items())))
+        else:
+            if args.fresh:
+                queue.reset(args.podcast_number)
+            failed = run_distributed_episode(args.podcast_number, args.num_articles, queue)
+            if failed:
+                print(f"Episode {args.podcast_number} failed in {failed}")
+                sys.exit(1)
+            print(f"Episode {args.podcast_number} completed")
+    finally:
+        queue.close()
+
+if __name__ == "__main__":
+    main()